@@ -105,6 +105,86 @@ CHANNEL_LAYERS = {
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
 
+# Shared cache (Redis) - used for cross-worker caches such as authenticated principals
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/1",
+    },
+}
+
+# Authenticated principal cache (see rest_api/auth/principal_cache.py)
+AUTH_PRINCIPAL_CACHE_TTL = int(os.getenv('AUTH_PRINCIPAL_CACHE_TTL', 300))  # seconds, shared tier
+AUTH_PRINCIPAL_LOCAL_CACHE_TTL = int(os.getenv('AUTH_PRINCIPAL_LOCAL_CACHE_TTL', 5))  # seconds, in-process tier
+AUTH_PRINCIPAL_LOCAL_CACHE_SIZE = int(os.getenv('AUTH_PRINCIPAL_LOCAL_CACHE_SIZE', 1024))
+
+# Forum post detail header (post, author and comment count) in the shared cache
+FORUM_POST_CACHE_TTL = int(os.getenv('FORUM_POST_CACHE_TTL', 300))  # seconds
+
+# Idempotency-Key replay for mutating endpoints (rest_api/idempotency.py)
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 86400))  # seconds a response is replayed for
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', 30))  # seconds a duplicate waits for the first request
+IDEMPOTENCY_LOCK_TTL = int(os.getenv('IDEMPOTENCY_LOCK_TTL', 300))  # seconds the first request holds its key; keep it well above IDEMPOTENCY_LOCK_TIMEOUT
+
+# Forum trending (rest_api/forum.py)
+FORUM_TRENDING_INTERVAL = int(os.getenv('FORUM_TRENDING_INTERVAL', 300))  # seconds between hot score updates
+FORUM_TRENDING_WINDOW_HOURS = int(os.getenv('FORUM_TRENDING_WINDOW_HOURS', 72))  # activity older than this doesn't count
+FORUM_TRENDING_HALF_LIFE_HOURS = float(os.getenv('FORUM_TRENDING_HALF_LIFE_HOURS', 12))  # a comment's weight halves every N hours
+
+# Chat presence and typing indicators (channel layer only, no database writes)
+CHAT_PRESENCE_HEARTBEAT_INTERVAL = int(os.getenv('CHAT_PRESENCE_HEARTBEAT_INTERVAL', 30))  # seconds
+CHAT_PRESENCE_TTL = int(os.getenv('CHAT_PRESENCE_TTL', 75))  # seconds before clients drop a silent member
+CHAT_EVENT_MIN_INTERVAL = float(os.getenv('CHAT_EVENT_MIN_INTERVAL', 2))  # per-connection throttle for typing/presence
+
+# WebSocket heartbeats and admission control (limits are per worker process)
+WS_HEARTBEAT_INTERVAL = int(os.getenv('WS_HEARTBEAT_INTERVAL', 30))  # seconds between server pings
+WS_IDLE_TIMEOUT = int(os.getenv('WS_IDLE_TIMEOUT', 90))  # seconds without any client frame before eviction
+WS_MAX_CONNECTIONS = int(os.getenv('WS_MAX_CONNECTIONS', 5000))
+WS_MAX_CONNECTIONS_PER_USER = int(os.getenv('WS_MAX_CONNECTIONS_PER_USER', 20))
+WS_COMPACT_DEFLATE_THRESHOLD = int(os.getenv('WS_COMPACT_DEFLATE_THRESHOLD', 1024))  # bytes, compact protocol only
+
+# Rate limiting (token buckets, see rest_api/ratelimit.py)
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', f"redis://{REDIS_HOST}:{REDIS_PORT}/2")
+CHAT_RATE_LIMIT_BURST = int(os.getenv('CHAT_RATE_LIMIT_BURST', 10))  # messages per connection
+CHAT_RATE_LIMIT_REFILL = float(os.getenv('CHAT_RATE_LIMIT_REFILL', 1))  # messages per second per connection
+CHAT_USER_RATE_LIMIT_BURST = int(os.getenv('CHAT_USER_RATE_LIMIT_BURST', 20))  # messages per user, all connections
+CHAT_USER_RATE_LIMIT_REFILL = float(os.getenv('CHAT_USER_RATE_LIMIT_REFILL', 2))  # messages per second per user
+
+# Token bucket throttling for public API endpoints: "<scope>.<kind>" or "<kind>" -> (tokens per second, burst)
+API_THROTTLE_RATES = {
+    'ip': (float(os.getenv('API_THROTTLE_IP_REFILL', 2)), int(os.getenv('API_THROTTLE_IP_BURST', 60))),
+    'user': (float(os.getenv('API_THROTTLE_USER_REFILL', 5)), int(os.getenv('API_THROTTLE_USER_BURST', 120))),
+    'endpoint': (float(os.getenv('API_THROTTLE_ENDPOINT_REFILL', 200)), int(os.getenv('API_THROTTLE_ENDPOINT_BURST', 1000))),
+    # Login and registration hash passwords, so each client gets far fewer attempts
+    'auth.ip': (float(os.getenv('AUTH_THROTTLE_IP_REFILL', 0.2)), int(os.getenv('AUTH_THROTTLE_IP_BURST', 10))),
+    'auth.endpoint': (float(os.getenv('AUTH_THROTTLE_ENDPOINT_REFILL', 20)), int(os.getenv('AUTH_THROTTLE_ENDPOINT_BURST', 100))),
+}
+
+# Outgoing email queue (see rest_api/emails.py, run with `manage.py run_email_worker`)
+EMAIL_QUEUE_TRANSPORT = os.getenv('EMAIL_QUEUE_TRANSPORT', 'resend' if os.getenv('RESEND_API_KEY') else 'local')  # 'resend' or 'local'
+EMAIL_QUEUE_WORKERS = int(os.getenv('EMAIL_QUEUE_WORKERS', 2))  # worker threads
+EMAIL_QUEUE_BATCH_SIZE = int(os.getenv('EMAIL_QUEUE_BATCH_SIZE', 50))  # emails per provider call (Resend max 100)
+EMAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv('EMAIL_QUEUE_MAX_ATTEMPTS', 5))
+EMAIL_QUEUE_RETRY_BASE_DELAY = int(os.getenv('EMAIL_QUEUE_RETRY_BASE_DELAY', 30))  # seconds, doubled per attempt
+EMAIL_QUEUE_RETRY_MAX_DELAY = int(os.getenv('EMAIL_QUEUE_RETRY_MAX_DELAY', 3600))  # seconds
+EMAIL_QUEUE_SENDING_TIMEOUT = int(os.getenv('EMAIL_QUEUE_SENDING_TIMEOUT', 300))  # seconds before a stuck claim is retried
+EMAIL_QUEUE_POLL_INTERVAL = float(os.getenv('EMAIL_QUEUE_POLL_INTERVAL', 2))  # seconds between polls when idle
+EMAIL_QUEUE_METRICS_INTERVAL = int(os.getenv('EMAIL_QUEUE_METRICS_INTERVAL', 60))  # seconds between queue depth logs
+
+# Exchange expiry and reminders (rest_api/scheduler.py, run with `manage.py run_exchange_scheduler --loop`)
+EXCHANGE_PENDING_TTL_HOURS = float(os.getenv('EXCHANGE_PENDING_TTL_HOURS', 168))  # unanswered requests are cancelled after this
+EXCHANGE_REMINDER_LEAD_HOURS = float(os.getenv('EXCHANGE_REMINDER_LEAD_HOURS', 24))  # reminder before the proposed time
+EXCHANGE_COMPLETION_REMINDER_DELAY_HOURS = float(os.getenv('EXCHANGE_COMPLETION_REMINDER_DELAY_HOURS', 2))  # nudge to confirm after the proposed time
+EXCHANGE_SCHEDULER_REFRESH_INTERVAL = int(os.getenv('EXCHANGE_SCHEDULER_REFRESH_INTERVAL', 300))  # seconds between timer heap rebuilds
+
+# Admin KPI snapshots
+KPI_SNAPSHOT_INTERVAL = int(os.getenv('KPI_SNAPSHOT_INTERVAL', 60))  # seconds between snapshots; older ones are recomputed on read
+KPI_SNAPSHOT_RETENTION_DAYS = int(os.getenv('KPI_SNAPSHOT_RETENTION_DAYS', 365))  # snapshot history kept for trends
+
+# Automatic moderation pre-screen (rest_api/content_scanner.py)
+MODERATION_TERMS_FILE = os.getenv('MODERATION_TERMS_FILE', str(BASE_DIR / 'moderation_terms.txt'))
+MODERATION_TERMS_RELOAD_INTERVAL = float(os.getenv('MODERATION_TERMS_RELOAD_INTERVAL', 5))  # seconds between checks for an updated term file
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -121,6 +201,17 @@ DATABASES = {
 }
 
 
+# Password hashing: the first hasher is used for new hashes, the others are only
+# verified and upgraded on login (see rest_api/auth/hashers.py)
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'rest_api.auth.hashers.LegacySHA256PasswordHasher',
+]
+PASSWORD_HASHING_CONCURRENCY = int(os.getenv('PASSWORD_HASHING_CONCURRENCY', 4))  # hashes running at once
+PASSWORD_HASHING_MAX_PENDING = int(os.getenv('PASSWORD_HASHING_MAX_PENDING', 32))  # callers waiting before 503
+PASSWORD_HASHING_TIMEOUT = int(os.getenv('PASSWORD_HASHING_TIMEOUT', 10))  # seconds
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -231,6 +322,10 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # Reverse proxies in front of the backend (nginx). Client IPs (throttling) are read from
+    # the X-Forwarded-For entry the last proxy appended, never from client-supplied entries;
+    # set to 0 when the backend is reached directly
+    "NUM_PROXIES": int(os.getenv('NUM_PROXIES', 1)),
 }
 
 SIMPLE_JWT = {
@@ -258,12 +353,18 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
 ]
 
+# Response headers the frontend may read cross-origin (paged admin lists report their total)
+CORS_EXPOSE_HEADERS = [
+    'x-total-count',
+]
+
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:5173",
     "http://localhost:3000",
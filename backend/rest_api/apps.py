@@ -8,6 +8,7 @@ class RestApiConfig(AppConfig):
     def ready(self):
         """Called when Django starts"""
         import os
+        from rest_api import signals  # noqa: F401 - register signal handlers
         # Only run in main process (not in migrations or shell)
         if os.environ.get('RUN_MAIN') == 'true' or os.environ.get('GUNICORN_RUNNING'):
             from rest_api.storage import ensure_minio_bucket
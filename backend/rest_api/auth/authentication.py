@@ -1,5 +1,6 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_api.models import User
+from rest_framework_simplejwt.settings import api_settings
+from rest_api.auth.principal_cache import get_principal
 
 
 class CookieJWTAuthentication(JWTAuthentication):
@@ -15,11 +16,8 @@ class CookieJWTAuthentication(JWTAuthentication):
         except Exception:
             return None
 
-        user_id = validated_token.get('user_id')
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
+        user = get_principal(validated_token.get('user_id'), validated_token.get(api_settings.JTI_CLAIM))
+        if user is None:
             return None
 
         return user, validated_token
-
@@ -0,0 +1,122 @@
+"""
+Password hashing for the Hive project.
+
+Hashing goes through Django's PASSWORD_HASHERS (Argon2 first), so the algorithm
+can be upgraded without touching callers. Passwords stored by older releases
+as bare unsalted SHA-256 hex digests are still accepted and rehashed with the
+preferred hasher on the next successful login.
+
+Hashing is CPU and memory heavy by design, so it runs on a bounded thread pool:
+at most PASSWORD_HASHING_CONCURRENCY hashes run at once and at most
+PASSWORD_HASHING_MAX_PENDING callers wait. Beyond that, PasswordHashingBusy is
+raised instead of queueing, so a login storm can't exhaust the request workers.
+"""
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import BasePasswordHasher, check_password, make_password
+from django.utils.crypto import constant_time_compare
+
+_LEGACY_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when too many password hashes are already queued"""
+
+
+class LegacySHA256PasswordHasher(BasePasswordHasher):
+    """
+    Verifies the unsalted SHA-256 digests of older releases. Never use it to
+    create new hashes: keep it last in PASSWORD_HASHERS so logins upgrade them.
+    """
+    algorithm = 'legacy_sha256'
+
+    def salt(self):
+        return ''
+
+    def encode(self, password, salt):
+        if salt != '':
+            raise ValueError("salt must be empty.")
+        return f'{self.algorithm}${hashlib.sha256(password.encode()).hexdigest()}'
+
+    def decode(self, encoded):
+        algorithm, digest = encoded.split('$', 1)
+        return {'algorithm': algorithm, 'hash': digest, 'salt': None}
+
+    def verify(self, password, encoded):
+        return constant_time_compare(encoded, self.encode(password, ''))
+
+    def safe_summary(self, encoded):
+        return {'algorithm': self.algorithm, 'hash': f'{self.decode(encoded)["hash"][:6]}...'}
+
+    def harden_runtime(self, password, encoded):
+        pass
+
+
+class BoundedHashingPool:
+    """Thread pool with a cap on running and waiting hash jobs"""
+
+    def __init__(self, workers, max_pending):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def run(self, func, *args, timeout=None):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy("Too many password hashing requests")
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # A caller that times out stops waiting, but the hash keeps its slot until it finishes
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise PasswordHashingBusy("Password hashing timed out")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BoundedHashingPool(
+                    workers=settings.PASSWORD_HASHING_CONCURRENCY,
+                    max_pending=settings.PASSWORD_HASHING_MAX_PENDING,
+                )
+    return _pool
+
+
+def _normalize(encoded):
+    """Give bare legacy SHA-256 digests their hasher prefix"""
+    if encoded and _LEGACY_SHA256_RE.match(encoded):
+        return f'{LegacySHA256PasswordHasher.algorithm}${encoded}'
+    return encoded
+
+
+def hash_password(password):
+    """Hash a password with the preferred hasher"""
+    return get_pool().run(make_password, password, timeout=settings.PASSWORD_HASHING_TIMEOUT)
+
+
+def _check(password, encoded):
+    outdated = []
+    valid = check_password(password, encoded, setter=lambda raw_password: outdated.append(True))
+    return valid, bool(outdated)
+
+
+def verify_password(password, encoded):
+    """
+    Check a password against a stored hash.
+    Returns (valid, needs_rehash); needs_rehash is True when a valid hash uses
+    an outdated algorithm or parameters and should be replaced.
+    """
+    return get_pool().run(_check, password, _normalize(encoded), timeout=settings.PASSWORD_HASHING_TIMEOUT)
@@ -0,0 +1,223 @@
+"""
+Authenticated principal cache shared by HTTP and WebSocket authentication.
+
+Principals are cached per (user id, token jti) in two tiers:
+- an in-process LRU with a short TTL (no network round-trip on a hit)
+- the shared Django cache (Redis), so all workers reuse the same entry
+
+Every user has a generation marker in the shared cache. Invalidating a user
+bumps the marker, which orphans all of that user's shared entries at once.
+It is bumped again when the invalidating transaction commits, so an entry
+reloaded from the database before the commit doesn't outlive it.
+Logged-out tokens are remembered as revoked until they expire.
+
+Local hits don't check the shared generation (that would cost the round-trip
+the tier exists to save). Other workers can therefore serve a changed or banned
+user's old principal for up to AUTH_PRINCIPAL_LOCAL_CACHE_TTL seconds; this
+window is accepted, and the worker handling the change drops it right away.
+"""
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.settings import api_settings
+
+from rest_api.models import User
+
+logger = logging.getLogger(__name__)
+
+_REVOKED = b'revoked'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class LocalPrincipalCache:
+    """
+    Thread-safe LRU with per-entry TTL, holding pickled principals.
+
+    Invalidated users get a generation from a process-wide counter, kept for at
+    most maxsize users. Users without one report the largest evicted generation,
+    so an eviction can never hand a load started earlier its old value back.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = OrderedDict()
+        self._last_generation = 0
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(user_id, self._generation_floor)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, generation=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            # Skip entries loaded before the user was invalidated
+            if generation is not None and generation != self._generations.get(key[0], self._generation_floor):
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            self._last_generation += 1
+            self._generations[user_id] = self._last_generation
+            self._generations.move_to_end(user_id)
+            while len(self._generations) > max(self.maxsize, 1):
+                _, evicted = self._generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, evicted)
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._generation_floor = self._last_generation
+
+
+_local_cache = LocalPrincipalCache(
+    maxsize=_setting('AUTH_PRINCIPAL_LOCAL_CACHE_SIZE', 1024),
+    ttl=_setting('AUTH_PRINCIPAL_LOCAL_CACHE_TTL', 5),
+)
+
+
+def _generation_key(user_id):
+    return f'auth:principal:gen:{user_id}'
+
+
+def _principal_key(user_id, jti):
+    return f'auth:principal:{user_id}:{jti}'
+
+
+def _revoked_key(jti):
+    return f'auth:revoked:{jti}'
+
+
+def load_principal(user_id):
+    """Load the principal with its profile and timebank (cache miss path)"""
+    try:
+        return User.objects.select_related('profile', 'timebank').get(id=user_id)
+    except User.DoesNotExist:
+        return None
+
+
+def get_principal(user_id, jti):
+    """
+    Return the user for a validated token, or None if the user no longer
+    exists or the token has been revoked.
+    """
+    if not user_id:
+        return None
+    user_id = int(user_id)
+    local_key = (user_id, jti)
+
+    blob = _local_cache.get(local_key)
+    if blob == _REVOKED:
+        return None
+    if blob is not None:
+        return pickle.loads(blob)
+
+    local_generation = _local_cache.generation(user_id)
+    shared_available = True
+    try:
+        found = cache.get_many([
+            _generation_key(user_id), _principal_key(user_id, jti), _revoked_key(jti),
+        ])
+    except Exception as e:
+        logger.warning(f"Principal cache unavailable, falling back to database: {e}")
+        found = {}
+        shared_available = False
+
+    if found.get(_revoked_key(jti)):
+        _local_cache.set(local_key, _REVOKED)
+        return None
+
+    generation = found.get(_generation_key(user_id))
+    entry = found.get(_principal_key(user_id, jti))
+    if entry is not None and entry[0] == generation:
+        blob = entry[1]
+    else:
+        user = load_principal(user_id)
+        if user is None:
+            return None
+        blob = pickle.dumps(user)
+        if shared_available:
+            try:
+                cache.set(
+                    _principal_key(user_id, jti),
+                    (generation, blob),
+                    timeout=_setting('AUTH_PRINCIPAL_CACHE_TTL', 300),
+                )
+            except Exception as e:
+                logger.warning(f"Failed to store principal in cache: {e}")
+
+    _local_cache.set(local_key, blob, generation=local_generation)
+    return pickle.loads(blob)
+
+
+def _bump_generation(user_id):
+    _local_cache.discard_user(int(user_id))
+    try:
+        cache.set(_generation_key(user_id), time.time_ns(), timeout=None)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate cached principal for user {user_id}: {e}")
+
+
+def invalidate_user(user_id):
+    """
+    Drop every cached principal of a user (ban, suspend, delete, edits).
+    Call it inside the transaction making the change: it drops them right away
+    and again on commit, as a request may reload the old row in between.
+    """
+    _bump_generation(user_id)
+    transaction.on_commit(lambda: _bump_generation(user_id))
+
+
+def revoke_token(token):
+    """Revoke a validated access token until it expires (logout)"""
+    jti = token.get(api_settings.JTI_CLAIM)
+    user_id = token.get('user_id')
+    if not jti:
+        return
+    remaining = int(token.get('exp', 0) - time.time())
+    if remaining <= 0:
+        return
+    if user_id:
+        _local_cache.set((int(user_id), jti), _REVOKED, ttl=remaining)
+    try:
+        cache.set(_revoked_key(jti), True, timeout=remaining)
+    except Exception as e:
+        logger.warning(f"Failed to revoke token {jti}: {e}")
+
+
+def clear_local_cache():
+    """Clear the in-process tier (used by tests)"""
+    _local_cache.clear()
@@ -3,27 +3,25 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_api.models import User, EmailVerificationToken, UserProfile, TimeBank
 from rest_api.auth.serializers import get_tokens_for_user
+from rest_api.auth.principal_cache import revoke_token
+from rest_api.auth import hashers
+from rest_api.emails import enqueue_email
+from rest_api.throttling import PUBLIC_THROTTLES
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
-import hashlib
 import re
 import secrets
-import threading
-import resend
 import os
 
-# Initialize Resend with API key
-resend.api_key = os.getenv('RESEND_API_KEY', '')
-
 
 def password_hash(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    return hashers.hash_password(password)
 
 
 def verify_password(password, hashed_password):
-    return password_hash(password) == hashed_password
+    return hashers.verify_password(password, hashed_password)[0]
 
 
 def validate_password(password):
@@ -66,50 +64,40 @@ def get_resend_from_email():
 
 
 def send_verification_email(user, token):
-    """Send verification email to user via Resend (runs in background thread)"""
-    def _send_email():
-        verification_url = f"{settings.FRONTEND_URL}/verify-email?token={token}"
-        from_email = get_resend_from_email()
-        
-        html_content = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #ECC94B;">Welcome to The Hive! 🐝</h2>
-            <p>Hello {user.first_name},</p>
-            <p>Thanks for joining The Hive! Please verify your email address by clicking the button below:</p>
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="{verification_url}" 
-                   style="background-color: #ECC94B; color: #000; padding: 12px 30px; 
-                          text-decoration: none; border-radius: 5px; font-weight: bold;">
-                    Verify Email
-                </a>
-            </div>
-            <p style="color: #666; font-size: 14px;">
-                Or copy and paste this link into your browser:<br>
-                <a href="{verification_url}" style="color: #ECC94B;">{verification_url}</a>
-            </p>
-            <p style="color: #666; font-size: 14px;">This link will expire in 24 hours.</p>
-            <hr style="border: none; border-top: 1px solid #eee; margin: 20px 0;">
-            <p style="color: #999; font-size: 12px;">
-                If you didn't create an account, please ignore this email.
-            </p>
+    """Queue the verification email for the email worker"""
+    verification_url = f"{settings.FRONTEND_URL}/verify-email?token={token}"
+    from_email = get_resend_from_email()
+
+    html_content = f"""
+    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+        <h2 style="color: #ECC94B;">Welcome to The Hive! 🐝</h2>
+        <p>Hello {user.first_name},</p>
+        <p>Thanks for joining The Hive! Please verify your email address by clicking the button below:</p>
+        <div style="text-align: center; margin: 30px 0;">
+            <a href="{verification_url}" 
+               style="background-color: #ECC94B; color: #000; padding: 12px 30px; 
+                      text-decoration: none; border-radius: 5px; font-weight: bold;">
+                Verify Email
+            </a>
         </div>
-        """
-        
-        try:
-            r = resend.Emails.send({
-                "from": from_email,
-                "to": user.email,
-                "subject": "Verify your email - The Hive",
-                "html": html_content
-            })
-            print(f"Verification email sent to {user.email} (id: {r.get('id', 'N/A')})")
-        except Exception as e:
-            print(f"Failed to send verification email to {user.email}: {e}")
-    
-    # Run email sending in background thread to not block the request
-    thread = threading.Thread(target=_send_email)
-    thread.daemon = True
-    thread.start()
+        <p style="color: #666; font-size: 14px;">
+            Or copy and paste this link into your browser:<br>
+            <a href="{verification_url}" style="color: #ECC94B;">{verification_url}</a>
+        </p>
+        <p style="color: #666; font-size: 14px;">This link will expire in 24 hours.</p>
+        <hr style="border: none; border-top: 1px solid #eee; margin: 20px 0;">
+        <p style="color: #999; font-size: 12px;">
+            If you didn't create an account, please ignore this email.
+        </p>
+    </div>
+    """
+
+    enqueue_email(
+        to_email=user.email,
+        subject="Verify your email - The Hive",
+        html=html_content,
+        from_email=from_email,
+    )
     return True
 
 
@@ -148,6 +136,8 @@ class MeView(APIView):
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = PUBLIC_THROTTLES
+    throttle_scope = 'auth'
 
     def post(self, request):
         email = request.data.get("email")
@@ -159,10 +149,26 @@ class LoginView(APIView):
         try:
             user = User.objects.get(email=email)
         except User.DoesNotExist:
-            return Response({"message": "Invalid credentials"}, status=401)
+            user = None
 
-        if not verify_password(password, user.password):
-            return Response({"message": "Invalid credentials"}, status=401)
+        try:
+            if user is None:
+                # Hash anyway so response time doesn't reveal whether the email exists
+                hashers.hash_password(password)
+                return Response({"message": "Invalid credentials"}, status=401)
+
+            valid, needs_rehash = hashers.verify_password(password, user.password)
+            if not valid:
+                return Response({"message": "Invalid credentials"}, status=401)
+
+            # Upgrade legacy or outdated hashes while we have the plain password
+            if needs_rehash:
+                user.password = hashers.hash_password(password)
+                user.save(update_fields=['password'])
+        except hashers.PasswordHashingBusy:
+            response = Response({"message": "Too many login attempts, please try again shortly."}, status=503)
+            response['Retry-After'] = '1'
+            return response
 
         tokens = get_tokens_for_user(user)
         data = {
@@ -191,6 +197,8 @@ class LoginView(APIView):
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = PUBLIC_THROTTLES
+    throttle_scope = 'auth'
 
     def post(self, request):
         email = request.data.get("email")
@@ -216,9 +224,16 @@ class RegisterView(APIView):
         if User.objects.filter(email=email).exists():
             return Response({"message": "User with this email already exists."}, status=400)
 
+        try:
+            hashed_password = password_hash(password)
+        except hashers.PasswordHashingBusy:
+            response = Response({"message": "Too many requests, please try again shortly."}, status=503)
+            response['Retry-After'] = '1'
+            return response
+
         user = User.objects.create(
             email=email,
-            password=password_hash(password),
+            password=hashed_password,
             first_name=first_name,
             last_name=last_name,
             is_verified=False  # User needs to verify email
@@ -288,6 +303,10 @@ class LogoutView(APIView):
             except Exception:
                 pass
 
+        # Drop the cached principal and reject this access token from now on
+        if request.auth is not None:
+            revoke_token(request.auth)
+
         response = Response({"message": "Logout successful"})
         cookie_settings = get_cookie_settings()
         
@@ -1,13 +1,166 @@
+import asyncio
 import json
+import logging
+import time
+import zlib
+import msgpack
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
 from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from urllib.parse import parse_qs
+from rest_framework_simplejwt.tokens import UntypedToken
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_api.models import User, Exchange, Message, Chat, Notification
+from rest_api.auth.principal_cache import get_principal
+from rest_api import content_scanner, metrics, ratelimit
+
+logger = logging.getLogger(__name__)
+
+# Close codes sent to clients (4000-4999 are reserved for applications)
+CLOSE_FORBIDDEN = 4403
+CLOSE_IDLE_TIMEOUT = 4408
+CLOSE_CONNECTION_LIMIT = 4429
+
+# Opt-in compact protocol, requested as a WebSocket subprotocol. Server frames are
+# binary MessagePack maps; frames over WS_COMPACT_DEFLATE_THRESHOLD bytes are
+# zlib-compressed (those start with 0x78, which no MessagePack map does).
+# Chat messages carry only user_id, with user objects sent once per frame under 'users'.
+# Clients may send JSON text or binary MessagePack maps (uncompressed) on it.
+COMPACT_SUBPROTOCOL = 'hive.compact.v1'
+
+
+class ConnectionRegistry:
+    """Open WebSocket connections of this worker process, for admission control"""
+    
+    def __init__(self):
+        self.total = 0
+        self.per_user = {}
+    
+    def register(self, user_id):
+        """Admit a connection if neither the global nor the per-user limit is reached"""
+        if self.total >= settings.WS_MAX_CONNECTIONS:
+            return False
+        if self.per_user.get(user_id, 0) >= settings.WS_MAX_CONNECTIONS_PER_USER:
+            return False
+        self.total += 1
+        self.per_user[user_id] = self.per_user.get(user_id, 0) + 1
+        return True
+    
+    def unregister(self, user_id):
+        self.total -= 1
+        remaining = self.per_user.get(user_id, 1) - 1
+        if remaining > 0:
+            self.per_user[user_id] = remaining
+        else:
+            self.per_user.pop(user_id, None)
+
+
+connection_registry = ConnectionRegistry()
 
 
 class AuthenticatedWebsocketConsumer(AsyncWebsocketConsumer):
-    """Base consumer with JWT authentication from query params or cookies"""
+    """
+    Base consumer with JWT authentication from query params or cookies,
+    admission control and ping/pong heartbeats with idle eviction
+    """
+    
+    admitted_user_id = None
+    heartbeat_task = None
+    compact = False
+    
+    async def admit(self, user):
+        """
+        Admission control, called by connect() once the user is known.
+        Rejected clients get an error frame and a close code they can back off on.
+        """
+        if connection_registry.register(user.id):
+            self.admitted_user_id = user.id
+            metrics.gauge_inc(f'ws.connections.{type(self).__name__}')
+            return True
+        
+        metrics.counter_inc(f'ws.rejected.{type(self).__name__}')
+        await self.reject('Too many open connections, please try again later', CLOSE_CONNECTION_LIMIT)
+        return False
+    
+    async def reject(self, error, code):
+        """Complete the handshake only to send an error frame and a close code"""
+        await super().accept()
+        await self.send_frame({
+            'type': 'error',
+            'error': error,
+        })
+        await self.close(code=code)
+    
+    async def accept(self, subprotocol=None):
+        if subprotocol is None and COMPACT_SUBPROTOCOL in self.scope.get('subprotocols', []):
+            subprotocol = COMPACT_SUBPROTOCOL
+        self.compact = subprotocol == COMPACT_SUBPROTOCOL
+        await super().accept(subprotocol)
+        self.last_activity = time.monotonic()
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
+    
+    async def heartbeat(self):
+        """Ping the client periodically and close the connection once it stops answering"""
+        while True:
+            await asyncio.sleep(settings.WS_HEARTBEAT_INTERVAL)
+            if time.monotonic() - self.last_activity > settings.WS_IDLE_TIMEOUT:
+                metrics.counter_inc(f'ws.evicted.{type(self).__name__}')
+                await self.close(code=CLOSE_IDLE_TIMEOUT)
+                return
+            await self.send_frame({'type': 'ping'})
+    
+    async def send_frame(self, frame):
+        """Send a frame as JSON text, or as (compressed) MessagePack on the compact protocol"""
+        if not self.compact:
+            await self.send(text_data=json.dumps(frame))
+            return
+        payload = msgpack.packb(frame, use_bin_type=True)
+        if len(payload) >= settings.WS_COMPACT_DEFLATE_THRESHOLD:
+            payload = zlib.compress(payload)
+        await self.send(bytes_data=payload)
+    
+    def decode_frame(self, text_data=None, bytes_data=None):
+        """A client frame as a dict (JSON text, or MessagePack on the compact protocol); None if unreadable"""
+        try:
+            if text_data is not None:
+                frame = json.loads(text_data)
+            elif self.compact:
+                frame = msgpack.unpackb(bytes_data, raw=False)
+            else:
+                return None
+        except (ValueError, msgpack.UnpackException):
+            return None
+        return frame if isinstance(frame, dict) else None
+    
+    async def websocket_receive(self, message):
+        """Any frame counts as activity; pong replies are consumed here"""
+        # A rejected client may still get frames in before its close goes through
+        if self.admitted_user_id is None:
+            return
+        self.last_activity = time.monotonic()
+        text_data = message.get('text')
+        if text_data and '"pong"' in text_data:
+            try:
+                if json.loads(text_data).get('type') == 'pong':
+                    return
+            except (ValueError, AttributeError):
+                pass
+        await super().websocket_receive(message)
+    
+    async def websocket_disconnect(self, message):
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+        if self.admitted_user_id is not None:
+            connection_registry.unregister(self.admitted_user_id)
+            metrics.gauge_dec(f'ws.connections.{type(self).__name__}')
+            self.admitted_user_id = None
+        await super().websocket_disconnect(message)
     
     async def authenticate_user(self):
         """Authenticate user from query params or cookies"""
@@ -18,7 +171,6 @@ class AuthenticatedWebsocketConsumer(AsyncWebsocketConsumer):
             query_string = self.scope.get('query_string', b'').decode('utf-8')
             
             if query_string:
-                from urllib.parse import parse_qs
                 params = parse_qs(query_string)
                 token_list = params.get('token', [])
                 if token_list:
@@ -42,27 +194,16 @@ class AuthenticatedWebsocketConsumer(AsyncWebsocketConsumer):
     def get_user_from_token(self, token):
         """Get user from JWT token"""
         try:
-            from rest_framework_simplejwt.tokens import UntypedToken
-            from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-            from django.conf import settings
-            import jwt
-            
             try:
-                UntypedToken(token)
+                validated_token = UntypedToken(token)
             except (InvalidToken, TokenError):
                 return None
             
-            decoded_data = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-            user_id = decoded_data.get('user_id')
-            
+            user_id = validated_token.get('user_id')
             if not user_id:
                 return None
             
-            try:
-                user = User.objects.get(id=user_id)
-                return user
-            except User.DoesNotExist:
-                return None
+            return get_principal(user_id, validated_token.get(api_settings.JTI_CLAIM))
         except Exception:
             return None
 
@@ -79,6 +220,20 @@ class ChatConsumer(AuthenticatedWebsocketConsumer):
             return
         
         self.user = user
+        self.event_times = {}
+        self.is_typing = False
+        self.message_bucket = ratelimit.TokenBucket(
+            settings.CHAT_RATE_LIMIT_REFILL, settings.CHAT_RATE_LIMIT_BURST
+        )
+        
+        # Only the exchange's participants may join its room, count as present or type
+        if not await self.is_participant():
+            await self.reject('You are not a participant of this exchange', CLOSE_FORBIDDEN)
+            return
+        
+        if not await self.admit(user):
+            return
+        await self.join_presence()
         
         # Join room group
         await self.channel_layer.group_add(
@@ -88,31 +243,67 @@ class ChatConsumer(AuthenticatedWebsocketConsumer):
         
         await self.accept()
         
+        # Announce presence and ask members already in the room to announce theirs
+        await self.broadcast_presence('online', reply_to=self.channel_name)
+        self.presence_task = asyncio.create_task(self.presence_heartbeat())
+        
         # Send existing messages
         await self.send_existing_messages()
+        await self.mark_chat_read()
     
     async def disconnect(self, close_code):
+        if hasattr(self, 'presence_task'):
+            self.presence_task.cancel()
+            # The user stays online while another tab or device has the chat open
+            if await self.leave_presence() <= 0:
+                await self.broadcast_presence('offline')
+        
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Receive message from WebSocket"""
+        data = self.decode_frame(text_data, bytes_data)
+        if data is None:
+            await self.send_frame({
+                'type': 'error',
+                'error': 'Unreadable frame: send a JSON object, or a MessagePack map on the compact protocol',
+                'code': 'invalid_frame',
+            })
+            return
+        
         try:
-            data = json.loads(text_data)
+            # Typing indicators only go through the channel layer, never the database
+            if data.get('type') == 'typing':
+                await self.handle_typing(bool(data.get('is_typing', True)))
+                return
+            
             message_content = data.get('message', '').strip()
             
             if not message_content:
                 return
             
+            # Rate limit before touching the database
+            allowed, retry_after = await self.consume_message_token()
+            if not allowed:
+                metrics.counter_inc('ws.chat.rate_limited')
+                await self.send_frame({
+                    'type': 'error',
+                    'error': 'You are sending messages too fast',
+                    'code': 'rate_limited',
+                    'retry_after': round(retry_after, 2),
+                })
+                return
+            
             # Check if user is part of exchange
             exchange = await self.get_exchange()
             if not exchange or not await self.is_user_in_exchange(exchange):
-                await self.send(text_data=json.dumps({
+                await self.send_frame({
                     'error': 'You are not authorized to send messages in this exchange'
-                }))
+                })
                 return
             
             # Save message to database and create notification
@@ -150,19 +341,160 @@ class ChatConsumer(AuthenticatedWebsocketConsumer):
                 }
             )
         except Exception:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 'error': 'Failed to send message'
-            }))
+            })
     
     async def chat_message(self, event):
         """Receive message from room group"""
         message = event['message']
         
         # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'message',
-            'data': message
-        }))
+        await self.send_frame(self.messages_frame('message', message))
+        
+        # The recipient has the chat open, so the message is read on arrival
+        if message['user_id'] != str(self.user.id):
+            await self.mark_chat_read()
+    
+    def messages_frame(self, frame_type, messages):
+        """Build a message(s) frame, moving user objects to a side table on the compact protocol"""
+        if not self.compact:
+            return {'type': frame_type, 'data': messages}
+        
+        users = {}
+        compact_messages = []
+        for message in (messages if isinstance(messages, list) else [messages]):
+            message = dict(message)
+            users[message['user_id']] = message.pop('user')
+            compact_messages.append(message)
+        
+        return {
+            'type': frame_type,
+            'data': compact_messages if isinstance(messages, list) else compact_messages[0],
+            'users': users,
+        }
+    
+    async def consume_message_token(self):
+        """Take a token from the connection bucket and the user's shared bucket"""
+        allowed, retry_after = self.message_bucket.consume()
+        if not allowed:
+            return allowed, retry_after
+        return await ratelimit.aconsume(
+            f'ratelimit:chat:user:{self.user.id}',
+            settings.CHAT_USER_RATE_LIMIT_REFILL,
+            settings.CHAT_USER_RATE_LIMIT_BURST,
+        )
+    
+    def allow_event(self, kind, min_interval):
+        """Per-connection rate limit for ephemeral (presence/typing) events"""
+        now = time.monotonic()
+        last = self.event_times.get(kind)
+        if last is not None and now - last < min_interval:
+            return False
+        self.event_times[kind] = now
+        return True
+    
+    async def broadcast_presence(self, status, reply_to=None):
+        """Send this connection's presence to the room group"""
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'presence_event',
+                'user_id': str(self.user.id),
+                'status': status,
+                'expires_in': settings.CHAT_PRESENCE_TTL,
+                'sender_channel': self.channel_name,
+                'reply_to': reply_to,
+            }
+        )
+    
+    def presence_key(self):
+        return f'chat:presence:{self.exchange_id}:{self.user.id}'
+    
+    async def join_presence(self):
+        """Count this connection among the user's open connections to the chat"""
+        try:
+            await cache.aadd(self.presence_key(), 0, timeout=settings.CHAT_PRESENCE_TTL)
+            await cache.aincr(self.presence_key())
+        except Exception as e:
+            logger.warning(f"Presence store unavailable: {e}")
+    
+    async def leave_presence(self):
+        """Uncount this connection; returns how many of the user's connections remain"""
+        try:
+            return await cache.adecr(self.presence_key())
+        except Exception as e:
+            # A missing counter (expired with a dead worker) means nobody else is counted
+            if not isinstance(e, ValueError):
+                logger.warning(f"Presence store unavailable: {e}")
+            return 0
+    
+    async def presence_heartbeat(self):
+        """Re-announce presence so other members can expire it if this worker dies"""
+        while True:
+            await asyncio.sleep(settings.CHAT_PRESENCE_HEARTBEAT_INTERVAL)
+            await self.broadcast_presence('online')
+            # Counters of connections lost with a dead worker expire the same way
+            try:
+                await cache.atouch(self.presence_key(), settings.CHAT_PRESENCE_TTL)
+            except Exception as e:
+                logger.warning(f"Presence store unavailable: {e}")
+    
+    async def presence_event(self, event):
+        """Receive presence update from room group"""
+        if event['sender_channel'] == self.channel_name:
+            return
+        
+        await self.send_frame({
+            'type': 'presence',
+            'data': {
+                'user_id': event['user_id'],
+                'status': event['status'],
+                'expires_in': event['expires_in'],
+            }
+        })
+        
+        # Answer a newcomer directly so it learns who is already online
+        reply_to = event.get('reply_to')
+        if reply_to and self.allow_event('presence_reply', settings.CHAT_EVENT_MIN_INTERVAL):
+            await self.channel_layer.send(reply_to, {
+                'type': 'presence_event',
+                'user_id': str(self.user.id),
+                'status': 'online',
+                'expires_in': settings.CHAT_PRESENCE_TTL,
+                'sender_channel': self.channel_name,
+                'reply_to': None,
+            })
+    
+    async def handle_typing(self, is_typing):
+        """Broadcast typing state, dropping repeats inside the rate limit window"""
+        # A "stopped typing" after "typing" always goes through, everything else is throttled
+        if not (self.is_typing and not is_typing) and not self.allow_event('typing', settings.CHAT_EVENT_MIN_INTERVAL):
+            return
+        self.is_typing = is_typing
+        
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'typing_event',
+                'user_id': str(self.user.id),
+                'is_typing': is_typing,
+                'sender_channel': self.channel_name,
+            }
+        )
+    
+    async def typing_event(self, event):
+        """Receive typing update from room group"""
+        if event['sender_channel'] == self.channel_name:
+            return
+        
+        await self.send_frame({
+            'type': 'typing',
+            'data': {
+                'user_id': event['user_id'],
+                'is_typing': event['is_typing'],
+            }
+        })
     
     @database_sync_to_async
     def get_exchange(self):
@@ -172,6 +504,13 @@ class ChatConsumer(AuthenticatedWebsocketConsumer):
         except Exchange.DoesNotExist:
             return None
     
+    @database_sync_to_async
+    def is_participant(self):
+        """Whether the user is the exchange's provider or requester"""
+        return Exchange.objects.filter(
+            Q(provider_id=self.user.id) | Q(requester_id=self.user.id), id=self.exchange_id
+        ).exists()
+    
     @database_sync_to_async
     def is_user_in_exchange(self, exchange):
         """Check if user is part of exchange"""
@@ -192,6 +531,9 @@ class ChatConsumer(AuthenticatedWebsocketConsumer):
             user=self.user,
             content=content
         )
+        match = content_scanner.scan(content)
+        if match:
+            content_scanner.report_match(match, self.user, 'message', message.id)
         
         # Determine the other user and create notification
         notification_data = None
@@ -242,10 +584,14 @@ class ChatConsumer(AuthenticatedWebsocketConsumer):
         """Send existing messages to client"""
         messages = await self.get_messages()
         
-        await self.send(text_data=json.dumps({
-            'type': 'messages',
-            'data': messages
-        }))
+        await self.send_frame(self.messages_frame('messages', messages))
+    
+    @database_sync_to_async
+    def mark_chat_read(self):
+        """Reset this user's unread counter for the chat"""
+        chat = Chat.objects.filter(exchange_id=self.exchange_id).first()
+        if chat:
+            chat.mark_read(self.user)
     
     @database_sync_to_async
     def get_user_avatar(self, user):
@@ -320,6 +666,9 @@ class ExchangeConsumer(AuthenticatedWebsocketConsumer):
             await self.close()
             return
         
+        if not await self.admit(user):
+            return
+        
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -338,7 +687,7 @@ class ExchangeConsumer(AuthenticatedWebsocketConsumer):
             self.channel_name
         )
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Receive message from WebSocket"""
         # Exchange consumer is read-only, only sends updates
         pass
@@ -348,19 +697,19 @@ class ExchangeConsumer(AuthenticatedWebsocketConsumer):
         exchange_data = event['exchange']
         
         # Send update to WebSocket
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'exchange_update',
             'data': exchange_data
-        }))
+        })
     
     async def send_exchange_state(self):
         """Send current exchange state to client"""
         exchange_data = await self.get_exchange_data()
         
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'exchange_state',
             'data': exchange_data
-        }))
+        })
     
     @database_sync_to_async
     def get_exchange(self):
@@ -408,6 +757,9 @@ class NotificationConsumer(AuthenticatedWebsocketConsumer):
         self.user_id = str(user.id)
         self.room_group_name = f'notifications_{self.user_id}'
         
+        if not await self.admit(user):
+            return
+        
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -424,7 +776,7 @@ class NotificationConsumer(AuthenticatedWebsocketConsumer):
                 self.channel_name
             )
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Receive message from WebSocket"""
         # Notification consumer is read-only, only sends updates
         pass
@@ -434,7 +786,7 @@ class NotificationConsumer(AuthenticatedWebsocketConsumer):
         notification = event['notification']
         
         # Send notification to WebSocket
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'notification',
             'data': notification
-        }))
+        })
@@ -0,0 +1,220 @@
+"""
+Automatic moderation pre-screen for the Hive project
+
+New offers, wants, forum posts, comments and chat messages are scanned against
+the term list in MODERATION_TERMS_FILE before they are stored. Plain terms are
+compiled into an Aho-Corasick automaton, so a scan is one pass over the text
+whatever the number of terms; lines starting with "re:" are regular expressions
+for the few patterns a literal can't express. Matches only count on word
+boundaries ("class" doesn't match "ass").
+
+Term file format, one entry per line ("#" starts a comment):
+
+    buy followers
+    SPAM: crypto giveaway
+    re:HARASSMENT:\bkill\s+your\s*self\b
+
+An optional REASON prefix (one of the Report reasons) sets the report reason,
+OTHER by default. The file is re-read when it changes, checked at most every
+MODERATION_TERMS_RELOAD_INTERVAL seconds, so terms can be updated without a
+restart.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from rest_api import metrics
+from rest_api.models import REPORT_REASON_CHOICES, Report
+
+logger = logging.getLogger(__name__)
+
+REPORT_REASONS = {reason for reason, _ in REPORT_REASON_CHOICES}
+DEFAULT_REASON = 'OTHER'
+
+
+@dataclass(frozen=True)
+class Match:
+    term: str
+    reason: str
+
+    @property
+    def description(self):
+        return f"Automatically flagged: matched moderation term '{self.term}'"
+
+
+class TermMatcher:
+    """Aho-Corasick automaton over lowercased terms, plus optional regex patterns"""
+
+    def __init__(self, terms=None, patterns=None):
+        # terms: {term: reason}; patterns: [(pattern, reason)]
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._terms = []
+        for term, reason in (terms or {}).items():
+            self._add(term.lower(), reason)
+        self._build()
+
+        self._patterns = [(re.compile(pattern, re.IGNORECASE), reason) for pattern, reason in (patterns or [])]
+
+    def __len__(self):
+        return len(self._terms) + len(self._patterns)
+
+    def _add(self, term, reason):
+        if not term:
+            return
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(len(self._terms))
+        self._terms.append((term, reason))
+
+    def _build(self):
+        # Breadth-first so a state's failure link is final before its children use it
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def search(self, text):
+        """First match in `text`, or None"""
+        if not text:
+            return None
+        lowered = ' '.join(text.lower().split())
+        goto, fail, output, terms = self._goto, self._fail, self._output, self._terms
+        state = 0
+        for index, char in enumerate(lowered):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for term_index in output[state]:
+                    term, reason = terms[term_index]
+                    start = index - len(term) + 1
+                    if _on_word_boundary(lowered, start, index + 1):
+                        return Match(term, reason)
+
+        for pattern, reason in self._patterns:
+            found = pattern.search(lowered)
+            if found:
+                return Match(found.group(0), reason)
+        return None
+
+
+def _on_word_boundary(text, start, end):
+    before = text[start - 1] if start > 0 else ' '
+    after = text[end] if end < len(text) else ' '
+    return not (before.isalnum() or after.isalnum())
+
+
+def parse_terms(lines):
+    """Parse term file lines into ({term: reason}, [(pattern, reason)])"""
+    terms = {}
+    patterns = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        is_pattern = line.startswith('re:')
+        if is_pattern:
+            line = line[3:]
+        reason = DEFAULT_REASON
+        prefix, _, rest = line.partition(':')
+        if rest and prefix.strip().upper() in REPORT_REASONS:
+            reason, line = prefix.strip().upper(), rest.strip()
+        if is_pattern:
+            try:
+                re.compile(line)
+            except re.error as e:
+                logger.warning(f"Skipping invalid moderation pattern {line!r}: {e}")
+                continue
+            patterns.append((line, reason))
+        else:
+            terms[' '.join(line.split())] = reason
+    return terms, patterns
+
+
+_matcher = TermMatcher()
+_loaded_mtime = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_matcher():
+    """Current matcher, rebuilt when the term file has changed"""
+    global _matcher, _loaded_mtime, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < settings.MODERATION_TERMS_RELOAD_INTERVAL:
+        return _matcher
+
+    with _lock:
+        if now - _checked_at < settings.MODERATION_TERMS_RELOAD_INTERVAL:
+            return _matcher
+        _checked_at = now
+        path = settings.MODERATION_TERMS_FILE
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != _loaded_mtime:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    _matcher = TermMatcher(*parse_terms(f))
+                logger.info(f"Loaded {len(_matcher)} moderation term(s) from {path}")
+            except OSError as e:
+                _matcher = TermMatcher()
+                if mtime is not None:
+                    logger.warning(f"Failed to read moderation terms from {path}: {e}")
+            _loaded_mtime = mtime
+    return _matcher
+
+
+def reload():
+    """Force the term file to be re-read on the next scan (used by tests)"""
+    global _loaded_mtime, _checked_at
+    with _lock:
+        _loaded_mtime = None
+        _checked_at = 0.0
+
+
+def scan(*texts):
+    """First match in any of the texts, or None"""
+    matcher = get_matcher()
+    for text in texts:
+        match = matcher.search(text)
+        if match:
+            return match
+    return None
+
+
+def report_match(match, author, target_type, target_id):
+    """Put a match in the admin report queue as an automatic report"""
+    metrics.counter_inc(f'moderation.flagged.{target_type}')
+    logger.info(f"Flagged {target_type} {target_id} by user {author.id}: {match.term!r}")
+    return Report.objects.create(
+        reporter=None,
+        reported_user=author,
+        target_type=target_type,
+        target_id=target_id,
+        reason=match.reason,
+        description=match.description,
+    )
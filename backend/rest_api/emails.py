@@ -0,0 +1,161 @@
+"""
+Outgoing email queue for the Hive project
+
+Emails are stored as OutgoingEmail rows and sent by the email worker
+(`python manage.py run_email_worker`) in batches through the configured
+transport, with retries and exponential backoff. Queued emails survive
+restarts; a batch claimed by a worker that dies is picked up again once its
+claim expires (EMAIL_QUEUE_SENDING_TIMEOUT).
+"""
+import logging
+import os
+import time
+from datetime import timedelta
+from itertools import zip_longest
+
+import resend
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from rest_api import metrics
+from rest_api.models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+resend.api_key = os.getenv('RESEND_API_KEY', '')
+
+# Emails delivered by the local transport (development and tests)
+outbox = []
+
+
+class ResendTransport:
+    """Sends through the Resend batch API"""
+    max_batch_size = 100
+
+    def send_batch(self, emails):
+        """Send all emails in one call, returning provider ids in the same order"""
+        response = resend.Batch.send([
+            {
+                "from": email.from_email,
+                "to": email.to_email,
+                "subject": email.subject,
+                "html": email.html,
+            }
+            for email in emails
+        ])
+        return [item.get('id', '') for item in response.get('data', [])]
+
+
+class LocalTransport:
+    """Keeps emails in `outbox` instead of sending them"""
+    max_batch_size = 100
+
+    def send_batch(self, emails):
+        for email in emails:
+            logger.info(f"Local email to {email.to_email}: {email.subject}")
+        outbox.extend(emails)
+        return [f'local-{email.id}' for email in emails]
+
+
+TRANSPORTS = {
+    'resend': ResendTransport,
+    'local': LocalTransport,
+}
+
+
+def get_transport():
+    return TRANSPORTS[settings.EMAIL_QUEUE_TRANSPORT]()
+
+
+def enqueue_email(to_email, subject, html, from_email):
+    """Queue an email for the worker"""
+    return OutgoingEmail.objects.create(
+        to_email=to_email,
+        from_email=from_email,
+        subject=subject,
+        html=html,
+    )
+
+
+def queue_depth():
+    """Number of emails waiting to be sent"""
+    return OutgoingEmail.objects.filter(status__in=['PENDING', 'SENDING']).count()
+
+
+def retry_delay(attempts):
+    """Exponential backoff after the given number of failed attempts"""
+    delay = settings.EMAIL_QUEUE_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.EMAIL_QUEUE_RETRY_MAX_DELAY))
+
+
+def claim_batch(batch_size):
+    """Claim due emails; concurrent workers skip rows another worker has locked"""
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=['PENDING', 'SENDING'], next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if emails:
+            OutgoingEmail.objects.filter(id__in=[email.id for email in emails]).update(
+                status='SENDING',
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=settings.EMAIL_QUEUE_SENDING_TIMEOUT),
+            )
+    for email in emails:
+        email.attempts += 1
+    return emails
+
+
+def record_failure(emails, error):
+    """Schedule a retry for emails the transport failed to send, or give up on them"""
+    now = timezone.now()
+    for email in emails:
+        email.last_error = str(error)
+        if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+            email.status = 'FAILED'
+        else:
+            email.status = 'PENDING'
+            email.next_attempt_at = now + retry_delay(email.attempts)
+    OutgoingEmail.objects.bulk_update(emails, ['status', 'next_attempt_at', 'last_error'])
+    metrics.counter_inc('email.send_errors', len(emails))
+
+
+def send_batch(emails, transport):
+    """Send claimed emails, then record delivery or schedule a retry"""
+    started = time.monotonic()
+    try:
+        provider_ids = transport.send_batch(emails)
+    except Exception as e:
+        if len(emails) > 1:
+            # One bad address rejects the whole batch call; send the emails one
+            # at a time so only the ones that actually fail are retried
+            logger.warning(f"Failed to send a batch of {len(emails)} emails, sending them one at a time: {e}")
+            return sum(send_batch([email], transport) for email in emails)
+        logger.warning(f"Failed to send email {emails[0].id}: {e}")
+        record_failure(emails, e)
+        return 0
+
+    metrics.observe('email.batch_duration', time.monotonic() - started)
+    now = timezone.now()
+    for email, provider_id in zip_longest(emails, provider_ids[:len(emails)]):
+        email.status = 'SENT'
+        email.sent_at = now
+        email.provider_id = provider_id or ''
+        email.last_error = ''
+        metrics.observe('email.send_latency', (now - email.created_at).total_seconds())
+    OutgoingEmail.objects.bulk_update(emails, ['status', 'sent_at', 'provider_id', 'last_error'])
+    metrics.counter_inc('email.sent', len(emails))
+    return len(emails)
+
+
+def process_queue(transport=None):
+    """Claim and send one batch. Returns the number of emails claimed"""
+    transport = transport or get_transport()
+    emails = claim_batch(min(settings.EMAIL_QUEUE_BATCH_SIZE, transport.max_batch_size))
+    if emails:
+        send_batch(emails, transport)
+    return len(emails)
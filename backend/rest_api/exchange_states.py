@@ -0,0 +1,302 @@
+"""
+Exchange state machine for the Hive project
+
+Accept, reject, cancel and completion confirmations are each one conditional
+UPDATE ... WHERE status = <expected>, so when the same action arrives twice
+(double-clicks, retries) or two actions race, exactly one request moves the
+exchange and the others see zero rows updated and get the current state back.
+Only that request applies the side effects — slot counters, blocked credits
+and the completion transfer — in the same transaction, so credits can't move
+twice, and the only row locks are the ones the UPDATEs hold until commit.
+
+Notifications and the exchange's websocket update are sent after commit.
+
+    PENDING --accept--> ACCEPTED --both confirm--> COMPLETED
+       |                   |
+       +--reject/cancel----+--cancel--> CANCELLED
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+from rest_api.models import Exchange, Offer, TimeBank, TimeBankTransaction
+from rest_api.moderation import ACTIVE_EXCHANGE_STATUSES, notify_users
+
+logger = logging.getLogger(__name__)
+
+
+class TransitionError(Exception):
+    """The action isn't allowed for this user or this exchange's current state"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def send_exchange_update_ws(exchange):
+    """Send exchange update via WebSocket - utility function"""
+    try:
+        channel_layer = get_channel_layer()
+        room_group_name = f'exchange_{exchange.id}'
+
+        exchange_data = {
+            'id': str(exchange.id),
+            'status': exchange.status,
+            'proposed_at': exchange.proposed_at.isoformat() if exchange.proposed_at else None,
+            'requester_confirmed': exchange.requester_confirmed,
+            'provider_confirmed': exchange.provider_confirmed,
+            'completed_at': exchange.completed_at.isoformat() if exchange.completed_at else None,
+        }
+
+        async_to_sync(channel_layer.group_send)(
+            room_group_name,
+            {
+                'type': 'exchange_update',
+                'exchange': exchange_data
+            }
+        )
+    except Exception as e:
+        logger.warning(f"Failed to send websocket update of exchange {exchange.id}: {e}")
+
+
+def load(exchange_id):
+    return Exchange.objects.select_related('offer', 'provider', 'requester').get(id=exchange_id)
+
+
+def move(exchange, expected, **changes):
+    """
+    Apply `changes` if the exchange still matches `expected` (field lookups);
+    returns whether it did. The changes are mirrored on the instance.
+    """
+    changes['updated_at'] = timezone.now()
+    if not Exchange.objects.filter(id=exchange.id, **expected).update(**changes):
+        return False
+    for field, value in changes.items():
+        setattr(exchange, field, value)
+    return True
+
+
+def emit(exchange, notifications):
+    """Notify (user_id, content) pairs and push the exchange's state once committed"""
+    notify_users([(user_id, content) for user_id, content in notifications if user_id])
+    transaction.on_commit(lambda: send_exchange_update_ws(exchange))
+
+
+def unblock(user_id, hours):
+    """Return blocked credits to a user (if they have a time bank)"""
+    timebank = TimeBank.objects.select_for_update().filter(user_id=user_id).first()
+    if timebank:
+        timebank.unblock_credit(hours)
+
+
+def accept(exchange_id, user):
+    """Provider accepts a pending exchange; returns (exchange, changed)"""
+    exchange = load(exchange_id)
+    if exchange.provider_id != user.id:
+        raise TransitionError("Only provider can accept exchange", status=403)
+
+    offer = exchange.offer
+    with transaction.atomic():
+        if not move(exchange, {'status': 'PENDING'}, status='ACCEPTED'):
+            exchange.refresh_from_db()
+            if exchange.status == 'ACCEPTED':
+                return exchange, False
+            raise TransitionError("Exchange is not in pending status")
+
+        # One conditional UPDATE of the offer's counters, so concurrent accepts
+        # of different exchanges can't fill more slots than there are
+        if not offer.accept_slot():
+            if offer.activity_type == 'group':
+                # Group offer: ACCEPTED + COMPLETED reached person_count
+                raise TransitionError(f"All {offer.person_count} slots are already filled")
+            # 1-to-1 offer: only one can be accepted at a time
+            raise TransitionError(
+                "This offer already has an accepted exchange. Only one exchange can be accepted for 1-to-1 offers."
+            )
+        exchange.counted_status = 'ACCEPTED'  # moved by accept_slot
+
+        emit(exchange, [
+            (exchange.requester_id, f"Your handshake request for '{offer.title}' has been accepted!"),
+        ])
+    return exchange, True
+
+
+def reject(exchange_id, user):
+    """Provider declines a pending exchange; returns (exchange, changed)"""
+    exchange = load(exchange_id)
+    if exchange.provider_id != user.id:
+        raise TransitionError("Only provider can reject exchange", status=403)
+
+    offer = exchange.offer
+    is_want = offer.type == 'want'
+    with transaction.atomic():
+        if not move(exchange, {'status': 'PENDING'}, status='CANCELLED'):
+            exchange.refresh_from_db()
+            if exchange.status == 'CANCELLED':
+                return exchange, False
+            raise TransitionError("Exchange is not in pending status")
+        Offer.move_slot(offer.id, 'PENDING', 'CANCELLED')
+        exchange.counted_status = 'CANCELLED'
+
+        # For OFFER: unblock requester's credits
+        # For WANT: DO NOT unblock - credits are tied to the want listing, not the exchange
+        if is_want:
+            message = f"Your offer to help with '{offer.title}' has been declined."
+        else:
+            unblock(exchange.requester_id, exchange.time_spent)
+            message = f"Your handshake request for '{offer.title}' has been rejected. Your time credits have been unfrozen."
+        emit(exchange, [(exchange.requester_id, message)])
+    return exchange, True
+
+
+def cancel(exchange_id, user):
+    """Requester withdraws a pending or accepted exchange; returns (exchange, changed)"""
+    exchange = load(exchange_id)
+    if exchange.requester_id != user.id:
+        raise TransitionError("Only requester can cancel their own request", status=403)
+
+    offer = exchange.offer
+    with transaction.atomic():
+        # Statuses only move forward, so this retries at most once (PENDING -> ACCEPTED)
+        while True:
+            if exchange.status == 'CANCELLED':
+                return exchange, False
+            if exchange.status not in ACTIVE_EXCHANGE_STATUSES:
+                raise TransitionError("Exchange cannot be cancelled in current status")
+            # Cannot cancel if provider has already confirmed completion
+            if exchange.provider_confirmed:
+                raise TransitionError(
+                    "Cannot cancel - provider has already marked as complete. Please complete the exchange."
+                )
+            previous = exchange.status
+            if move(exchange, {'status': previous, 'provider_confirmed': False}, status='CANCELLED'):
+                break
+            exchange.refresh_from_db()
+        Offer.move_slot(offer.id, previous, 'CANCELLED')
+        exchange.counted_status = 'CANCELLED'
+
+        # For OFFER: unblock requester's credits
+        # For WANT: DO NOT unblock - credits are tied to the want listing, not the exchange
+        if offer.type != 'want':
+            unblock(exchange.requester_id, exchange.time_spent)
+        emit(exchange, [
+            (exchange.provider_id, f"Handshake request for '{offer.title}' has been cancelled by {exchange.requester.first_name}."),
+        ])
+    return exchange, True
+
+
+def confirm(exchange_id, user):
+    """
+    A participant confirms completion of an accepted exchange. The confirmation
+    that makes both sides confirmed completes it and transfers the credits.
+    Returns (exchange, completed).
+    """
+    exchange = load(exchange_id)
+    if user.id == exchange.requester_id:
+        field, other = 'requester_confirmed', exchange.provider
+    elif user.id == exchange.provider_id:
+        field, other = 'provider_confirmed', exchange.requester
+    else:
+        raise TransitionError("Not authorized", status=403)
+
+    offer = exchange.offer
+    with transaction.atomic():
+        if not move(exchange, {'status': 'ACCEPTED', field: False}, **{field: True}):
+            exchange.refresh_from_db()
+            if exchange.status == 'COMPLETED':
+                raise TransitionError("Exchange is already completed")
+            if exchange.status != 'ACCEPTED':
+                raise TransitionError("Exchange must be accepted first")
+            raise TransitionError("You have already confirmed")
+        notifications = [
+            (other.id if other else None, f"{user.first_name} {user.last_name} confirmed completion of '{offer.title}'"),
+        ]
+
+        # Whichever confirmation commits second sees both flags set
+        completed = move(
+            exchange,
+            {'status': 'ACCEPTED', 'requester_confirmed': True, 'provider_confirmed': True},
+            status='COMPLETED',
+            completed_at=timezone.now(),
+            requester_confirmed=True,
+            provider_confirmed=True,
+        )
+        if completed:
+            notifications += complete(exchange)
+        emit(exchange, notifications)
+    return exchange, completed
+
+
+def locked_timebank(user):
+    timebank, _ = TimeBank.objects.select_for_update().get_or_create(
+        user=user,
+        defaults={'amount': 1, 'blocked_amount': 0, 'available_amount': 1, 'total_amount': 1}
+    )
+    return timebank
+
+
+def complete(exchange):
+    """Ledger side of a completion (the caller has just moved the exchange to COMPLETED)"""
+    offer = exchange.offer
+    Offer.move_slot(offer.id, 'ACCEPTED', 'COMPLETED')
+    exchange.counted_status = 'COMPLETED'
+
+    # Lock both time banks in a fixed order so crossing completions can't deadlock
+    participants = sorted([exchange.requester, exchange.provider], key=lambda participant: participant.id)
+    timebanks = {participant.id: locked_timebank(participant) for participant in participants}
+
+    # Determine payer and receiver based on offer type:
+    # OFFER: requester (handshake initiator) pays -> provider (offer owner) receives
+    # WANT: provider (want owner) pays -> requester (helper) receives
+    if offer.type == 'want':
+        payer, receiver = exchange.provider, exchange.requester
+    else:
+        payer, receiver = exchange.requester, exchange.provider
+    payer_timebank, receiver_timebank = timebanks[payer.id], timebanks[receiver.id]
+    hours = exchange.time_spent
+
+    # Unfreeze payer's time first
+    payer_timebank.unblock_credit(hours)
+    if not payer_timebank.spend_credit(hours):
+        logger.warning(f"Exchange {exchange.id} completed without a transfer: payer {payer.id} has too few credits")
+        return []
+
+    notifications = []
+    now = timezone.now()
+    if offer.activity_type == 'group':
+        # Group offers pay the receiver once; later completions burn the credit
+        if Offer.objects.filter(id=offer.id, provider_paid=False).update(provider_paid=True, updated_at=now):
+            offer.provider_paid = True
+            receiver_timebank.add_credit(hours)
+            notifications += [
+                (payer.id, f"Exchange '{offer.title}' has been completed! {hours}H time credits have been transferred."),
+                (receiver.id, f"Exchange '{offer.title}' has been completed! You received {hours}H time credits."),
+            ]
+        else:
+            notifications += [
+                (payer.id, f"Group exchange '{offer.title}' has been completed! {hours}H time credits have been used."),
+                (receiver.id, f"Group exchange '{offer.title}' with {payer.first_name} has been completed!"),
+            ]
+    else:
+        receiver_timebank.add_credit(hours)
+        notifications += [
+            (payer.id, f"Exchange '{offer.title}' has been completed! {hours}H time credits have been transferred."),
+            (receiver.id, f"Exchange '{offer.title}' has been completed! You received {hours}H time credits."),
+        ]
+        # Mark 1-1 offer/want as completed
+        Offer.objects.filter(id=offer.id).update(status='COMPLETED', updated_at=now)
+        offer.status = 'COMPLETED'
+
+    TimeBankTransaction.objects.create(
+        from_user=payer,
+        to_user=receiver,
+        exchange=exchange,
+        time_amount=hours,
+        transaction_type='SPEND',
+        description=f'Exchange completed: {offer.title}'
+    )
+    return notifications
@@ -0,0 +1,89 @@
+"""
+Forum search and trending for the Hive project
+
+Search: ForumPost.search_vector holds the weighted title and content, and
+ForumComment.search_vector each comment's text, both maintained by database
+triggers (migrations 0034 and 0040). A comment write only indexes that comment,
+and `search` unions the GIN index lookups on posts and comments.
+
+Trending: ForumPost.hot_score is the recent comment activity of a post, each
+comment (and the post itself) counted with a weight that halves every
+FORUM_TRENDING_HALF_LIFE_HOURS. `update_hot_scores` recomputes the scores from
+one grouped query over the last FORUM_TRENDING_WINDOW_HOURS;
+`python manage.py update_forum_trending --loop` runs it on a schedule so the
+trending listing is a plain index scan.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery
+from django.db import transaction
+from django.db.models import Case, Count, FloatField, Value, When
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from rest_api.models import ForumComment, ForumPost
+
+logger = logging.getLogger(__name__)
+
+# Must match the configuration used by the search vector triggers
+SEARCH_CONFIG = 'english'
+
+# Posts per UPDATE when storing scores (each post adds a WHEN branch)
+SCORE_BATCH_SIZE = 500
+
+
+def search(posts, query):
+    """Filter a ForumPost queryset to posts whose title, content or comments match `query`"""
+    query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    matches = ForumPost.objects.filter(search_vector=query).order_by().values('id').union(
+        ForumComment.objects.filter(search_vector=query).order_by().values('post_id')
+    )
+    return posts.filter(id__in=matches)
+
+
+def decay(age, half_life):
+    """Weight of an event `age` ago"""
+    return 0.5 ** (max(age.total_seconds(), 0) / half_life.total_seconds())
+
+
+def compute_hot_scores(now=None):
+    """{post_id: score} for every post with activity in the trending window"""
+    now = now or timezone.now()
+    window_start = now - timedelta(hours=settings.FORUM_TRENDING_WINDOW_HOURS)
+    half_life = timedelta(hours=settings.FORUM_TRENDING_HALF_LIFE_HOURS)
+
+    scores = defaultdict(float)
+    # Comments are counted per post and hour, which is precise enough for the decay
+    activity = (
+        ForumComment.objects.filter(created_at__gte=window_start)
+        .order_by()
+        .values('post_id', hour=Trunc('created_at', 'hour'))
+        .annotate(comments=Count('id'))
+    )
+    for row in activity:
+        scores[row['post_id']] += row['comments'] * decay(now - row['hour'], half_life)
+
+    # A new post counts as one event so it can surface before anyone replies
+    for post_id, created_at in ForumPost.objects.filter(created_at__gte=window_start).values_list('id', 'created_at'):
+        scores[post_id] += decay(now - created_at, half_life)
+    return dict(scores)
+
+
+def update_hot_scores(now=None):
+    """Store fresh hot scores and reset posts that left the window; returns the number scored"""
+    scores = compute_hot_scores(now)
+    post_ids = list(scores)
+    with transaction.atomic():
+        ForumPost.objects.exclude(id__in=post_ids).exclude(hot_score=0).update(hot_score=0)
+        for start in range(0, len(post_ids), SCORE_BATCH_SIZE):
+            batch = post_ids[start:start + SCORE_BATCH_SIZE]
+            ForumPost.objects.filter(id__in=batch).update(hot_score=Case(
+                *[When(id=post_id, then=Value(round(scores[post_id], 6))) for post_id in batch],
+                default=Value(0.0),
+                output_field=FloatField(),
+            ))
+    logger.info(f"Updated hot scores of {len(post_ids)} forum post(s)")
+    return len(post_ids)
@@ -0,0 +1,127 @@
+"""
+Idempotency keys for mutating API endpoints
+
+A client that may retry a request (mobile networks, double taps) sends an
+`Idempotency-Key` header, unique per intended action. The first response for a
+key (status and body) is stored in the shared cache for IDEMPOTENCY_KEY_TTL
+seconds, and repeated requests with the same key, user and endpoint get it
+replayed (marked with `Idempotent-Replayed: true`) instead of redoing the work.
+Reusing a key with a different request body is rejected with 422.
+
+While the first request runs it holds a lock (for up to IDEMPOTENCY_LOCK_TTL
+seconds); a concurrent duplicate waits for the stored response (up to
+IDEMPOTENCY_LOCK_TIMEOUT seconds) rather than running the view again, and gets
+409 if the first request is still running by then. Server errors aren't
+stored, so they can be retried.
+Requests without the header, and any request while the cache is unreachable,
+run as usual.
+"""
+import functools
+import hashlib
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Seconds between checks while a duplicate waits for the first request
+WAIT_INTERVAL = 0.05
+
+
+def cache_key(request, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'idempotency:{request.user.id}:{request.method}:{request.path}:{digest}'
+
+
+def fingerprint(request):
+    """Hash of the request body, to tell a retry from another request reusing the key"""
+    return hashlib.sha256(request.body).hexdigest()
+
+
+def key_reused():
+    return Response({"error": f"This {HEADER} was already used for a different request"}, status=422)
+
+
+def replay(stored, request_fingerprint):
+    if stored['fingerprint'] != request_fingerprint:
+        return key_reused()
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def wait_for(response_key, lock_key):
+    """
+    Wait up to IDEMPOTENCY_LOCK_TIMEOUT seconds for the request holding the lock.
+    Returns (finished, stored response); the response is None if it failed.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        stored = cache.get(response_key)
+        if stored is not None or cache.get(lock_key) is None:
+            return True, stored
+    return False, None
+
+
+def idempotent(view_method):
+    """Replay the stored response of an APIView method for a repeated Idempotency-Key"""
+
+    @functools.wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}, status=400)
+
+        response_key = cache_key(request, key)
+        lock_key = f'{response_key}:lock'
+        lock = {'token': uuid.uuid4().hex, 'fingerprint': fingerprint(request)}
+        try:
+            stored = cache.get(response_key)
+            if stored is not None:
+                return replay(stored, lock['fingerprint'])
+            while not cache.add(lock_key, lock, timeout=settings.IDEMPOTENCY_LOCK_TTL):
+                holder = cache.get(lock_key)
+                if holder is not None and holder['fingerprint'] != lock['fingerprint']:
+                    return key_reused()
+                finished, stored = wait_for(response_key, lock_key)
+                if stored is not None:
+                    return replay(stored, lock['fingerprint'])
+                if not finished:
+                    return Response({
+                        "error": f"A request with this {HEADER} is still being processed"
+                    }, status=409)
+                # The first request failed without storing a response; retry it
+        except Exception as e:
+            logger.warning(f"Idempotency cache unavailable, running request without it: {e}")
+            return view_method(view, request, *args, **kwargs)
+
+        try:
+            response = view_method(view, request, *args, **kwargs)
+            if response.status_code < 500:
+                try:
+                    cache.set(response_key, {
+                        'fingerprint': lock['fingerprint'],
+                        'status': response.status_code,
+                        'data': response.data,
+                    }, timeout=settings.IDEMPOTENCY_KEY_TTL)
+                except Exception as e:
+                    logger.warning(f"Failed to store idempotent response: {e}")
+            return response
+        finally:
+            try:
+                if cache.get(lock_key) == lock:
+                    cache.delete(lock_key)
+            except Exception as e:
+                logger.warning(f"Failed to release idempotency lock: {e}")
+
+    return wrapper
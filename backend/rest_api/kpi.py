@@ -0,0 +1,98 @@
+"""
+Admin dashboard KPIs for the Hive project
+
+KPIs are computed with one conditional-aggregate query per table and stored as
+KPISnapshot rows. The dashboard reads the latest snapshot and only recomputes
+when it is older than KPI_SNAPSHOT_INTERVAL; trends are read from the snapshot
+history instead of the live tables. `python manage.py snapshot_kpis` records
+snapshots on a schedule so the dashboard rarely has to compute them itself.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from rest_api.models import Exchange, KPISnapshot, Offer, Report, TimeBankTransaction, User
+
+logger = logging.getLogger(__name__)
+
+KPI_FIELDS = [
+    'total_users',
+    'active_offers',
+    'active_wants',
+    'completed_exchanges',
+    'pending_reports',
+    'total_time_credits',
+]
+
+# Snapshot history granularity -> longest range that can be requested
+GRANULARITY_MAX_RANGE = {
+    'minute': timedelta(days=1),
+    'hour': timedelta(days=30),
+    'day': timedelta(days=365),
+}
+
+
+def compute_kpis():
+    """Compute every KPI from the live tables, one conditional aggregate per table"""
+    # Offers and wants in one pass (offers of banned users don't count)
+    listings = Offer.objects.filter(status='ACTIVE', user__is_banned=False).aggregate(
+        active_offers=Count('id', filter=Q(type='offer')),
+        active_wants=Count('id', filter=Q(type='want')),
+    )
+    users = User.objects.aggregate(total_users=Count('id', filter=Q(is_deleted=False)))
+    exchanges = Exchange.objects.aggregate(completed_exchanges=Count('id', filter=Q(status='COMPLETED')))
+    reports = Report.objects.aggregate(pending_reports=Count('id', filter=Q(status='PENDING')))
+    credits = TimeBankTransaction.objects.aggregate(total_time_credits=Sum('time_amount'))
+    return {
+        **users,
+        **listings,
+        **exchanges,
+        **reports,
+        'total_time_credits': credits['total_time_credits'] or 0,
+    }
+
+
+def take_snapshot():
+    """Compute the KPIs and store them"""
+    return KPISnapshot.objects.create(**compute_kpis())
+
+
+def latest_snapshot(max_age=None):
+    """Latest snapshot, or a new one if there is none younger than max_age seconds"""
+    if max_age is None:
+        max_age = settings.KPI_SNAPSHOT_INTERVAL
+    snapshot = KPISnapshot.objects.first()
+    if snapshot is None or snapshot.created_at < timezone.now() - timedelta(seconds=max_age):
+        snapshot = take_snapshot()
+    return snapshot
+
+
+def history(granularity, since):
+    """Last snapshot in each `granularity` bucket since `since`, oldest first"""
+    buckets = (
+        KPISnapshot.objects.filter(created_at__gte=since)
+        .order_by()
+        .annotate(bucket=Trunc('created_at', granularity))
+        .values('bucket')
+        .annotate(last_id=Max('id'))
+    )
+    last_ids = [bucket['last_id'] for bucket in buckets]
+    return sorted(KPISnapshot.objects.in_bulk(last_ids).values(), key=lambda snapshot: snapshot.created_at)
+
+
+def prune_snapshots():
+    """Delete snapshots older than KPI_SNAPSHOT_RETENTION_DAYS"""
+    cutoff = timezone.now() - timedelta(days=settings.KPI_SNAPSHOT_RETENTION_DAYS)
+    deleted, _ = KPISnapshot.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def serialize_snapshot(snapshot):
+    return {
+        'snapshot_at': snapshot.created_at,
+        **{field: getattr(snapshot, field) for field in KPI_FIELDS},
+    }
@@ -0,0 +1,85 @@
+import logging
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from rest_api import emails, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Send queued emails (runs until stopped, or drains the queue once with --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.EMAIL_QUEUE_WORKERS,
+            help='Number of worker threads sending batches concurrently'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Send everything that is due, then exit'
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            sent = 0
+            while True:
+                claimed = emails.process_queue()
+                if not claimed:
+                    break
+                sent += claimed
+            self.stdout.write(self.style.SUCCESS(f'Processed {sent} queued email(s)'))
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+        workers = [
+            threading.Thread(target=self.work, args=(stop,), name=f'email-worker-{i}')
+            for i in range(max(1, options['workers']))
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Email worker started with {len(workers)} thread(s)')
+
+        while not stop.is_set():
+            try:
+                depth = emails.queue_depth()
+                metrics.gauge_set('email.queue_depth', depth)
+                snapshot = metrics.snapshot()
+                latency = snapshot['timings'].get('email.send_latency', {})
+                logger.info(
+                    f"Email queue depth={depth} sent={snapshot['counters'].get('email.sent', 0)} "
+                    f"errors={snapshot['counters'].get('email.send_errors', 0)} "
+                    f"avg_latency={latency.get('avg', 0):.2f}s max_latency={latency.get('max', 0):.2f}s"
+                )
+            except Exception as e:
+                logger.warning(f"Failed to read email queue depth: {e}")
+            finally:
+                close_old_connections()
+            stop.wait(settings.EMAIL_QUEUE_METRICS_INTERVAL)
+
+        for worker in workers:
+            worker.join()
+        self.stdout.write('Email worker stopped')
+
+    def work(self, stop):
+        transport = emails.get_transport()
+        while not stop.is_set():
+            try:
+                claimed = emails.process_queue(transport)
+            except Exception as e:
+                logger.exception(f"Email worker error: {e}")
+                claimed = 0
+            finally:
+                close_old_connections()
+            if not claimed:
+                stop.wait(settings.EMAIL_QUEUE_POLL_INTERVAL)
@@ -0,0 +1,55 @@
+import logging
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from rest_api import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Longest sleep between checks, so a stop signal or clock change is noticed
+MAX_SLEEP = 60
+
+
+class Command(BaseCommand):
+    help = 'Expire stale exchange requests and ended offers, and send exchange reminders (or keep doing it with --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and wake up whenever an expiry or reminder is due'
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            results = scheduler.run_jobs()
+            self.stdout.write(self.style.SUCCESS(
+                f"Sent {results['remind']} reminder(s) and {results['nudge']} completion reminder(s), "
+                f"expired {results['expire']} request(s) and {results['expire_offers']} offer(s)"
+            ))
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+        timers = scheduler.ExchangeScheduler()
+        self.stdout.write(f'Exchange scheduler started (timer heap rebuilt every {timers.refresh_interval})')
+        while not stop.is_set():
+            try:
+                timers.tick()
+            except Exception as e:
+                logger.exception(f"Exchange scheduler error: {e}")
+                timers.rebuilt_at = None  # start over from the database
+            finally:
+                close_old_connections()
+            if timers.rebuilt_at is None:
+                delay = MAX_SLEEP
+            else:
+                delay = (timers.next_wakeup() - timezone.now()).total_seconds()
+            stop.wait(min(max(delay, 0), MAX_SLEEP))
+        self.stdout.write('Exchange scheduler stopped')
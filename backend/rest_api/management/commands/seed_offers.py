@@ -1,16 +1,12 @@
 from django.core.management.base import BaseCommand
 from rest_api.models import User, UserProfile, Offer, Exchange, TimeBankTransaction, TimeBank, ExchangeRating
-import hashlib
+from rest_api.auth.views import password_hash
 import secrets
 import string
 from datetime import datetime, timedelta
 from django.utils import timezone
 
 
-def password_hash(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-
 def generate_password(length=12):
     """Generate a random password"""
     alphabet = string.ascii_letters + string.digits
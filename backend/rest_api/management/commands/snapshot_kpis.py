@@ -0,0 +1,56 @@
+import logging
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from rest_api import kpi
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Record an admin KPI snapshot (or keep recording them with --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and record a snapshot every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=settings.KPI_SNAPSHOT_INTERVAL,
+            help='Seconds between snapshots when looping'
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            snapshot = self.snapshot()
+            self.stdout.write(self.style.SUCCESS(f'Recorded {snapshot}'))
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+        self.stdout.write(f"Recording KPI snapshots every {options['interval']}s")
+        while not stop.is_set():
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.exception(f"Failed to record KPI snapshot: {e}")
+            finally:
+                close_old_connections()
+            stop.wait(options['interval'])
+        self.stdout.write('KPI snapshots stopped')
+
+    def snapshot(self):
+        snapshot = kpi.take_snapshot()
+        pruned = kpi.prune_snapshots()
+        if pruned:
+            logger.info(f"Pruned {pruned} old KPI snapshot(s)")
+        return snapshot
@@ -0,0 +1,49 @@
+import logging
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from rest_api import forum
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recompute forum trending scores (or keep recomputing them with --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and recompute the scores every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=settings.FORUM_TRENDING_INTERVAL,
+            help='Seconds between updates when looping'
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            scored = forum.update_hot_scores()
+            self.stdout.write(self.style.SUCCESS(f'Scored {scored} forum post(s)'))
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+        self.stdout.write(f"Updating forum trending scores every {options['interval']}s")
+        while not stop.is_set():
+            try:
+                forum.update_hot_scores()
+            except Exception as e:
+                logger.exception(f"Failed to update forum trending scores: {e}")
+            finally:
+                close_old_connections()
+            stop.wait(options['interval'])
+        self.stdout.write('Forum trending updates stopped')
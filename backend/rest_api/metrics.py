@@ -0,0 +1,67 @@
+"""
+Lightweight in-process metrics for the Hive project
+
+Gauges, counters and timings are kept per worker process and exposed to
+admins through AdminMetricsView.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_gauges = defaultdict(int)
+_counters = defaultdict(int)
+_timings = {}
+
+
+def gauge_inc(name, value=1):
+    with _lock:
+        _gauges[name] += value
+
+
+def gauge_dec(name, value=1):
+    with _lock:
+        _gauges[name] -= value
+
+
+def gauge_set(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def counter_inc(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, seconds):
+    """Record a duration (count, total, max)"""
+    with _lock:
+        timing = _timings.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        timing['count'] += 1
+        timing['total'] += seconds
+        timing['max'] = max(timing['max'], seconds)
+
+
+def snapshot():
+    """Return a copy of all metrics"""
+    with _lock:
+        return {
+            'gauges': dict(_gauges),
+            'counters': dict(_counters),
+            'timings': {
+                name: {
+                    'count': timing['count'],
+                    'avg': timing['total'] / timing['count'] if timing['count'] else 0.0,
+                    'max': timing['max'],
+                }
+                for name, timing in _timings.items()
+            },
+        }
+
+
+def reset():
+    """Clear all metrics (used by tests)"""
+    with _lock:
+        _gauges.clear()
+        _counters.clear()
+        _timings.clear()
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_inbox(apps, schema_editor):
+    """Point existing chats at their newest message and treat their history as read"""
+    Chat = apps.get_model('rest_api', 'Chat')
+    Message = apps.get_model('rest_api', 'Message')
+    ChatReadMarker = apps.get_model('rest_api', 'ChatReadMarker')
+
+    for chat in Chat.objects.select_related('exchange').iterator():
+        last_message = Message.objects.filter(chat=chat).order_by('-created_at', '-id').first()
+        if last_message:
+            Chat.objects.filter(pk=chat.pk).update(
+                last_message=last_message, last_message_at=last_message.created_at)
+        participant_ids = {chat.exchange.provider_id, chat.exchange.requester_id} - {None}
+        ChatReadMarker.objects.bulk_create(
+            [ChatReadMarker(
+                chat=chat,
+                user_id=user_id,
+                last_read_message=last_message,
+                last_message_at=last_message.created_at if last_message else None,
+            ) for user_id in participant_ids],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0025_add_forum_models'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rest_api.message'),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ChatReadMarker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.IntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_markers', to='rest_api.chat')),
+                ('last_read_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rest_api.message')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_markers', to='rest_api.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_message_at'], name='chat_marker_user_recent_idx')],
+                'unique_together': {('chat', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
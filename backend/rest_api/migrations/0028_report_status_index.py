@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0027_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['status', 'created_at'], name='report_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0028_report_status_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KPISnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('total_users', models.IntegerField(default=0)),
+                ('active_offers', models.IntegerField(default=0)),
+                ('active_wants', models.IntegerField(default=0)),
+                ('completed_exchanges', models.IntegerField(default=0)),
+                ('pending_reports', models.IntegerField(default=0)),
+                ('total_time_credits', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
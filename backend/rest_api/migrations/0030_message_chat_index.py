@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0029_kpi_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'id'], name='message_chat_id_idx'),
+        ),
+    ]
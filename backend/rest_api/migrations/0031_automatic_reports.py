@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0030_message_chat_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='reporter',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reports_made', to='rest_api.user'),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='target_type',
+            field=models.CharField(choices=[('offer', 'Offer'), ('want', 'Want'), ('exchange', 'Exchange'), ('user', 'User'), ('forum_post', 'Forum Post'), ('forum_comment', 'Forum Comment'), ('message', 'Chat Message')], max_length=20),
+        ),
+    ]
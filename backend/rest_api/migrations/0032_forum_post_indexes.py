@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0031_automatic_reports'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['category', 'created_at'], name='forum_post_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['created_at'], name='forum_post_created_idx'),
+        ),
+    ]
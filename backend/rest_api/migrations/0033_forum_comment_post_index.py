@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0032_forum_post_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumcomment',
+            index=models.Index(fields=['post', 'id'], name='forum_comment_post_idx'),
+        ),
+    ]
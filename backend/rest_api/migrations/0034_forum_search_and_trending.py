@@ -0,0 +1,100 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:03
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+# The search vector is kept up to date by triggers so every write path (views,
+# admin, bulk updates, cascades) maintains it: posts recompute their own vector
+# when the title or content changes, and comment changes recompute their post's.
+CREATE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION rest_api_forum_post_search_vector(post_title text, post_content text, post_id bigint)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('english', coalesce(post_title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(post_content, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(
+            (SELECT string_agg(content, ' ') FROM rest_api_forumcomment WHERE rest_api_forumcomment.post_id = $3), ''
+        )), 'C')
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION rest_api_forumpost_search_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := rest_api_forum_post_search_vector(NEW.title, NEW.content, NEW.id);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rest_api_forumcomment_search_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE rest_api_forumpost
+        SET search_vector = rest_api_forum_post_search_vector(title, content, id)
+        WHERE id = OLD.post_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE rest_api_forumpost
+        SET search_vector = rest_api_forum_post_search_vector(title, content, id)
+        WHERE id = NEW.post_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER forum_post_search_update
+    BEFORE INSERT OR UPDATE OF title, content ON rest_api_forumpost
+    FOR EACH ROW EXECUTE FUNCTION rest_api_forumpost_search_trigger();
+
+CREATE TRIGGER forum_comment_search_update
+    AFTER INSERT OR UPDATE OF content, post_id OR DELETE ON rest_api_forumcomment
+    FOR EACH ROW EXECUTE FUNCTION rest_api_forumcomment_search_trigger();
+
+UPDATE rest_api_forumpost SET search_vector = rest_api_forum_post_search_vector(title, content, id);
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS forum_comment_search_update ON rest_api_forumcomment;
+DROP TRIGGER IF EXISTS forum_post_search_update ON rest_api_forumpost;
+DROP FUNCTION IF EXISTS rest_api_forumcomment_search_trigger();
+DROP FUNCTION IF EXISTS rest_api_forumpost_search_trigger();
+DROP FUNCTION IF EXISTS rest_api_forum_post_search_vector(text, text, bigint);
+"""
+
+
+def create_search_triggers(apps, schema_editor):
+    """Install the triggers and backfill existing posts (PostgreSQL only)"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGERS)
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0033_forum_comment_post_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumpost',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='forumpost',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['hot_score', 'id'], name='forum_post_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='forum_post_search_idx'),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:07
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_slot_counters(apps, schema_editor):
+    """Count the existing exchanges of every offer"""
+    Offer = apps.get_model('rest_api', 'Offer')
+    Exchange = apps.get_model('rest_api', 'Exchange')
+
+    counts = {}
+    for status, field in (('PENDING', 'pending_count'), ('ACCEPTED', 'accepted_count'), ('COMPLETED', 'completed_count')):
+        counts[field] = Coalesce(models.Subquery(
+            Exchange.objects.filter(offer=models.OuterRef('pk'), status=status)
+            .order_by()
+            .values('offer')
+            .annotate(count=models.Count('id'))
+            .values('count')[:1]
+        ), 0)
+    Offer.objects.update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0034_forum_search_and_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='accepted_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_slot_counters, migrations.RunPython.noop),
+    ]
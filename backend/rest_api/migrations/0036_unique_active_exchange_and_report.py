@@ -0,0 +1,99 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:09
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def cancel_duplicate_requests(apps, schema_editor):
+    """
+    Cancel all but one open request per (offer, requester) so the constraint can
+    be created: accepted ones are kept first, then the oldest. Requesters of
+    offers get the blocked hours of the cancelled requests back.
+    """
+    Exchange = apps.get_model('rest_api', 'Exchange')
+    Offer = apps.get_model('rest_api', 'Offer')
+    TimeBank = apps.get_model('rest_api', 'TimeBank')
+
+    duplicates = (
+        Exchange.objects.filter(status__in=['PENDING', 'ACCEPTED'], offer__isnull=False)
+        .order_by()
+        .values('offer_id', 'requester_id')
+        .annotate(count=models.Count('id'))
+        .filter(count__gt=1)
+    )
+    offer_ids = set()
+    for group in duplicates:
+        exchanges = list(
+            Exchange.objects.filter(
+                offer_id=group['offer_id'],
+                requester_id=group['requester_id'],
+                status__in=['PENDING', 'ACCEPTED'],
+            ).select_related('offer').order_by('status', 'created_at', 'id')  # ACCEPTED sorts first
+        )
+        for exchange in exchanges[1:]:
+            exchange.status = 'CANCELLED'
+            exchange.save(update_fields=['status'])
+            hours = exchange.offer.time_required
+            if exchange.offer.type == 'offer' and hours:
+                timebank = TimeBank.objects.filter(user_id=exchange.requester_id).first()
+                if timebank:
+                    refund = min(timebank.blocked_amount, hours)
+                    timebank.blocked_amount -= refund
+                    timebank.available_amount += refund
+                    timebank.save(update_fields=['blocked_amount', 'available_amount'])
+        offer_ids.add(group['offer_id'])
+
+    # Same recount as Offer.recount_slots
+    counts = {}
+    for status, field in (('PENDING', 'pending_count'), ('ACCEPTED', 'accepted_count'), ('COMPLETED', 'completed_count')):
+        counts[field] = Coalesce(models.Subquery(
+            Exchange.objects.filter(offer=models.OuterRef('pk'), status=status)
+            .order_by()
+            .values('offer')
+            .annotate(count=models.Count('id'))
+            .values('count')[:1]
+        ), 0)
+    Offer.objects.filter(id__in=offer_ids).update(**counts)
+
+
+def dismiss_duplicate_reports(apps, schema_editor):
+    """Keep the oldest pending report per (reporter, target) and dismiss the rest"""
+    Report = apps.get_model('rest_api', 'Report')
+
+    duplicates = (
+        Report.objects.filter(status='PENDING', reporter__isnull=False)
+        .order_by()
+        .values('reporter_id', 'target_type', 'target_id')
+        .annotate(count=models.Count('id'))
+        .filter(count__gt=1)
+    )
+    for group in duplicates:
+        ids = list(
+            Report.objects.filter(
+                status='PENDING',
+                reporter_id=group['reporter_id'],
+                target_type=group['target_type'],
+                target_id=group['target_id'],
+            ).order_by('created_at', 'id').values_list('id', flat=True)
+        )
+        Report.objects.filter(id__in=ids[1:]).update(status='DISMISSED', admin_notes='Duplicate report')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0035_offer_slot_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_requests, migrations.RunPython.noop),
+        migrations.RunPython(dismiss_duplicate_reports, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exchange',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'ACCEPTED'])), fields=('offer', 'requester'), name='unique_active_exchange'),
+        ),
+        migrations.AddConstraint(
+            model_name='report',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'PENDING')), fields=('reporter', 'target_type', 'target_id'), name='unique_pending_report'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0036_unique_active_exchange_and_report'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exchange',
+            index=models.Index(fields=['offer', 'status', 'proposed_at'], name='exchange_offer_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchange',
+            index=models.Index(fields=['provider', 'status'], name='exchange_provider_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchange',
+            index=models.Index(fields=['requester', 'status'], name='exchange_requester_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchange',
+            index=models.Index(fields=['status', 'proposed_at'], name='exchange_status_proposed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notification_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user', '-created_at'], name='notification_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(condition=models.Q(('is_flagged', False), ('status', 'ACTIVE')), fields=['type', '-created_at'], name='offer_listed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['user', 'type', '-created_at'], name='offer_user_type_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0037_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exchange',
+            name='completion_reminder_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exchange',
+            name='reminder_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='exchange',
+            index=models.Index(fields=['status', 'created_at'], name='exchange_status_created_idx'),
+        ),
+    ]
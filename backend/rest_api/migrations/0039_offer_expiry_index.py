@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0038_exchange_reminders'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['to_date'], name='offer_active_to_date_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:51
+
+import importlib
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Comments get their own search vector instead of being folded into their post's
+# (which re-aggregated the whole thread on every comment write and locked the
+# post): each comment only indexes itself, and search unions the post and
+# comment matches at query time.
+CREATE_TRIGGERS = """
+DROP TRIGGER IF EXISTS forum_comment_search_update ON rest_api_forumcomment;
+
+CREATE OR REPLACE FUNCTION rest_api_forumpost_search_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS rest_api_forum_post_search_vector(text, text, bigint);
+
+CREATE OR REPLACE FUNCTION rest_api_forumcomment_search_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := setweight(to_tsvector('english', coalesce(NEW.content, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER forum_comment_search_update
+    BEFORE INSERT OR UPDATE OF content ON rest_api_forumcomment
+    FOR EACH ROW EXECUTE FUNCTION rest_api_forumcomment_search_trigger();
+
+UPDATE rest_api_forumcomment SET search_vector = setweight(to_tsvector('english', coalesce(content, '')), 'C');
+UPDATE rest_api_forumpost SET search_vector = setweight(to_tsvector('english', coalesce(title, '')), 'A')
+    || setweight(to_tsvector('english', coalesce(content, '')), 'B');
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS forum_comment_search_update ON rest_api_forumcomment;
+DROP TRIGGER IF EXISTS forum_post_search_update ON rest_api_forumpost;
+DROP FUNCTION IF EXISTS rest_api_forumcomment_search_trigger();
+"""
+
+
+def create_search_triggers(apps, schema_editor):
+    """Index comments on their own and stop folding them into posts (PostgreSQL only)"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGERS)
+
+
+def restore_post_triggers(apps, schema_editor):
+    """Go back to the 0034 triggers, which fold comments into their post's vector"""
+    if schema_editor.connection.vendor == 'postgresql':
+        previous = importlib.import_module('rest_api.migrations.0034_forum_search_and_trending')
+        schema_editor.execute(DROP_TRIGGERS)
+        schema_editor.execute(previous.CREATE_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0039_offer_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumcomment',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Backfill before building the index
+        migrations.RunPython(create_search_triggers, restore_post_triggers),
+        migrations.AddIndex(
+            model_name='forumcomment',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='forum_comment_search_idx'),
+        ),
+    ]
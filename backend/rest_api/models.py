@@ -1,4 +1,8 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 
 # Create your models here.
 
@@ -87,6 +91,14 @@ class UserProfile(models.Model):
         return f"{self.user.first_name} {self.user.last_name}" if self.user.first_name else self.user.email
 
 
+# Exchange statuses that take up a slot of their offer -> Offer counter field
+SLOT_COUNTERS = {
+    'PENDING': 'pending_count',
+    'ACCEPTED': 'accepted_count',
+    'COMPLETED': 'completed_count',
+}
+
+
 class Offer(models.Model):
 
     user = models.ForeignKey(
@@ -116,15 +128,127 @@ class Offer(models.Model):
     to_date = models.DateTimeField(null=True, blank=True)
     is_flagged = models.BooleanField(default=False)  # Flagged by admin for removal
     flagged_reason = models.TextField(blank=True)  # Reason for flagging
+    # Exchanges per status, maintained by the exchange transitions (see Exchange.counted_status)
+    pending_count = models.PositiveIntegerField(default=0, editable=False)
+    accepted_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Dashboard and KPIs: listed offers and wants, newest first
+            models.Index(
+                fields=['type', '-created_at'],
+                condition=models.Q(status='ACTIVE', is_flagged=False),
+                name='offer_listed_idx',
+            ),
+            # Profile pages: a user's offers or wants, newest first
+            models.Index(fields=['user', 'type', '-created_at'], name='offer_user_type_idx'),
+            # Offer expiry: active offers by end date
+            models.Index(
+                fields=['to_date'],
+                condition=models.Q(status='ACTIVE'),
+                name='offer_active_to_date_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Slot counters only change through F() updates; saving a loaded offer must
+        # not write back counter values that another request has since changed
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in SLOT_COUNTERS.values()
+            ]
+        super().save(*args, **kwargs)
+
     def block_time(self):
         return self.user.timebank.block_credit(self.time_required)
 
     def release_time(self):
         self.user.timebank.unblock_credit(self.time_required)
 
+    @property
+    def total_slots(self):
+        return self.person_count if self.activity_type == 'group' else 1
+
+    @property
+    def active_slots(self):
+        """Pending and accepted exchanges"""
+        return self.pending_count + self.accepted_count
+
+    @property
+    def filled_slots(self):
+        """Accepted and completed exchanges"""
+        return self.accepted_count + self.completed_count
+
+    @property
+    def has_exchanges(self):
+        """Any exchange that isn't cancelled (such offers can't be edited or deleted)"""
+        return self.pending_count + self.accepted_count + self.completed_count > 0
+
+    def claim_slot(self):
+        """
+        Count a new pending exchange. Group offers only take requests while fewer
+        than person_count are pending or accepted; the check and the increment
+        are one conditional UPDATE, so concurrent requests can't overfill them.
+        Returns False when the offer is full.
+        """
+        offers = Offer.objects.filter(pk=self.pk)
+        if self.activity_type == 'group':
+            offers = offers.alias(
+                active=models.F('pending_count') + models.F('accepted_count')
+            ).filter(active__lt=models.F('person_count'))
+        return offers.update(pending_count=models.F('pending_count') + 1) == 1
+
+    def accept_slot(self):
+        """
+        Move a pending exchange to accepted if a slot is free: group offers up to
+        person_count accepted or completed, 1-to-1 offers one accepted at a time.
+        Returns False when no slot is free.
+        """
+        offers = Offer.objects.filter(pk=self.pk)
+        if self.activity_type == 'group':
+            offers = offers.alias(
+                filled=models.F('accepted_count') + models.F('completed_count')
+            ).filter(filled__lt=models.F('person_count'))
+        else:
+            offers = offers.filter(accepted_count=0)
+        return offers.update(
+            pending_count=Greatest(models.F('pending_count') - 1, 0),
+            accepted_count=models.F('accepted_count') + 1,
+        ) == 1
+
+    @classmethod
+    def move_slot(cls, offer_id, old_status, new_status):
+        """Move one exchange between the slot counters of an offer"""
+        if offer_id is None or old_status == new_status:
+            return
+        changes = {}
+        if old_status in SLOT_COUNTERS:
+            field = SLOT_COUNTERS[old_status]
+            changes[field] = Greatest(models.F(field) - 1, 0)
+        if new_status in SLOT_COUNTERS:
+            field = SLOT_COUNTERS[new_status]
+            changes[field] = models.F(field) + 1
+        if changes:
+            cls.objects.filter(pk=offer_id).update(**changes)
+
+    @classmethod
+    def recount_slots(cls, offer_ids):
+        """Recompute the slot counters from the exchanges (after bulk status updates)"""
+        counts = {}
+        for status, field in SLOT_COUNTERS.items():
+            counts[field] = Coalesce(models.Subquery(
+                Exchange.objects.filter(offer=models.OuterRef('pk'), status=status)
+                .order_by()
+                .values('offer')
+                .annotate(count=models.Count('id'))
+                .values('count')[:1]
+            ), 0)
+        cls.objects.filter(id__in=offer_ids).update(**counts)
+
     def __str__(self):
         return self.title
 
@@ -151,10 +275,43 @@ class Exchange(models.Model):
     proposed_at = models.DateTimeField(null=True, blank=True)
     requester_confirmed = models.BooleanField(default=False)
     provider_confirmed = models.BooleanField(default=False)
+    # Reminders sent by rest_api/scheduler.py
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+    completion_reminder_sent_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Offer state on profiles and listings: exchanges of an offer by status and date
+            models.Index(fields=['offer', 'status', 'proposed_at'], name='exchange_offer_status_idx'),
+            # A user's exchanges by status (ban, deletion, profile counts)
+            models.Index(fields=['provider', 'status'], name='exchange_provider_status_idx'),
+            models.Index(fields=['requester', 'status'], name='exchange_requester_status_idx'),
+            # Exchanges due in a time range (reminders, expiry)
+            models.Index(fields=['status', 'proposed_at'], name='exchange_status_proposed_idx'),
+            models.Index(fields=['status', 'created_at'], name='exchange_status_created_idx'),
+        ]
+        constraints = [
+            # One open request per requester and offer
+            models.UniqueConstraint(
+                fields=['offer', 'requester'],
+                condition=models.Q(status__in=['PENDING', 'ACCEPTED']),
+                name='unique_active_exchange',
+            ),
+        ]
+
+    # Status already counted in the offer's slot counters. Set when loaded and
+    # after every save, so the post_save signal only moves the difference.
+    counted_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.counted_status = instance.__dict__.get('status')
+        return instance
+
     def __str__(self):
         return f"Exchange {self.id} - {self.status}"
 
@@ -186,12 +343,52 @@ class Chat(models.Model):
     exchange = models.ForeignKey(Exchange, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
+    # Denormalized pointer to the newest message, maintained by record_message()
+    last_message = models.ForeignKey(
+        'Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Chat for Exchange #{self.exchange.id}"
 
+    def create_read_markers(self):
+        """Create a read marker for each participant of the exchange"""
+        participant_ids = {self.exchange.provider_id, self.exchange.requester_id} - {None}
+        ChatReadMarker.objects.bulk_create(
+            [ChatReadMarker(chat=self, user_id=user_id, last_message_at=self.last_message_at)
+             for user_id in participant_ids],
+            ignore_conflicts=True,
+        )
+
+    def record_message(self, message):
+        """Point the chat at a new message and bump the other participants' unread counters"""
+        Chat.objects.filter(pk=self.pk).filter(
+            models.Q(last_message_at__isnull=True) | models.Q(last_message_at__lte=message.created_at)
+        ).update(last_message=message, last_message_at=message.created_at)
+        ChatReadMarker.objects.filter(chat=self).update(
+            last_message_at=message.created_at,
+            unread_count=models.Case(
+                models.When(user_id=message.user_id, then=models.Value(0)),
+                default=models.F('unread_count') + 1,
+            ),
+            last_read_message=models.Case(
+                models.When(user_id=message.user_id, then=models.Value(message.id)),
+                default=models.F('last_read_message'),
+                output_field=models.BigIntegerField(),
+            ),
+        )
+
+    def mark_read(self, user):
+        """Mark everything up to the last message as read for a participant"""
+        ChatReadMarker.objects.filter(chat=self, user=user).update(
+            unread_count=0,
+            last_read_message=models.Subquery(
+                Chat.objects.filter(pk=self.pk).values('last_message')[:1]
+            ),
+        )
+
 
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -200,6 +397,18 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Notification list, newest first
+            models.Index(fields=['user', '-created_at'], name='notification_user_idx'),
+            # Unread list and mark-all-read
+            models.Index(
+                fields=['user', '-created_at'],
+                condition=models.Q(is_read=False),
+                name='notification_unread_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.email}"
 
@@ -211,10 +420,36 @@ class Message(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Transcript pages: a chat's messages in id order after a cursor
+            models.Index(fields=['chat', 'id'], name='message_chat_id_idx'),
+        ]
+
     def __str__(self):
         return f"Message by {self.user.email} in Exchange #{self.chat.exchange.id}"
 
 
+class ChatReadMarker(models.Model):
+    """Per-participant read state of a chat, backing the inbox"""
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='read_markers')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_read_markers')
+    last_read_message = models.ForeignKey(
+        Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    unread_count = models.IntegerField(default=0)
+    # Copy of chat.last_message_at so the inbox sorts on this table's index
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('chat', 'user')
+        indexes = [
+            models.Index(fields=['user', '-last_message_at'], name='chat_marker_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Read marker of {self.user.email} in Chat #{self.chat_id}"
+
+
 class TimeBank(models.Model):
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, related_name='timebank')
@@ -331,11 +566,15 @@ REPORT_TARGET_CHOICES = [
     ('want', 'Want'),
     ('exchange', 'Exchange'),
     ('user', 'User'),
+    ('forum_post', 'Forum Post'),
+    ('forum_comment', 'Forum Comment'),
+    ('message', 'Chat Message'),
 ]
 
 
 class Report(models.Model):
-    reporter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reports_made')
+    # Null for automatic reports raised by the content scanner
+    reporter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reports_made', null=True, blank=True)
     reported_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reports_received', null=True, blank=True)
     target_type = models.CharField(max_length=20, choices=REPORT_TARGET_CHOICES)
     target_id = models.IntegerField()
@@ -349,6 +588,18 @@ class Report(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Moderation queue: reports filtered by status, newest first
+            models.Index(fields=['status', 'created_at'], name='report_status_created_idx'),
+        ]
+        constraints = [
+            # One open report per reporter and target (automatic reports have no reporter)
+            models.UniqueConstraint(
+                fields=['reporter', 'target_type', 'target_id'],
+                condition=models.Q(status='PENDING'),
+                name='unique_pending_report',
+            ),
+        ]
 
     def __str__(self):
         return f"Report #{self.id} - {self.reason} on {self.target_type} {self.target_id}"
@@ -371,6 +622,55 @@ class EmailVerificationToken(models.Model):
         return timezone.now() > self.expires_at
 
 
+class OutgoingEmail(models.Model):
+    """Persistent outgoing mail queue, drained by the email worker (rest_api/emails.py)"""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    from_email = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255)
+    html = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.IntegerField(default=0)
+    # When the email is next due; while SENDING, when a crashed worker's claim expires
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    provider_id = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Email to {self.to_email}: {self.subject} ({self.status})"
+
+
+
+class KPISnapshot(models.Model):
+    """Admin dashboard KPIs at a point in time, written by rest_api/kpi.py"""
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    total_users = models.IntegerField(default=0)
+    active_offers = models.IntegerField(default=0)
+    active_wants = models.IntegerField(default=0)
+    completed_exchanges = models.IntegerField(default=0)
+    pending_reports = models.IntegerField(default=0)
+    total_time_credits = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"KPI snapshot at {self.created_at}"
+
+
 # Forum feature models
 FORUM_CATEGORY_CHOICES = [
     ('general', 'General'),
@@ -388,9 +688,20 @@ class ForumPost(models.Model):
     category = models.CharField(max_length=20, choices=FORUM_CATEGORY_CHOICES, default='general')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Title and content text; maintained by a database trigger (migrations 0034, 0040)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Decayed recent comment activity, recomputed by `manage.py update_forum_trending`
+    hot_score = models.FloatField(default=0, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Forum listing pages, newest first, with or without a category filter
+            models.Index(fields=['category', 'created_at'], name='forum_post_category_idx'),
+            models.Index(fields=['created_at'], name='forum_post_created_idx'),
+            models.Index(fields=['hot_score', 'id'], name='forum_post_hot_idx'),
+            GinIndex(fields=['search_vector'], name='forum_post_search_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -402,9 +713,16 @@ class ForumComment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='forum_comments')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Comment text; maintained by a database trigger (migration 0040)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Thread pages walk a post's comments by id
+            models.Index(fields=['post', 'id'], name='forum_comment_post_idx'),
+            GinIndex(fields=['search_vector'], name='forum_comment_search_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user.email} on {self.post.title}"
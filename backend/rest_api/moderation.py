@@ -0,0 +1,233 @@
+"""
+Bulk moderation for the Hive project
+
+Set-based versions of the admin actions (ban, warn, remove content, resolve
+reports) so a spam wave can be handled in one request. Each action runs in a
+single transaction: affected exchanges are cancelled with one UPDATE, refunds
+are summed per payer with a grouped aggregate and applied to the time banks in
+batched UPDATEs, and notifications are inserted with bulk_create.
+
+Queryset.update() skips model signals, so cached principals of every user whose
+account or time bank changes are invalidated explicitly, and the slot counters
+of offers with cancelled exchanges are recounted.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least, NullIf
+from django.utils import timezone
+
+from rest_api.auth.principal_cache import invalidate_user
+from rest_api.models import Exchange, Notification, Offer, Report, TimeBank, User
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_EXCHANGE_STATUSES = ['PENDING', 'ACCEPTED']
+
+# Users per UPDATE when applying refunds (each user adds a WHEN branch)
+REFUND_BATCH_SIZE = 500
+
+DEFAULT_REASON = 'Violation of community guidelines'
+
+
+def notify_users(notifications):
+    """Create (user_id, content) notifications in one INSERT and push them after commit"""
+    if not notifications:
+        return []
+    created = Notification.objects.bulk_create([
+        Notification(user_id=user_id, content=content) for user_id, content in notifications
+    ])
+
+    def push():
+        channel_layer = get_channel_layer()
+        for notification in created:
+            try:
+                async_to_sync(channel_layer.group_send)(
+                    f'notifications_{notification.user_id}',
+                    {
+                        'type': 'notification_message',
+                        'notification': {
+                            'id': notification.id,
+                            'content': notification.content,
+                            'is_read': notification.is_read,
+                            'created_at': notification.created_at.isoformat(),
+                        }
+                    }
+                )
+            except Exception as e:
+                logger.warning(f"Failed to push notification {notification.id}: {e}")
+
+    transaction.on_commit(push)
+    return created
+
+
+def apply_refunds(refunds):
+    """Unblock {user_id: hours} of blocked credits, capped at what each user has blocked"""
+    refunds = {user_id: hours for user_id, hours in refunds.items() if user_id and hours}
+    user_ids = list(refunds)
+    for start in range(0, len(user_ids), REFUND_BATCH_SIZE):
+        batch = user_ids[start:start + REFUND_BATCH_SIZE]
+        refund = Case(
+            *[When(user_id=user_id, then=Value(refunds[user_id])) for user_id in batch],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        # Both SET clauses read the row as it was before the UPDATE
+        TimeBank.objects.filter(user_id__in=batch).update(
+            available_amount=F('available_amount') + Least(F('blocked_amount'), refund),
+            blocked_amount=Greatest(F('blocked_amount') - refund, Value(0)),
+            last_update=timezone.now(),
+        )
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    return refunds
+
+
+def cancel_exchanges(condition, refund_wants=True):
+    """
+    Cancel active exchanges matching `condition` (a Q) and refund the blocked
+    credits: the want owner (provider) for wants, the requester for offers.
+    With refund_wants=False want owners keep their credits blocked, as they
+    belong to the want listing rather than the exchange.
+    Returns the cancelled exchanges as dicts for notifications.
+    """
+    ids = list(
+        Exchange.objects.select_for_update()
+        .filter(condition, status__in=ACTIVE_EXCHANGE_STATUSES)
+        .values_list('id', flat=True)
+    )
+    if not ids:
+        return []
+
+    exchanges = Exchange.objects.filter(id__in=ids)
+    cancelled = list(exchanges.values('id', 'provider_id', 'requester_id', 'offer_id', 'offer__title'))
+
+    payer = Case(
+        When(offer__type='want', then=F('provider_id')),
+        default=F('requester_id'),
+    )
+    hours = Coalesce(F('offer__time_required'), NullIf(F('time_spent'), Value(0)), Value(1))
+    refunded = exchanges if refund_wants else exchanges.exclude(offer__type='want')
+    refunds = refunded.order_by().values(payer_id=payer).annotate(hours=Sum(hours))
+    apply_refunds({row['payer_id']: row['hours'] for row in refunds})
+
+    exchanges.update(status='CANCELLED', updated_at=timezone.now())
+    # update() skips the signal that keeps the offers' slot counters
+    Offer.recount_slots({exchange['offer_id'] for exchange in cancelled} - {None})
+    return cancelled
+
+
+def ban_users(user_ids, reason=''):
+    """Ban users and cancel their active exchanges"""
+    reason = reason or DEFAULT_REASON
+    with transaction.atomic():
+        banned_ids = list(
+            User.objects.filter(id__in=user_ids, is_banned=False).values_list('id', flat=True)
+        )
+        User.objects.filter(id__in=banned_ids).update(is_banned=True, updated_at=timezone.now())
+        for user_id in banned_ids:
+            invalidate_user(user_id)
+
+        cancelled = cancel_exchanges(Q(provider_id__in=banned_ids) | Q(requester_id__in=banned_ids))
+
+        banned = set(banned_ids)
+        notifications = [
+            (user_id, f"Your account has been suspended. You can still view content but cannot create offers, start exchanges, or interact with other users. Reason: {reason}")
+            for user_id in banned_ids
+        ]
+        for exchange in cancelled:
+            for user_id in (exchange['provider_id'], exchange['requester_id']):
+                if user_id and user_id not in banned:
+                    notifications.append(
+                        (user_id, f"Exchange #{exchange['id']} has been cancelled because the other user's account was suspended.")
+                    )
+        notify_users(notifications)
+
+    return {"banned_users": len(banned_ids), "cancelled_exchanges": len(cancelled)}
+
+
+def warn_users(user_ids, message):
+    """Increment warning counts and send the warning"""
+    with transaction.atomic():
+        warned_ids = list(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+        User.objects.filter(id__in=warned_ids).update(warning_count=F('warning_count') + 1, updated_at=timezone.now())
+        for user_id in warned_ids:
+            invalidate_user(user_id)
+        notify_users([(user_id, f"⚠️ Admin Warning: {message}") for user_id in warned_ids])
+
+    return {"warned_users": len(warned_ids)}
+
+
+def remove_offers(offer_ids, reason=''):
+    """Flag offers and wants, cancel their active exchanges and return blocked want credits"""
+    reason = reason or DEFAULT_REASON
+    with transaction.atomic():
+        offers = list(
+            Offer.objects.select_for_update()
+            .filter(id__in=offer_ids)
+            .exclude(status__in=['INACTIVE', 'CANCELLED'], is_flagged=True)
+            .values('id', 'user_id', 'type', 'title', 'time_required')
+        )
+        removed_ids = [offer['id'] for offer in offers]
+        # Want owners' credits belong to the want listing and are returned below, once
+        cancelled = cancel_exchanges(Q(offer_id__in=removed_ids), refund_wants=False)
+
+        # Want owners blocked the want's hours when posting it; completed or
+        # expired wants have already paid them out or returned them
+        want_refunds = (
+            Offer.objects.filter(id__in=removed_ids, type='want', status='ACTIVE')
+            .order_by()
+            .values('user_id')
+            .annotate(hours=Sum('time_required'))
+        )
+        apply_refunds({row['user_id']: row['hours'] for row in want_refunds})
+
+        Offer.objects.filter(id__in=removed_ids).update(
+            status='INACTIVE',
+            is_flagged=True,
+            flagged_reason=reason,
+            updated_at=timezone.now(),
+        )
+
+        notifications = [
+            (offer['user_id'], f"Your {offer['type']} '{offer['title']}' has been flagged and removed from the dashboard due to a report. All pending exchanges have been cancelled. Reason: {reason}")
+            for offer in offers
+        ]
+        for exchange in cancelled:
+            for user_id in (exchange['provider_id'], exchange['requester_id']):
+                if user_id:
+                    notifications.append(
+                        (user_id, f"Exchange #{exchange['id']} for '{exchange['offer__title'] or 'N/A'}' has been cancelled by admin. Any blocked credits have been returned. Reason: {reason}")
+                    )
+        notify_users(notifications)
+
+    return {"removed_offers": len(removed_ids), "cancelled_exchanges": len(cancelled)}
+
+
+def resolve_reports(report_ids, admin, status='RESOLVED', admin_notes=''):
+    """Close open reports and tell the reporters"""
+    with transaction.atomic():
+        reports = list(
+            Report.objects.filter(id__in=report_ids, status__in=['PENDING', 'REVIEWED'])
+            .values('id', 'reporter_id')
+        )
+        Report.objects.filter(id__in=[report['id'] for report in reports]).update(
+            status=status,
+            resolved_by=admin,
+            admin_notes=admin_notes or f"Bulk {status.lower()}",
+            updated_at=timezone.now(),
+        )
+        if status == 'DISMISSED':
+            message = "Your report #{id} has been reviewed and dismissed. Thank you for your report."
+        else:
+            message = "Action taken on your report #{id}: The report has been resolved."
+        notify_users([
+            (report['reporter_id'], message.format(id=report['id']))
+            for report in reports
+            if report['reporter_id']  # automatic reports have no reporter
+        ])
+
+    return {"updated_reports": len(reports)}
@@ -0,0 +1,174 @@
+"""
+Token bucket rate limiting for the Hive project
+
+Buckets shared across workers live in Redis and are updated atomically by a
+Lua script, using the Redis clock so workers with skewed clocks agree. If
+Redis is unreachable, limiting degrades to an in-process bucket per worker.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = bucket key; ARGV = rate (tokens/s), burst, cost
+# Returns {allowed (0/1), retry_after seconds as string}
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = burst
+    ts = now
+end
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+# Seconds to skip Redis after a failure, so an outage doesn't add a timeout to every call
+REDIS_RETRY_INTERVAL = 5
+
+# In-process buckets kept while Redis is down; the least recently used go first
+FALLBACK_MAX_BUCKETS = 10000
+
+
+class TokenBucket:
+    """In-process token bucket (one connection, or the fallback when Redis is down)"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def consume(self, cost=1):
+        """Take `cost` tokens. Returns (allowed, retry_after seconds)"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        return False, (cost - self.tokens) / self.rate
+
+
+_fallback_buckets = OrderedDict()
+_fallback_lock = threading.Lock()
+_redis_down_until = 0.0
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.RATE_LIMIT_REDIS_URL,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+        )
+    return _client
+
+
+def _get_async_client():
+    # redis.asyncio connections are bound to the event loop that created them
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = aioredis.Redis.from_url(
+            settings.RATE_LIMIT_REDIS_URL,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _redis_available():
+    return time.monotonic() >= _redis_down_until
+
+
+def _mark_redis_down(e):
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + REDIS_RETRY_INTERVAL
+    logger.warning(f"Rate limit store unavailable, using in-process buckets: {e}")
+
+
+def _evict_fallback_buckets():
+    """Drop buckets idle for a whole refill window (they'd be full again anyway) and any over the cap"""
+    now = time.monotonic()
+    while _fallback_buckets:
+        key, bucket = next(iter(_fallback_buckets.items()))
+        if len(_fallback_buckets) <= FALLBACK_MAX_BUCKETS and now - bucket.updated_at < bucket.burst / bucket.rate:
+            break
+        del _fallback_buckets[key]
+
+
+def _consume_fallback(key, rate, burst, cost):
+    with _fallback_lock:
+        bucket = _fallback_buckets.get(key)
+        if bucket is None:
+            bucket = _fallback_buckets[key] = TokenBucket(rate, burst)
+        _fallback_buckets.move_to_end(key)
+        result = bucket.consume(cost)
+        _evict_fallback_buckets()
+        return result
+
+
+def _parse_result(result):
+    allowed, retry_after = result
+    return bool(int(allowed)), float(retry_after)
+
+
+def consume(key, rate, burst, cost=1):
+    """Take tokens from a shared bucket. Returns (allowed, retry_after seconds)"""
+    if _redis_available():
+        try:
+            return _parse_result(_get_client().eval(TOKEN_BUCKET_SCRIPT, 1, key, rate, burst, cost))
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+    return _consume_fallback(key, rate, burst, cost)
+
+
+async def aconsume(key, rate, burst, cost=1):
+    """Async variant of consume() for consumers, without blocking the event loop"""
+    if _redis_available():
+        try:
+            result = await _get_async_client().eval(TOKEN_BUCKET_SCRIPT, 1, key, rate, burst, cost)
+            return _parse_result(result)
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+    return _consume_fallback(key, rate, burst, cost)
+
+
+def reset():
+    """Forget fallback buckets and Redis failures (used by tests)"""
+    global _redis_down_until
+    with _fallback_lock:
+        _fallback_buckets.clear()
+    _redis_down_until = 0.0
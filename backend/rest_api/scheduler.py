@@ -0,0 +1,261 @@
+"""
+Exchange and offer expiry, and exchange reminders for the Hive project
+
+Time-based jobs, each a set-based query over the exchange and offer indexes:
+- remind: accepted exchanges starting within EXCHANGE_REMINDER_LEAD_HOURS
+- nudge: accepted exchanges whose proposed time passed more than
+  EXCHANGE_COMPLETION_REMINDER_DELAY_HOURS ago, asking the participants who
+  haven't confirmed completion to do so
+- expire: pending requests older than EXCHANGE_PENDING_TTL_HOURS are
+  cancelled, and the requesters' blocked credits returned in bulk
+- expire_offers: active offers and wants past their to_date are deactivated
+  in batched UPDATEs, their pending requests cancelled and the credits blocked
+  for wants released in bulk. Offers with an accepted exchange wait until it
+  is finished; the dashboard hides them by to_date meanwhile.
+
+`ExchangeScheduler` keeps a heap of the times these jobs next become due,
+rebuilt every EXCHANGE_SCHEDULER_REFRESH_INTERVAL seconds from
+(status, proposed_at), (status, created_at) and active to_date index range
+scans that only cover the next interval, so the loop sleeps until something
+is actually due. Reminder timestamps on the exchange and the offer status make
+every job safe to run again.
+`python manage.py run_exchange_scheduler --loop` runs it.
+"""
+import heapq
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from rest_api import moderation
+from rest_api.models import Exchange, Offer
+
+logger = logging.getLogger(__name__)
+
+JOBS = ('remind', 'nudge', 'expire', 'expire_offers')
+
+# Offers per transaction when deactivating expired offers
+OFFER_EXPIRY_BATCH_SIZE = 500
+
+
+def reminder_lead():
+    return timedelta(hours=settings.EXCHANGE_REMINDER_LEAD_HOURS)
+
+
+def nudge_delay():
+    return timedelta(hours=settings.EXCHANGE_COMPLETION_REMINDER_DELAY_HOURS)
+
+
+def pending_ttl():
+    return timedelta(hours=settings.EXCHANGE_PENDING_TTL_HOURS)
+
+
+def claim(exchanges, field, now):
+    """Lock the matching exchanges, stamp `field` and return them as dicts"""
+    claimed = list(
+        exchanges.select_for_update(skip_locked=True, of=('self',))
+        .values('id', 'provider_id', 'requester_id', 'provider_confirmed', 'requester_confirmed',
+                'proposed_at', 'offer__title')
+    )
+    Exchange.objects.filter(id__in=[exchange['id'] for exchange in claimed]).update(**{field: now})
+    return claimed
+
+
+def send_reminders(now=None):
+    """Remind both participants of accepted exchanges that start soon"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = claim(
+            Exchange.objects.filter(
+                status='ACCEPTED',
+                proposed_at__gt=now,
+                proposed_at__lte=now + reminder_lead(),
+                reminder_sent_at__isnull=True,
+            ),
+            'reminder_sent_at',
+            now,
+        )
+        notifications = []
+        for exchange in due:
+            when = timezone.localtime(exchange['proposed_at']).strftime('%Y-%m-%d %H:%M')
+            for user_id in (exchange['provider_id'], exchange['requester_id']):
+                notifications.append((user_id, f"Reminder: your exchange for '{exchange['offer__title']}' is scheduled for {when}."))
+        moderation.notify_users([(user_id, content) for user_id, content in notifications if user_id])
+    return len(due)
+
+
+def send_completion_reminders(now=None):
+    """Ask participants of accepted exchanges that should be over to confirm completion"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = claim(
+            Exchange.objects.filter(
+                status='ACCEPTED',
+                proposed_at__lte=now - nudge_delay(),
+                completion_reminder_sent_at__isnull=True,
+            ),
+            'completion_reminder_sent_at',
+            now,
+        )
+        notifications = []
+        for exchange in due:
+            for user_id, confirmed in ((exchange['provider_id'], exchange['provider_confirmed']),
+                                       (exchange['requester_id'], exchange['requester_confirmed'])):
+                if user_id and not confirmed:
+                    notifications.append((user_id, f"Your exchange for '{exchange['offer__title']}' was scheduled to take place. Please confirm its completion."))
+        moderation.notify_users(notifications)
+    return len(due)
+
+
+def expire_pending(now=None):
+    """Cancel pending requests older than EXCHANGE_PENDING_TTL_HOURS and return the credits"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Want owners' credits stay blocked: they belong to the still listed want
+        cancelled = moderation.cancel_exchanges(
+            Q(status='PENDING', created_at__lte=now - pending_ttl()),
+            refund_wants=False,
+        )
+        notifications = []
+        for exchange in cancelled:
+            title = exchange['offer__title'] or 'N/A'
+            notifications.append((exchange['requester_id'], f"Your request for '{title}' expired without a response. Any blocked credits have been returned."))
+            notifications.append((exchange['provider_id'], f"A pending request for '{title}' expired without a response."))
+        moderation.notify_users([(user_id, content) for user_id, content in notifications if user_id])
+    return len(cancelled)
+
+
+def expire_offers(now=None):
+    """Deactivate active offers and wants past their to_date; returns the number expired"""
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            expiring = Offer.objects.filter(status='ACTIVE', to_date__lte=now, accepted_count=0)
+            candidate_ids = list(
+                expiring.order_by('to_date').values_list('id', flat=True)[:OFFER_EXPIRY_BATCH_SIZE]
+            )
+            if not candidate_ids:
+                break
+            # Lock in the order exchange_states.accept does (the exchange, then its
+            # offer), so an accept racing the expiry waits instead of deadlocking:
+            # an accept that got in first makes its offer drop out below, a later
+            # one finds its exchange cancelled
+            pending_ids = list(
+                Exchange.objects.select_for_update()
+                .filter(offer_id__in=candidate_ids, status='PENDING')
+                .order_by('id')
+                .values_list('id', flat=True)
+            )
+            offers = list(
+                expiring.select_for_update()
+                .filter(id__in=candidate_ids)
+                .order_by('id')
+                .values('id', 'user_id', 'type', 'title', 'time_required')
+            )
+            offer_ids = [offer['id'] for offer in offers]
+            Offer.objects.filter(id__in=offer_ids, status='ACTIVE').update(status='INACTIVE', updated_at=now)
+            cancelled = moderation.cancel_exchanges(
+                Q(id__in=pending_ids, offer_id__in=offer_ids),
+                refund_wants=False,
+            )
+
+            # Release the hours blocked when each want was posted, summed per owner
+            want_refunds = {}
+            for offer in offers:
+                if offer['type'] == 'want':
+                    want_refunds[offer['user_id']] = want_refunds.get(offer['user_id'], 0) + offer['time_required']
+            moderation.apply_refunds(want_refunds)
+
+            notifications = [
+                (offer['user_id'], f"Your {offer['type']} '{offer['title']}' has ended and is no longer listed.")
+                for offer in offers
+            ]
+            notifications += [
+                (exchange['requester_id'], f"Your request for '{exchange['offer__title']}' was cancelled because the listing ended. Any blocked credits have been returned.")
+                for exchange in cancelled
+            ]
+            moderation.notify_users([(user_id, content) for user_id, content in notifications if user_id])
+        expired += len(offers)
+        if len(candidate_ids) < OFFER_EXPIRY_BATCH_SIZE:
+            break
+    return expired
+
+
+JOB_FUNCTIONS = {
+    'remind': send_reminders,
+    'nudge': send_completion_reminders,
+    'expire': expire_pending,
+    'expire_offers': expire_offers,
+}
+
+
+def run_jobs(jobs=JOBS, now=None):
+    """Run the given jobs; returns {job: exchanges handled}"""
+    now = now or timezone.now()
+    results = {job: JOB_FUNCTIONS[job](now) for job in jobs}
+    if any(results.values()):
+        logger.info(f"Exchange scheduler: {results}")
+    return results
+
+
+class ExchangeScheduler:
+    """Timer heap of upcoming (due_at, job) entries"""
+
+    def __init__(self, refresh_interval=None):
+        if refresh_interval is None:
+            refresh_interval = settings.EXCHANGE_SCHEDULER_REFRESH_INTERVAL
+        self.refresh_interval = timedelta(seconds=refresh_interval)
+        self.timers = []
+        self.rebuilt_at = None
+
+    def due_times(self, start, end):
+        """(due_at, job) for every job that becomes due in (start, end]"""
+        lead, delay, ttl = reminder_lead(), nudge_delay(), pending_ttl()
+        accepted = Exchange.objects.filter(status='ACCEPTED').order_by()
+        for proposed_at in accepted.filter(
+            reminder_sent_at__isnull=True, proposed_at__gt=start + lead, proposed_at__lte=end + lead,
+        ).values_list('proposed_at', flat=True):
+            yield proposed_at - lead, 'remind'
+        for proposed_at in accepted.filter(
+            completion_reminder_sent_at__isnull=True, proposed_at__gt=start - delay, proposed_at__lte=end - delay,
+        ).values_list('proposed_at', flat=True):
+            yield proposed_at + delay, 'nudge'
+        for created_at in Exchange.objects.filter(
+            status='PENDING', created_at__gt=start - ttl, created_at__lte=end - ttl,
+        ).order_by().values_list('created_at', flat=True):
+            yield created_at + ttl, 'expire'
+        for to_date in Offer.objects.filter(
+            status='ACTIVE', to_date__gt=start, to_date__lte=end,
+        ).order_by().values_list('to_date', flat=True):
+            yield to_date, 'expire_offers'
+
+    def rebuild(self, now=None):
+        """Catch up on everything already due, then load the timers until the next rebuild"""
+        now = now or timezone.now()
+        run_jobs(now=now)
+        self.timers = list(self.due_times(now, now + self.refresh_interval))
+        heapq.heapify(self.timers)
+        self.rebuilt_at = now
+
+    def next_wakeup(self):
+        """When the loop has to wake up next: the first timer or the next rebuild"""
+        rebuild_at = self.rebuilt_at + self.refresh_interval
+        if self.timers:
+            return min(self.timers[0][0], rebuild_at)
+        return rebuild_at
+
+    def tick(self, now=None):
+        """Rebuild when the interval is over, otherwise run the jobs whose timers are due"""
+        now = now or timezone.now()
+        if self.rebuilt_at is None or now >= self.rebuilt_at + self.refresh_interval:
+            self.rebuild(now)
+            return
+        jobs = set()
+        while self.timers and self.timers[0][0] <= now:
+            jobs.add(heapq.heappop(self.timers)[1])
+        if jobs:
+            run_jobs([job for job in JOBS if job in jobs], now=now)
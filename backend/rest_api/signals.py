@@ -0,0 +1,50 @@
+"""
+Model signal handlers for the Hive project
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rest_api.models import User, UserProfile, TimeBank, Offer, Exchange, Chat, Message
+from rest_api.auth.principal_cache import invalidate_user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_principal(sender, instance, **kwargs):
+    """Any change to a user (ban, suspend, delete, profile edits) drops its cached principal"""
+    invalidate_user(instance.id)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=TimeBank)
+@receiver(post_delete, sender=TimeBank)
+def invalidate_principal_relations(sender, instance, **kwargs):
+    """The cached principal carries its profile and timebank, so their changes drop it too"""
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Chat)
+def create_chat_read_markers(sender, instance, created, **kwargs):
+    """Every exchange participant gets a read marker when the chat starts"""
+    if created:
+        instance.create_read_markers()
+
+
+@receiver(post_save, sender=Message)
+def record_chat_message(sender, instance, created, **kwargs):
+    """Keep the chat's last-message pointer and unread counters current"""
+    if created:
+        instance.chat.record_message(instance)
+
+
+@receiver(post_save, sender=Exchange)
+def count_exchange_slot(sender, instance, **kwargs):
+    """Move the exchange between its offer's slot counters when its status changes"""
+    Offer.move_slot(instance.offer_id, instance.counted_status, instance.status)
+    instance.counted_status = instance.status
+
+
+@receiver(post_delete, sender=Exchange)
+def release_exchange_slot(sender, instance, **kwargs):
+    Offer.move_slot(instance.offer_id, instance.counted_status, None)
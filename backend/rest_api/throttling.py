@@ -0,0 +1,77 @@
+"""
+API throttling for the Hive project
+
+DRF throttles backed by the shared token buckets in rest_api.ratelimit, so
+limits hold across all workers. A view opts in by listing the throttle classes
+and naming a `throttle_scope`; rates come from API_THROTTLE_RATES, looked up as
+"<scope>.<kind>" first and then "<kind>" (kind is ip, user or endpoint).
+"""
+import logging
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from rest_api import metrics, ratelimit
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class: subclasses set `kind` and return the bucket identity"""
+    kind = None
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError
+
+    def get_rate(self, scope):
+        rates = settings.API_THROTTLE_RATES
+        return rates.get(f'{scope}.{self.kind}') or rates.get(self.kind)
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        scope = getattr(view, 'throttle_scope', None) or view.__class__.__name__
+        rate = self.get_rate(scope)
+        ident = self.get_ident_key(request, view)
+        if rate is None or ident is None:
+            return True
+
+        refill, burst = rate
+        allowed, retry_after = ratelimit.consume(f'ratelimit:api:{scope}:{self.kind}:{ident}', refill, burst)
+        if not allowed:
+            self.retry_after = retry_after
+            metrics.counter_inc(f'api.throttled.{scope}')
+            logger.info(f"Throttled {request.method} {request.path} ({self.kind} {ident})")
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class IPThrottle(TokenBucketThrottle):
+    """One bucket per client IP and scope"""
+    kind = 'ip'
+
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+class UserThrottle(TokenBucketThrottle):
+    """One bucket per authenticated user and scope; anonymous requests pass"""
+    kind = 'user'
+
+    def get_ident_key(self, request, view):
+        user = getattr(request, 'user', None)
+        if user is None or not getattr(user, 'is_authenticated', False):
+            return None
+        return user.id
+
+
+class EndpointThrottle(TokenBucketThrottle):
+    """One bucket per scope shared by every client, capping total load on the endpoint"""
+    kind = 'endpoint'
+
+    def get_ident_key(self, request, view):
+        return 'all'
+
+
+PUBLIC_THROTTLES = [IPThrottle, UserThrottle, EndpointThrottle]
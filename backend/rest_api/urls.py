@@ -7,8 +7,11 @@ from .views import (
     AcceptExchangeView, RejectExchangeView, CancelExchangeView, ConfirmCompletionView, SubmitRatingView,
     TransactionsView, LatestTransactionsView,
     CreateReportView, AdminReportsListView, AdminReportUpdateView, AdminReportResolveView,
-    AdminKPIView, AdminBanUserView, AdminWarnUserView, AdminDeleteOfferView, AdminExchangeDetailView,
+    AdminKPIView, AdminKPIHistoryView, AdminBanUserView, AdminWarnUserView, AdminDeleteOfferView, AdminExchangeDetailView, AdminMetricsView,
+    AdminExchangeMessagesView, AdminExchangeTranscriptExportView,
+    AdminBulkBanUsersView, AdminBulkWarnUsersView, AdminBulkRemoveOffersView, AdminBulkResolveReportsView,
     NotificationsView, MarkNotificationReadView, MarkAllNotificationsReadView,
+    InboxView, MarkChatReadView,
     ForumPostListView, ForumPostDetailView, ForumCommentCreateView, ForumCommentDeleteView
 )
 from .auth.views import LoginView, RegisterView, LogoutView
@@ -50,11 +53,16 @@ urlpatterns = [
     path("notifications/<int:notification_id>", MarkNotificationReadView.as_view(), name="mark-notification-read"),
     path("notifications/mark-all-read", MarkAllNotificationsReadView.as_view(), name="mark-all-notifications-read"),
     
+    # Inbox endpoints
+    path("inbox", InboxView.as_view(), name="inbox"),
+    path("inbox/<int:exchange_id>/read", MarkChatReadView.as_view(), name="mark-chat-read"),
+    
     # Report endpoints
     path("reports", CreateReportView.as_view(), name="create-report"),
     
     # Admin endpoints
     path("admin/kpi", AdminKPIView.as_view(), name="admin-kpi"),
+    path("admin/kpi/history", AdminKPIHistoryView.as_view(), name="admin-kpi-history"),
     path("admin/reports", AdminReportsListView.as_view(), name="admin-reports-list"),
     path("admin/reports/<int:report_id>", AdminReportUpdateView.as_view(), name="admin-report-update"),
     path("admin/reports/<int:report_id>/resolve", AdminReportResolveView.as_view(), name="admin-report-resolve"),
@@ -62,6 +70,13 @@ urlpatterns = [
     path("admin/users/<int:user_id>/warn", AdminWarnUserView.as_view(), name="admin-warn-user"),
     path("admin/offers/<int:offer_id>", AdminDeleteOfferView.as_view(), name="admin-delete-offer"),
     path("admin/exchanges/<int:exchange_id>", AdminExchangeDetailView.as_view(), name="admin-exchange-detail"),
+    path("admin/exchanges/<int:exchange_id>/messages", AdminExchangeMessagesView.as_view(), name="admin-exchange-messages"),
+    path("admin/exchanges/<int:exchange_id>/messages/export", AdminExchangeTranscriptExportView.as_view(), name="admin-exchange-transcript-export"),
+    path("admin/metrics", AdminMetricsView.as_view(), name="admin-metrics"),
+    path("admin/bulk/users/ban", AdminBulkBanUsersView.as_view(), name="admin-bulk-ban-users"),
+    path("admin/bulk/users/warn", AdminBulkWarnUsersView.as_view(), name="admin-bulk-warn-users"),
+    path("admin/bulk/offers/remove", AdminBulkRemoveOffersView.as_view(), name="admin-bulk-remove-offers"),
+    path("admin/bulk/reports/resolve", AdminBulkResolveReportsView.as_view(), name="admin-bulk-resolve-reports"),
     
     # Forum endpoints
     path("forum/posts", ForumPostListView.as_view(), name="forum-posts"),
@@ -3,18 +3,34 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import status
-from rest_api.models import User, Offer, UserProfile, TimeBank, OfferImage, Exchange, ExchangeRating, TimeBankTransaction, Report, Notification, Chat, Message
-from datetime import datetime, date as date_module, time as time_module
+from rest_api import content_scanner, exchange_states, forum, kpi, metrics, moderation
+from rest_api.exchange_states import send_exchange_update_ws
+from rest_api.idempotency import idempotent
+from rest_api.emails import queue_depth
+from rest_api.throttling import PUBLIC_THROTTLES
+from rest_api.models import User, Offer, UserProfile, TimeBank, OfferImage, Exchange, ExchangeRating, TimeBankTransaction, Report, Notification, Chat, Message, ChatReadMarker, ForumPost, ForumComment
+import csv
+import logging
+from datetime import datetime, timedelta, date as date_module, time as time_module
 from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
-from django.db import transaction, models
+from django.db import IntegrityError, transaction, models
 from django.db.models import Q, Avg
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+logger = logging.getLogger(__name__)
+
 
 def send_notification(user, content):
     """Create notification and send via WebSocket"""
+    if user is None:
+        # e.g. the reporter of an automatic report
+        return
+
     notification = Notification.objects.create(
         user=user,
         content=content
@@ -41,30 +57,12 @@ def send_notification(user, content):
         print(f"Error sending notification via WebSocket: {e}")
 
 
-def send_exchange_update_ws(exchange):
-    """Send exchange update via WebSocket - utility function"""
+def get_related_or_none(instance, name):
+    """Return a one-to-one relation (e.g. the principal's preloaded profile) or None if missing"""
     try:
-        channel_layer = get_channel_layer()
-        room_group_name = f'exchange_{exchange.id}'
-        
-        exchange_data = {
-            'id': str(exchange.id),
-            'status': exchange.status,
-            'proposed_at': exchange.proposed_at.isoformat() if exchange.proposed_at else None,
-            'requester_confirmed': exchange.requester_confirmed,
-            'provider_confirmed': exchange.provider_confirmed,
-            'completed_at': exchange.completed_at.isoformat() if exchange.completed_at else None,
-        }
-        
-        async_to_sync(channel_layer.group_send)(
-            room_group_name,
-            {
-                'type': 'exchange_update',
-                'exchange': exchange_data
-            }
-        )
-    except Exception as e:
-        print(f"Error sending websocket update: {e}")
+        return getattr(instance, name)
+    except ObjectDoesNotExist:
+        return None
 
 
 class HomeView(APIView):
@@ -98,25 +96,30 @@ class UserProfileView(APIView):
     def get(self, request):
         user = request.user
         
-        user_profile, _ = UserProfile.objects.get_or_create(
-            user=user,
-            defaults={
-                'bio': '',
-                'location': '',
-                'skills': [],
-                'rating': 0.0,
-            }
-        )
+        # Profile and timebank are preloaded with the authenticated principal
+        user_profile = get_related_or_none(user, 'profile')
+        if user_profile is None:
+            user_profile, _ = UserProfile.objects.get_or_create(
+                user=user,
+                defaults={
+                    'bio': '',
+                    'location': '',
+                    'skills': [],
+                    'rating': 0.0,
+                }
+            )
 
-        timebank, _ = TimeBank.objects.get_or_create(
-            user=user,
-            defaults={
-                'amount': 3,
-                'blocked_amount': 0,
-                'available_amount': 3,
-                'total_amount': 3,
-            }
-        )
+        timebank = get_related_or_none(user, 'timebank')
+        if timebank is None:
+            timebank, _ = TimeBank.objects.get_or_create(
+                user=user,
+                defaults={
+                    'amount': 3,
+                    'blocked_amount': 0,
+                    'available_amount': 3,
+                    'total_amount': 3,
+                }
+            )
         
         return Response({
             "message": "User profile retrieved",
@@ -229,6 +232,8 @@ class UserProfileView(APIView):
 class OffersView(APIView):
     """Public endpoint - no authentication required"""
     permission_classes = [AllowAny]
+    throttle_classes = PUBLIC_THROTTLES
+    throttle_scope = 'offers'
     
     @staticmethod
     def haversine_distance(lat1, lon1, lat2, lon2):
@@ -259,34 +264,25 @@ class OffersView(APIView):
             user_lat = None
             user_lng = None
         
-        offers = Offer.objects.select_related('user', 'user__profile').prefetch_related('exchange_set').filter(
+        offers = Offer.objects.select_related('user', 'user__profile').filter(
             status='ACTIVE',  # Only show active offers
             is_flagged=False,  # Exclude flagged offers from dashboard
             user__is_banned=False  # Exclude offers from banned/suspended users
+        ).filter(
+            # Offers past their end date until the scheduler deactivates them
+            Q(to_date__isnull=True) | Q(to_date__gt=timezone.now())
+        ).alias(
+            filled=models.F('accepted_count') + models.F('completed_count')
+        ).filter(
+            # Hide offers whose slots are all filled (accepted or completed):
+            # group offers at person_count, 1-to-1 offers at the first one
+            Q(activity_type='group', filled__lt=models.F('person_count'))
+            | (~Q(activity_type='group') & Q(filled=0))
         )
         
-        # Filter out offers based on their exchange status
         available_offers = []
         
         for offer in offers:
-            if offer.activity_type == 'group':
-                # Group offer: count ACCEPTED + COMPLETED exchanges
-                filled_count = Exchange.objects.filter(
-                    offer=offer,
-                    status__in=['ACCEPTED', 'COMPLETED']
-                ).count()
-                # Hide if all slots are filled (accepted or completed)
-                if filled_count >= offer.person_count:
-                    continue  # Skip this offer - all slots are filled
-            else:
-                # 1-to-1 offer: hide if any exchange is accepted or completed
-                active_exchange_count = Exchange.objects.filter(
-                    offer=offer,
-                    status__in=['ACCEPTED', 'COMPLETED']
-                ).count()
-                if active_exchange_count > 0:
-                    continue  # Skip this offer - already has active/completed exchange
-            
             # Location-based filtering
             if user_lat is not None and user_lng is not None:
                 # Always include remote offers
@@ -367,25 +363,12 @@ class OfferDetailView(APIView):
         except Offer.DoesNotExist:
             return Response({"error": "Offer not found"}, status=404)
         
-        # Check if offer can be edited (no active or completed exchanges)
-        has_blocking_exchange = Exchange.objects.filter(
-            offer=offer,
-            status__in=['PENDING', 'ACCEPTED', 'COMPLETED']
-        ).exists()
-        can_edit = not has_blocking_exchange
-        
-        # Calculate slot information for group offers
-        # Count active slots (PENDING + ACCEPTED) and completed slots
-        active_exchanges = Exchange.objects.filter(
-            offer=offer,
-            status__in=['PENDING', 'ACCEPTED']
-        ).count()
-        completed_exchanges = Exchange.objects.filter(
-            offer=offer,
-            status='COMPLETED'
-        ).count()
+        # Slot information comes from the offer's exchange counters
+        can_edit = not offer.has_exchanges  # no active or completed exchanges
+        active_exchanges = offer.active_slots  # PENDING + ACCEPTED
+        completed_exchanges = offer.completed_count
         filled_slots = active_exchanges + completed_exchanges  # Total slots taken (including completed)
-        total_slots = offer.person_count if offer.activity_type == 'group' else 1
+        total_slots = offer.total_slots
         slots_available = active_exchanges < total_slots  # Only active exchanges block new requests
         
         return Response({
@@ -456,12 +439,7 @@ class OfferDetailView(APIView):
                 return Response({"error": "Not authorized to update this offer"}, status=403)
             
             # Check if offer has any non-CANCELLED exchanges (cannot edit)
-            has_blocking_exchange = Exchange.objects.filter(
-                offer=offer,
-                status__in=['PENDING', 'ACCEPTED', 'COMPLETED']
-            ).exists()
-            
-            if has_blocking_exchange:
+            if offer.has_exchanges:
                 return Response({
                     "error": "Cannot edit this offer. Only offers with no exchanges or only cancelled exchanges can be edited."
                 }, status=400)
@@ -600,12 +578,7 @@ class OfferDetailView(APIView):
                 return Response({"error": "Not authorized to delete this offer"}, status=403)
             
             # Check if offer has any non-CANCELLED exchanges (cannot delete)
-            has_blocking_exchange = Exchange.objects.filter(
-                offer=offer,
-                status__in=['PENDING', 'ACCEPTED', 'COMPLETED']
-            ).exists()
-            
-            if has_blocking_exchange:
+            if offer.has_exchanges:
                 return Response({
                     "error": "Cannot delete this offer. Only offers with no exchanges or only cancelled exchanges can be deleted."
                 }, status=400)
@@ -644,6 +617,7 @@ class OfferDetailView(APIView):
 class CreateOfferView(APIView):
     permission_classes = [IsAuthenticated]
     
+    @idempotent
     def post(self, request):
         # Check if user is banned/suspended
         if request.user.is_banned:
@@ -745,11 +719,16 @@ class CreateOfferView(APIView):
             
             location_data = request.data.get('location', {})
             
+            # Pre-screen: matching listings are kept off the dashboard until an admin reviews them
+            title = request.data.get('title', '')
+            description = request.data.get('description', '')
+            match = content_scanner.scan(title, description)
+            
             offer = Offer.objects.create(
                 user=request.user,
                 type=offer_type,
-                title=request.data.get('title', ''),
-                description=request.data.get('description', ''),
+                title=title,
+                description=description,
                 tags=request.data.get('tags', []),
                 time_required=time_required,
                 location=location_data.get('address', '') if isinstance(location_data, dict) else str(location_data),
@@ -762,7 +741,11 @@ class CreateOfferView(APIView):
                 scheduled_at=scheduled_at,
                 from_date=from_date,
                 to_date=to_date,
+                is_flagged=match is not None,
+                flagged_reason=match.description if match else '',
             )
+            if match:
+                content_scanner.report_match(match, request.user, offer.type, offer.id)
             
             return Response({
                 "message": "Offer created successfully", 
@@ -886,6 +869,7 @@ class CreateExchangeView(APIView):
     """Create an exchange request for offer/want"""
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         # Check if user is banned/suspended
         if request.user.is_banned:
@@ -919,52 +903,49 @@ class CreateExchangeView(APIView):
             if offer.user == request.user:
                 return Response({"error": "Cannot request your own offer"}, status=400)
 
-            # Check slot availability for group offers
-            if offer.activity_type == 'group':
-                active_exchanges_count = Exchange.objects.filter(
-                    offer=offer,
-                    status__in=['PENDING', 'ACCEPTED']
-                ).count()
-                if active_exchanges_count >= offer.person_count:
-                    return Response({"error": "All slots are filled for this group offer"}, status=400)
+            # Early answer for full group offers; claim_slot below makes the final check
+            if offer.activity_type == 'group' and offer.active_slots >= offer.person_count:
+                return Response({"error": "All slots are filled for this group offer"}, status=400)
 
             # Roles are always the same:
             # - Provider: offer/want owner (offer.user)
             # - Requester: handshake initiator (request.user)
-            
-            # Check if exchange already exists
-            existing = Exchange.objects.filter(
-                offer=offer,
-                requester=request.user,
-                status__in=['PENDING', 'ACCEPTED']
-            ).first()
-            if existing:
-                return Response({"error": "Exchange request already exists"}, status=400)
+            # A second PENDING/ACCEPTED request for the same offer is rejected by
+            # the unique_active_exchange constraint (IntegrityError below)
 
             is_want = offer.type == 'want'
             time_to_block = offer.time_required
 
-            # For OFFER: block requester's (handshake initiator) credits
-            # For WANT: credits already blocked when want was created, no blocking needed here
-            if not is_want:
-                requester_timebank, _ = TimeBank.objects.get_or_create(
-                    user=request.user,
-                    defaults={'amount': 1, 'blocked_amount': 0, 'available_amount': 1, 'total_amount': 1}
-                )
-                
-                if not requester_timebank.block_credit(time_to_block):
-                    return Response({
-                        "error": f"Insufficient time credits. You need at least {time_to_block}H available."
-                    }, status=400)
+            with transaction.atomic():
+                # Take a slot with a conditional UPDATE, so two requests can't both get the last one
+                if not offer.claim_slot():
+                    return Response({"error": "All slots are filled for this group offer"}, status=400)
 
-            # Create exchange
-            exchange = Exchange.objects.create(
-                offer=offer,
-                provider=offer.user,  # Always offer/want owner
-                requester=request.user,  # Always handshake initiator
-                status='PENDING',
-                time_spent=offer.time_required
-            )
+                # For OFFER: block requester's (handshake initiator) credits
+                # For WANT: credits already blocked when want was created, no blocking needed here
+                if not is_want:
+                    requester_timebank, _ = TimeBank.objects.get_or_create(
+                        user=request.user,
+                        defaults={'amount': 1, 'blocked_amount': 0, 'available_amount': 1, 'total_amount': 1}
+                    )
+                    
+                    if not requester_timebank.block_credit(time_to_block):
+                        # Give the slot back
+                        transaction.set_rollback(True)
+                        return Response({
+                            "error": f"Insufficient time credits. You need at least {time_to_block}H available."
+                        }, status=400)
+
+                # Create exchange
+                exchange = Exchange(
+                    offer=offer,
+                    provider=offer.user,  # Always offer/want owner
+                    requester=request.user,  # Always handshake initiator
+                    status='PENDING',
+                    time_spent=offer.time_required
+                )
+                exchange.counted_status = 'PENDING'  # counted by claim_slot
+                exchange.save()  # rolls back the slot and credits if it's a duplicate
 
             # Send notification to offer/want owner
             send_notification(
@@ -978,6 +959,8 @@ class CreateExchangeView(APIView):
                 "time_frozen": time_to_block if not is_want else 0
             }, status=201)
 
+        except IntegrityError:
+            return Response({"error": "Exchange request already exists"}, status=400)
         except Offer.DoesNotExist:
             return Response({"error": "Offer not found"}, status=404)
         except Exception as e:
@@ -1283,8 +1266,10 @@ class ProposeDateTimeView(APIView):
                 naive_dt = datetime.combine(proposed_date, datetime.min.time())
             proposed_at = timezone.make_aware(naive_dt, timezone.get_current_timezone())
 
-            exchange.proposed_at = proposed_at
-            exchange.save()
+            # Conditional update, so an accept or cancel that got in since the
+            # check above isn't overwritten
+            if not exchange_states.move(exchange, {'status': 'PENDING'}, proposed_at=proposed_at):
+                return Response({"error": "Can only propose date/time for pending exchanges"}, status=400)
             
             # Send notification to provider
             proposed_str = proposed_at.strftime('%Y-%m-%d %H:%M') if proposed_at else ''
@@ -1311,65 +1296,16 @@ class AcceptExchangeView(APIView):
 
     def post(self, request, exchange_id):
         try:
-            exchange = Exchange.objects.select_related('offer').get(id=exchange_id)
-            
-            # Only provider can accept
-            if exchange.provider != request.user:
-                return Response({"error": "Only provider can accept exchange"}, status=403)
-
-            if exchange.status == 'ACCEPTED':
-                # Already accepted, just return success
-                return Response({
-                    "message": "Exchange already accepted",
-                    "status": exchange.status,
-                })
-
-            if exchange.status != 'PENDING':
-                return Response({"error": "Exchange is not in pending status"}, status=400)
-
-            # Check if slots are available for accepting
-            offer = exchange.offer
-            
-            if offer.activity_type == 'group':
-                # Group offer: count ACCEPTED + COMPLETED (filled slots)
-                filled_count = Exchange.objects.filter(
-                    offer=offer,
-                    status__in=['ACCEPTED', 'COMPLETED']
-                ).count()
-                if filled_count >= offer.person_count:
-                    return Response({
-                        "error": f"All {offer.person_count} slots are already filled"
-                    }, status=400)
-            else:
-                # 1-to-1 offer: only one can be accepted at a time
-                accepted_count = Exchange.objects.filter(
-                    offer=offer,
-                    status='ACCEPTED'
-                ).count()
-                if accepted_count > 0:
-                    return Response({
-                        "error": "This offer already has an accepted exchange. Only one exchange can be accepted for 1-to-1 offers."
-                    }, status=400)
-
-            exchange.status = 'ACCEPTED'
-            exchange.save()
-            
-            # Send notification to requester
-            send_notification(
-                exchange.requester,
-                f"Your handshake request for '{exchange.offer.title}' has been accepted!"
-            )
-            
-            # Send websocket update
-            send_exchange_update_ws(exchange)
-
-            return Response({
-                "message": "Exchange accepted successfully",
-                "status": exchange.status,
-            })
-
+            exchange, accepted = exchange_states.accept(exchange_id, request.user)
         except Exchange.DoesNotExist:
             return Response({"error": "Exchange not found"}, status=404)
+        except exchange_states.TransitionError as e:
+            return Response({"error": e.message}, status=e.status)
+
+        return Response({
+            "message": "Exchange accepted successfully" if accepted else "Exchange already accepted",
+            "status": exchange.status,
+        })
 
 
 class RejectExchangeView(APIView):
@@ -1378,45 +1314,16 @@ class RejectExchangeView(APIView):
 
     def post(self, request, exchange_id):
         try:
-            exchange = Exchange.objects.select_related('offer').get(id=exchange_id)
-            
-            # Only provider can reject
-            if exchange.provider != request.user:
-                return Response({"error": "Only provider can reject exchange"}, status=403)
-
-            if exchange.status != 'PENDING':
-                return Response({"error": "Exchange is not in pending status"}, status=400)
-
-            is_want = exchange.offer.type == 'want'
-            
-            # For OFFER: unblock requester's credits
-            # For WANT: DO NOT unblock - credits are tied to the want listing, not the exchange
-            if not is_want:
-                payer_timebank = exchange.requester.timebank
-                payer_timebank.unblock_credit(exchange.time_spent)
-
-            exchange.status = 'CANCELLED'
-            exchange.save()
-
-            # Send notification to requester
-            if is_want:
-                send_notification(
-                    exchange.requester,
-                    f"Your offer to help with '{exchange.offer.title}' has been declined."
-                )
-            else:
-                send_notification(
-                    exchange.requester,
-                    f"Your handshake request for '{exchange.offer.title}' has been rejected. Your time credits have been unfrozen."
-                )
-
-            return Response({
-                "message": "Exchange rejected",
-                "status": exchange.status,
-            })
-
+            exchange, rejected = exchange_states.reject(exchange_id, request.user)
         except Exchange.DoesNotExist:
             return Response({"error": "Exchange not found"}, status=404)
+        except exchange_states.TransitionError as e:
+            return Response({"error": e.message}, status=e.status)
+
+        return Response({
+            "message": "Exchange rejected" if rejected else "Exchange already cancelled",
+            "status": exchange.status,
+        })
 
 
 class CancelExchangeView(APIView):
@@ -1425,206 +1332,44 @@ class CancelExchangeView(APIView):
 
     def post(self, request, exchange_id):
         try:
-            exchange = Exchange.objects.select_related('offer').get(id=exchange_id)
-            
-            # Only requester can cancel their own request
-            if exchange.requester != request.user:
-                return Response({"error": "Only requester can cancel their own request"}, status=403)
-
-            if exchange.status not in ['PENDING', 'ACCEPTED']:
-                return Response({"error": "Exchange cannot be cancelled in current status"}, status=400)
-
-            # Cannot cancel if provider has already confirmed completion
-            if exchange.provider_confirmed:
-                return Response({
-                    "error": "Cannot cancel - provider has already marked as complete. Please complete the exchange."
-                }, status=400)
-
-            is_want = exchange.offer.type == 'want'
-            
-            # For OFFER: unblock requester's credits
-            # For WANT: DO NOT unblock - credits are tied to the want listing, not the exchange
-            if not is_want:
-                try:
-                    payer_timebank = exchange.requester.timebank
-                    payer_timebank.unblock_credit(exchange.time_spent)
-                except Exception:
-                    pass
-
-            exchange.status = 'CANCELLED'
-            exchange.save()
-
-            # Send notification to provider
-            send_notification(
-                exchange.provider,
-                f"Handshake request for '{exchange.offer.title}' has been cancelled by {exchange.requester.first_name}."
-            )
-
-            return Response({
-                "message": "Exchange cancelled and time unfrozen",
-                "status": exchange.status,
-            })
-
+            exchange, cancelled = exchange_states.cancel(exchange_id, request.user)
         except Exchange.DoesNotExist:
             return Response({"error": "Exchange not found"}, status=404)
+        except exchange_states.TransitionError as e:
+            return Response({"error": e.message}, status=e.status)
+
+        return Response({
+            "message": "Exchange cancelled and time unfrozen" if cancelled else "Exchange already cancelled",
+            "status": exchange.status,
+        })
 
 
 class ConfirmCompletionView(APIView):
     """Confirm completion of exchange"""
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request, exchange_id):
         try:
-            # Use select_for_update to prevent race conditions
-            with transaction.atomic():
-                exchange = Exchange.objects.select_for_update().get(id=exchange_id)
-                
-                # Check if user is part of exchange
-                if exchange.provider != request.user and exchange.requester != request.user:
-                    return Response({"error": "Not authorized"}, status=403)
-
-                if exchange.status == 'COMPLETED':
-                    return Response({"error": "Exchange is already completed"}, status=400)
-
-                if exchange.status != 'ACCEPTED':
-                    return Response({"error": "Exchange must be accepted first"}, status=400)
-
-                # Mark confirmation
-                if request.user == exchange.requester:
-                    if exchange.requester_confirmed:
-                        return Response({"error": "You have already confirmed"}, status=400)
-                    exchange.requester_confirmed = True
-                    # Notify provider that requester confirmed
-                    send_notification(
-                        exchange.provider,
-                        f"{exchange.requester.first_name} {exchange.requester.last_name} confirmed completion of '{exchange.offer.title}'"
-                    )
-                elif request.user == exchange.provider:
-                    if exchange.provider_confirmed:
-                        return Response({"error": "You have already confirmed"}, status=400)
-                    exchange.provider_confirmed = True
-                    # Notify requester that provider confirmed
-                    send_notification(
-                        exchange.requester,
-                        f"{exchange.provider.first_name} {exchange.provider.last_name} confirmed completion of '{exchange.offer.title}'"
-                    )
-
-                # If both confirmed, mark as completed and transfer time
-                if exchange.requester_confirmed and exchange.provider_confirmed:
-                    exchange.status = 'COMPLETED'
-                    exchange.completed_at = timezone.now()
-                    
-                    offer = exchange.offer
-                    is_want = offer.type == 'want'
-                    is_group_offer = offer and offer.activity_type == 'group'
-                    
-                    # Get timebanks for both users
-                    requester_timebank, _ = TimeBank.objects.select_for_update().get_or_create(
-                        user=exchange.requester,
-                        defaults={'amount': 1, 'blocked_amount': 0, 'available_amount': 1, 'total_amount': 1}
-                    )
-                    provider_timebank, _ = TimeBank.objects.select_for_update().get_or_create(
-                        user=exchange.provider,
-                        defaults={'amount': 1, 'blocked_amount': 0, 'available_amount': 1, 'total_amount': 1}
-                    )
-                    
-                    # Determine payer and receiver based on offer type:
-                    # OFFER: requester (handshake initiator) pays -> provider (offer owner) receives
-                    # WANT: provider (want owner) pays -> requester (helper) receives
-                    if is_want:
-                        payer_timebank = provider_timebank
-                        receiver_timebank = requester_timebank
-                        payer_user = exchange.provider
-                        receiver_user = exchange.requester
-                    else:
-                        payer_timebank = requester_timebank
-                        receiver_timebank = provider_timebank
-                        payer_user = exchange.requester
-                        receiver_user = exchange.provider
-                    
-                    # Unfreeze payer's time first
-                    payer_timebank.unblock_credit(exchange.time_spent)
-                    
-                    # Transfer time - check available_amount after unblocking
-                    if payer_timebank.available_amount >= exchange.time_spent:
-                        payer_timebank.spend_credit(exchange.time_spent)
-                        
-                        # For group offers, only pay receiver once
-                        if is_group_offer:
-                            if not offer.provider_paid:
-                                # First completion - receiver gets payment
-                                receiver_timebank.add_credit(exchange.time_spent)
-                                offer.provider_paid = True
-                                offer.save()
-                                
-                                # Send notifications
-                                send_notification(
-                                    payer_user,
-                                    f"Exchange '{offer.title}' has been completed! {exchange.time_spent}H time credits have been transferred."
-                                )
-                                send_notification(
-                                    receiver_user,
-                                    f"Exchange '{offer.title}' has been completed! You received {exchange.time_spent}H time credits."
-                                )
-                            else:
-                                # Subsequent completions - credit is burned (receiver already paid)
-                                send_notification(
-                                    payer_user,
-                                    f"Group exchange '{offer.title}' has been completed! {exchange.time_spent}H time credits have been used."
-                                )
-                                send_notification(
-                                    receiver_user,
-                                    f"Group exchange '{offer.title}' with {payer_user.first_name} has been completed!"
-                                )
-                        else:
-                            # Normal 1-1 offer/want - standard transfer
-                            receiver_timebank.add_credit(exchange.time_spent)
-                            
-                            send_notification(
-                                payer_user,
-                                f"Exchange '{offer.title}' has been completed! {exchange.time_spent}H time credits have been transferred."
-                            )
-                            send_notification(
-                                receiver_user,
-                                f"Exchange '{offer.title}' has been completed! You received {exchange.time_spent}H time credits."
-                            )
-                            
-                            # Mark 1-1 offer/want as completed
-                            if offer:
-                                offer.status = 'COMPLETED'
-                                offer.save()
-                        
-                        # Create transaction record if it doesn't exist
-                        if not TimeBankTransaction.objects.filter(exchange=exchange).exists():
-                            TimeBankTransaction.objects.create(
-                                from_user=payer_user,
-                                to_user=receiver_user,
-                                exchange=exchange,
-                                time_amount=exchange.time_spent,
-                                transaction_type='SPEND',
-                                description=f'Exchange completed: {offer.title}'
-                            )
-
-                exchange.save()
-            
-            # Send websocket update (outside transaction)
-            send_exchange_update_ws(exchange)
-
-            return Response({
-                "message": "Completion confirmed",
-                "requester_confirmed": exchange.requester_confirmed,
-                "provider_confirmed": exchange.provider_confirmed,
-                "status": exchange.status,
-            })
-
+            exchange, _ = exchange_states.confirm(exchange_id, request.user)
         except Exchange.DoesNotExist:
             return Response({"error": "Exchange not found"}, status=404)
+        except exchange_states.TransitionError as e:
+            return Response({"error": e.message}, status=e.status)
+
+        return Response({
+            "message": "Completion confirmed",
+            "requester_confirmed": exchange.requester_confirmed,
+            "provider_confirmed": exchange.provider_confirmed,
+            "status": exchange.status,
+        })
 
 
 class SubmitRatingView(APIView):
     """Submit rating for exchange"""
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request, exchange_id):
         try:
             exchange = Exchange.objects.select_related('provider', 'requester').get(id=exchange_id)
@@ -2204,30 +1949,24 @@ class CreateReportView(APIView):
                 except User.DoesNotExist:
                     return Response({"error": "User not found"}, status=404)
 
-            # Check if user already reported this target
-            existing_report = Report.objects.filter(
-                reporter=request.user,
-                target_type=target_type,
-                target_id=target_id_int,
-                status='PENDING'
-            ).first()
-
-            if existing_report:
+            # Create report; a second pending report of the same target by the
+            # same user is rejected by the unique_pending_report constraint
+            try:
+                with transaction.atomic():
+                    report = Report.objects.create(
+                        reporter=request.user,
+                        reported_user=reported_user,
+                        target_type=target_type,
+                        target_id=target_id_int,
+                        reason=reason,
+                        description=description,
+                        status='PENDING'
+                    )
+            except IntegrityError:
                 return Response({
                     "error": "You have already reported this item"
                 }, status=400)
 
-            # Create report
-            report = Report.objects.create(
-                reporter=request.user,
-                reported_user=reported_user,
-                target_type=target_type,
-                target_id=target_id_int,
-                reason=reason,
-                description=description,
-                status='PENDING'
-            )
-
             return Response({
                 "message": "Report submitted successfully",
                 "report_id": report.id
@@ -2240,43 +1979,91 @@ class CreateReportView(APIView):
 
 
 class AdminReportsListView(APIView):
-    """List all reports (admin only)"""
+    """List reports, newest first (admin only)"""
     permission_classes = [IsAuthenticated]
 
+    # Report target types and the model holding the target
+    TARGET_MODELS = {
+        'offer': Offer,
+        'want': Offer,
+        'exchange': Exchange,
+        'user': User,
+        'forum_post': ForumPost,
+        'forum_comment': ForumComment,
+        'message': Message,
+    }
+
+    @classmethod
+    def load_targets(cls, reports):
+        """Fetch every report target with one in_bulk query per target model"""
+        ids_by_model = {}
+        for report in reports:
+            model = cls.TARGET_MODELS.get(report.target_type)
+            if model:
+                ids_by_model.setdefault(model, set()).add(report.target_id)
+
+        targets = {}
+        for model, ids in ids_by_model.items():
+            queryset = model.objects.select_related('offer') if model is Exchange else model.objects
+            targets[model] = queryset.in_bulk(ids)
+        return targets
+
+    @staticmethod
+    def target_info(report, target):
+        if target is None:
+            return {"id": report.target_id, "deleted": True}
+        if report.target_type in ['offer', 'want']:
+            return {
+                "id": target.id,
+                "title": target.title,
+                "type": target.type,
+            }
+        if report.target_type == 'exchange':
+            return {
+                "id": target.id,
+                "offer_title": target.offer.title if target.offer else None,
+            }
+        if report.target_type == 'forum_post':
+            return {
+                "id": target.id,
+                "title": target.title,
+            }
+        if report.target_type in ['forum_comment', 'message']:
+            return {
+                "id": target.id,
+                "content": target.content,
+            }
+        return {
+            "id": target.id,
+            "email": target.email,
+            "first_name": target.first_name,
+            "last_name": target.last_name,
+        }
+
     def get(self, request):
         if not request.user.is_admin:
             return Response({"error": "Admin access required"}, status=403)
 
-        reports = Report.objects.select_related('reporter', 'reported_user', 'resolved_by').all().order_by('-created_at')
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 100)), 500))
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({"error": "limit and offset must be integers"}, status=400)
+
+        reports = Report.objects.select_related('reporter', 'reported_user', 'resolved_by')
+        # Filtering on status and ordering by created_at uses the (status, created_at) index
+        for field in ['status', 'reason', 'target_type']:
+            value = request.query_params.get(field)
+            if value:
+                reports = reports.filter(**{field: value})
+        total = reports.count()
+        reports = list(reports.order_by('-created_at', '-id')[offset:offset + limit])
+        targets = self.load_targets(reports)
 
         reports_data = []
         for report in reports:
-            # Get target info
-            target_info = None
-            try:
-                if report.target_type in ['offer', 'want']:
-                    target = Offer.objects.get(id=report.target_id)
-                    target_info = {
-                        "id": target.id,
-                        "title": target.title,
-                        "type": target.type,
-                    }
-                elif report.target_type == 'exchange':
-                    target = Exchange.objects.get(id=report.target_id)
-                    target_info = {
-                        "id": target.id,
-                        "offer_title": target.offer.title if target.offer else None,
-                    }
-                elif report.target_type == 'user':
-                    target = User.objects.get(id=report.target_id)
-                    target_info = {
-                        "id": target.id,
-                        "email": target.email,
-                        "first_name": target.first_name,
-                        "last_name": target.last_name,
-                    }
-            except (Offer.DoesNotExist, Exchange.DoesNotExist, User.DoesNotExist):
-                target_info = {"id": report.target_id, "deleted": True}
+            model = self.TARGET_MODELS.get(report.target_type)
+            target_info = self.target_info(report, targets[model].get(report.target_id)) if model else None
 
             reports_data.append({
                 "id": report.id,
@@ -2285,7 +2072,7 @@ class AdminReportsListView(APIView):
                     "email": report.reporter.email,
                     "first_name": report.reporter.first_name,
                     "last_name": report.reporter.last_name,
-                },
+                } if report.reporter else None,
                 "reported_user": {
                     "id": report.reported_user.id,
                     "email": report.reported_user.email,
@@ -2307,7 +2094,9 @@ class AdminReportsListView(APIView):
                 "updated_at": report.updated_at,
             })
 
-        return Response(reports_data)
+        response = Response(reports_data)
+        response['X-Total-Count'] = total
+        return response
 
 
 class AdminReportUpdateView(APIView):
@@ -2374,6 +2163,13 @@ class AdminReportResolveView(APIView):
         """Cancel an exchange and refund credits based on offer type"""
         if exchange.status in ['COMPLETED', 'CANCELLED']:
             return False
+        # Only refund if this request is the one that moves the exchange out of
+        # PENDING/ACCEPTED; a participant may have completed or cancelled it since
+        previous = exchange.status
+        if not exchange_states.move(exchange, {'status': previous}, status='CANCELLED'):
+            return False
+        # update() skips the signal that keeps the offer's slot counters
+        Offer.move_slot(exchange.offer_id, previous, 'CANCELLED')
         
         offer = exchange.offer
         # Use offer.time_required for pending/accepted exchanges (time_spent is usually 0)
@@ -2390,16 +2186,13 @@ class AdminReportResolveView(APIView):
             payer = exchange.requester
         
         # Unblock credits
-        if payer and exchange.status in ['PENDING', 'ACCEPTED']:
+        if payer:
             try:
                 payer_timebank = payer.timebank
                 payer_timebank.unblock_credit(time_to_refund)
             except Exception:
                 pass
         
-        exchange.status = 'CANCELLED'
-        exchange.save()
-        
         if notify:
             # Notify both participants
             if exchange.provider:
@@ -2674,39 +2467,11 @@ class AdminKPIView(APIView):
         if not request.user.is_admin:
             return Response({"error": "Admin access required"}, status=403)
 
-        from django.db.models import Count, Sum
-
-        # Total users
-        total_users = User.objects.filter(is_deleted=False).count()
-
-        # Active offers (excluding suspended users' offers)
-        active_offers = Offer.objects.filter(
-            status='ACTIVE',
-            type='offer',
-            user__is_banned=False
-        ).count()
-
-        # Active wants (excluding suspended users' wants)
-        active_wants = Offer.objects.filter(
-            status='ACTIVE',
-            type='want',
-            user__is_banned=False
-        ).count()
-
-        # Completed exchanges
-        completed_exchanges = Exchange.objects.filter(
-            status='COMPLETED'
-        ).count()
-
-        # Pending reports
-        pending_reports = Report.objects.filter(
-            status='PENDING'
-        ).count()
-
-        # Total time credits (sum of all transactions)
-        total_time_credits = TimeBankTransaction.objects.aggregate(
-            total=Sum('time_amount')
-        )['total'] or 0
+        # Served from the latest snapshot; ?refresh=true recomputes from the live tables
+        if request.query_params.get('refresh') == 'true':
+            snapshot = kpi.take_snapshot()
+        else:
+            snapshot = kpi.latest_snapshot()
 
         # Recent reports (last 10)
         recent_reports = Report.objects.select_related(
@@ -2722,7 +2487,7 @@ class AdminKPIView(APIView):
                     "email": report.reporter.email,
                     "first_name": report.reporter.first_name,
                     "last_name": report.reporter.last_name,
-                },
+                } if report.reporter else None,
                 "reported_user": {
                     "id": report.reported_user.id,
                     "email": report.reported_user.email,
@@ -2737,16 +2502,36 @@ class AdminKPIView(APIView):
             })
 
         return Response({
-            "total_users": total_users,
-            "active_offers": active_offers,
-            "active_wants": active_wants,
-            "completed_exchanges": completed_exchanges,
-            "pending_reports": pending_reports,
-            "total_time_credits": total_time_credits,
+            **kpi.serialize_snapshot(snapshot),
             "recent_reports": recent_reports_data,
         })
 
 
+class AdminKPIHistoryView(APIView):
+    """KPI trends from stored snapshots (admin only)"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.is_admin:
+            return Response({"error": "Admin access required"}, status=403)
+
+        granularity = request.query_params.get('granularity', 'hour')
+        if granularity not in kpi.GRANULARITY_MAX_RANGE:
+            return Response({"error": f"granularity must be one of: {', '.join(kpi.GRANULARITY_MAX_RANGE)}"}, status=400)
+        try:
+            hours = int(request.query_params.get('hours', 24))
+        except ValueError:
+            return Response({"error": "hours must be an integer"}, status=400)
+
+        period = min(timedelta(hours=max(hours, 1)), kpi.GRANULARITY_MAX_RANGE[granularity])
+        snapshots = kpi.history(granularity, timezone.now() - period)
+
+        return Response({
+            "granularity": granularity,
+            "points": [kpi.serialize_snapshot(snapshot) for snapshot in snapshots],
+        })
+
+
 class AdminBanUserView(APIView):
     """Ban a user (admin only)"""
     permission_classes = [IsAuthenticated]
@@ -2775,6 +2560,13 @@ class AdminBanUserView(APIView):
         )
         
         for exchange in active_exchanges:
+            # Skip exchanges completed or cancelled since they were listed
+            previous = exchange.status
+            if not exchange_states.move(exchange, {'status': previous}, status='CANCELLED'):
+                continue
+            # update() skips the signal that keeps the offer's slot counters
+            Offer.move_slot(exchange.offer_id, previous, 'CANCELLED')
+            
             offer = exchange.offer
             time_to_refund = exchange.time_spent or (offer.time_required if offer else 1)
             
@@ -2785,15 +2577,12 @@ class AdminBanUserView(APIView):
                 payer = exchange.requester
             
             # Unblock credits
-            if payer and exchange.status in ['PENDING', 'ACCEPTED']:
+            if payer:
                 try:
                     payer_timebank = payer.timebank
                     payer_timebank.unblock_credit(time_to_refund)
                 except Exception:
                     pass
-            
-            exchange.status = 'CANCELLED'
-            exchange.save()
             cancelled_count += 1
             
             # Notify the other party
@@ -2921,6 +2710,124 @@ class AdminDeleteOfferView(APIView):
         })
 
 
+class AdminBulkModerationView(APIView):
+    """
+    Base for bulk admin actions (admin only). Subclasses name the id list in
+    the request body and run the set-based action from rest_api.moderation.
+    """
+    permission_classes = [IsAuthenticated]
+    ids_field = 'ids'
+    max_ids = 1000
+
+    def post(self, request):
+        if not request.user.is_admin:
+            return Response({"error": "Admin access required"}, status=403)
+
+        ids = request.data.get(self.ids_field)
+        if not isinstance(ids, list) or not ids:
+            return Response({"error": f"{self.ids_field} must be a non-empty list"}, status=400)
+        if len(ids) > self.max_ids:
+            return Response({"error": f"At most {self.max_ids} {self.ids_field} per request"}, status=400)
+        try:
+            ids = {int(item) for item in ids}
+        except (TypeError, ValueError):
+            return Response({"error": f"{self.ids_field} must contain integers"}, status=400)
+
+        return self.perform(request, list(ids))
+
+    def perform(self, request, ids):
+        raise NotImplementedError
+
+
+class AdminBulkBanUsersView(AdminBulkModerationView):
+    """Ban many users and cancel their exchanges in one transaction"""
+    ids_field = 'user_ids'
+
+    def perform(self, request, ids):
+        ids = [user_id for user_id in ids if user_id != request.user.id]
+        result = moderation.ban_users(ids, request.data.get('reason', ''))
+        return Response({"message": f"{result['banned_users']} user(s) banned", **result})
+
+
+class AdminBulkWarnUsersView(AdminBulkModerationView):
+    """Warn many users at once"""
+    ids_field = 'user_ids'
+
+    def perform(self, request, ids):
+        message = request.data.get('message', '')
+        if not message:
+            return Response({"error": "message is required"}, status=400)
+        result = moderation.warn_users(ids, message)
+        return Response({"message": f"{result['warned_users']} user(s) warned", **result})
+
+
+class AdminBulkRemoveOffersView(AdminBulkModerationView):
+    """Flag and remove many offers or wants, cancelling their exchanges"""
+    ids_field = 'offer_ids'
+
+    def perform(self, request, ids):
+        result = moderation.remove_offers(ids, request.data.get('reason', ''))
+        return Response({"message": f"{result['removed_offers']} offer(s) removed", **result})
+
+
+class AdminBulkResolveReportsView(AdminBulkModerationView):
+    """Resolve or dismiss many reports at once"""
+    ids_field = 'report_ids'
+
+    def perform(self, request, ids):
+        report_status = request.data.get('status', 'RESOLVED')
+        if report_status not in ['RESOLVED', 'DISMISSED']:
+            return Response({"error": "status must be 'RESOLVED' or 'DISMISSED'"}, status=400)
+        result = moderation.resolve_reports(ids, request.user, report_status, request.data.get('admin_notes', ''))
+        return Response({"message": f"{result['updated_reports']} report(s) updated", **result})
+
+
+# Messages per page of an admin chat transcript
+TRANSCRIPT_PAGE_SIZE = 50
+TRANSCRIPT_MAX_PAGE_SIZE = 200
+
+
+def serialize_admin_message(request, msg):
+    avatar_url = None
+    try:
+        if hasattr(msg.user, 'profile') and msg.user.profile and msg.user.profile.avatar:
+            avatar_url = request.build_absolute_uri(msg.user.profile.avatar.url)
+    except Exception:
+        pass
+
+    return {
+        'id': msg.id,
+        'user_id': msg.user.id,
+        'user': {
+            'id': msg.user.id,
+            'first_name': msg.user.first_name,
+            'last_name': msg.user.last_name,
+            'email': msg.user.email,
+            'profile': {
+                'avatar': avatar_url,
+            }
+        },
+        'content': msg.content,
+        'created_at': msg.created_at.isoformat(),
+    }
+
+
+def transcript_page(request, exchange_id, cursor=None, limit=50, query=''):
+    """
+    One page of an exchange's messages, oldest first, after message id `cursor`.
+    Returns (messages, next_cursor); next_cursor is None on the last page.
+    """
+    messages = Message.objects.filter(chat__exchange_id=exchange_id)
+    if cursor:
+        messages = messages.filter(id__gt=cursor)
+    if query:
+        messages = messages.filter(content__icontains=query)
+    # Fetch one extra row to know whether another page exists
+    page = list(messages.select_related('user', 'user__profile').order_by('id')[:limit + 1])
+    next_cursor = page[limit - 1].id if len(page) > limit else None
+    return [serialize_admin_message(request, msg) for msg in page[:limit]], next_cursor
+
+
 class AdminExchangeDetailView(APIView):
     """Get exchange details with messages for admin"""
     permission_classes = [IsAuthenticated]
@@ -2935,37 +2842,8 @@ class AdminExchangeDetailView(APIView):
                 'offer__user', 'offer__user__profile'
             ).prefetch_related('ratings').get(id=exchange_id)
 
-            # Get messages
-            try:
-                chat = Chat.objects.filter(exchange=exchange).first()
-                messages = []
-                if chat:
-                    messages_queryset = Message.objects.filter(chat=chat).select_related('user', 'user__profile').order_by('created_at')
-                    for msg in messages_queryset:
-                        avatar_url = None
-                        try:
-                            if hasattr(msg.user, 'profile') and msg.user.profile and msg.user.profile.avatar:
-                                avatar_url = request.build_absolute_uri(msg.user.profile.avatar.url)
-                        except Exception:
-                            pass
-                        
-                        messages.append({
-                            'id': msg.id,
-                            'user_id': msg.user.id,
-                            'user': {
-                                'id': msg.user.id,
-                                'first_name': msg.user.first_name,
-                                'last_name': msg.user.last_name,
-                                'email': msg.user.email,
-                                'profile': {
-                                    'avatar': avatar_url,
-                                }
-                            },
-                            'content': msg.content,
-                            'created_at': msg.created_at.isoformat(),
-                        })
-            except Exception as e:
-                messages = []
+            # First page of the transcript; later pages come from AdminExchangeMessagesView
+            messages, next_cursor = transcript_page(request, exchange.id, limit=TRANSCRIPT_PAGE_SIZE)
 
             ratings_data = []
             for rating in exchange.ratings.all():
@@ -3032,12 +2910,101 @@ class AdminExchangeDetailView(APIView):
                 "completed_at": exchange.completed_at.isoformat() if exchange.completed_at else None,
                 "ratings": ratings_data,
                 "messages": messages,
+                "messages_next_cursor": next_cursor,
             })
 
         except Exchange.DoesNotExist:
             return Response({"error": "Exchange not found"}, status=404)
 
 
+class AdminExchangeMessagesView(APIView):
+    """Page through (and search) an exchange's chat transcript (admin only)
+
+    Query params: cursor (next_cursor of the previous page), limit, q (search text)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, exchange_id):
+        if not request.user.is_admin:
+            return Response({"error": "Admin access required"}, status=403)
+
+        if not Exchange.objects.filter(id=exchange_id).exists():
+            return Response({"error": "Exchange not found"}, status=404)
+
+        try:
+            cursor = int(request.query_params['cursor']) if request.query_params.get('cursor') else None
+            limit = max(1, min(int(request.query_params.get('limit', TRANSCRIPT_PAGE_SIZE)), TRANSCRIPT_MAX_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "cursor and limit must be integers"}, status=400)
+
+        messages, next_cursor = transcript_page(
+            request, exchange_id, cursor=cursor, limit=limit, query=request.query_params.get('q', '').strip()
+        )
+        return Response({
+            "messages": messages,
+            "next_cursor": next_cursor,
+        })
+
+
+class AdminExchangeTranscriptExportView(APIView):
+    """Download an exchange's full chat transcript as CSV, streamed (admin only)"""
+    permission_classes = [IsAuthenticated]
+
+    class Echo:
+        """File-like object for csv.writer that hands rows back instead of storing them"""
+        def write(self, value):
+            return value
+
+    # Spreadsheet apps evaluate cells starting with these as formulas
+    FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+    def escape_cell(self, value):
+        """Quote user-written text so a spreadsheet opening the export shows it as text"""
+        if value and value.startswith(self.FORMULA_PREFIXES):
+            return f"'{value}"
+        return value
+
+    def get(self, request, exchange_id):
+        if not request.user.is_admin:
+            return Response({"error": "Admin access required"}, status=403)
+
+        if not Exchange.objects.filter(id=exchange_id).exists():
+            return Response({"error": "Exchange not found"}, status=404)
+
+        messages = (
+            Message.objects.filter(chat__exchange_id=exchange_id)
+            .order_by('id')
+            .values_list('id', 'created_at', 'user_id', 'user__email', 'content')
+        )
+        writer = csv.writer(self.Echo())
+
+        def rows():
+            yield writer.writerow(['id', 'created_at', 'user_id', 'user_email', 'content'])
+            # iterator() streams rows from the database instead of loading the whole transcript
+            for message_id, created_at, user_id, email, content in messages.iterator(chunk_size=500):
+                yield writer.writerow([
+                    message_id, created_at.isoformat(), user_id, self.escape_cell(email), self.escape_cell(content),
+                ])
+
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="exchange-{exchange_id}-transcript.csv"'
+        return response
+
+
+class AdminMetricsView(APIView):
+    """Get runtime metrics (open WebSocket connections etc.) of this worker"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.is_admin:
+            return Response({"error": "Admin access required"}, status=403)
+
+        data = metrics.snapshot()
+        # The email worker runs in its own process, so read its queue depth from the database
+        data['gauges']['email.queue_depth'] = queue_depth()
+        return Response(data)
+
+
 class NotificationsView(APIView):
     """Get user's notifications"""
     permission_classes = [IsAuthenticated]
@@ -3104,31 +3071,134 @@ class MarkAllNotificationsReadView(APIView):
         return Response({"message": "All notifications marked as read"})
 
 
+# ==================== Inbox Views ====================
+
+class InboxView(APIView):
+    """List the user's exchange chats with last message and unread count"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 50)), 100))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+
+        # One query: the read marker table is indexed on (user, -last_message_at)
+        markers = ChatReadMarker.objects.filter(user=request.user).select_related(
+            'chat__last_message',
+            'chat__exchange__offer',
+            'chat__exchange__provider__profile',
+            'chat__exchange__requester__profile',
+        ).order_by(models.F('last_message_at').desc(nulls_last=True), '-id')[:limit]
+
+        inbox = []
+        for marker in markers:
+            exchange = marker.chat.exchange
+            counterparty = exchange.requester if exchange.provider_id == request.user.id else exchange.provider
+            counterparty_profile = getattr(counterparty, 'profile', None) if counterparty else None
+            last_message = marker.chat.last_message
+
+            inbox.append({
+                "exchange_id": exchange.id,
+                "chat_id": marker.chat_id,
+                "status": exchange.status,
+                "offer": {
+                    "id": exchange.offer.id,
+                    "title": exchange.offer.title,
+                } if exchange.offer else None,
+                "counterparty": {
+                    "id": counterparty.id,
+                    "first_name": counterparty.first_name,
+                    "last_name": counterparty.last_name,
+                    "avatar": request.build_absolute_uri(counterparty_profile.avatar.url) if counterparty_profile and counterparty_profile.avatar else None,
+                } if counterparty else None,
+                "last_message": {
+                    "id": last_message.id,
+                    "user_id": last_message.user_id,
+                    "content": last_message.content,
+                    "created_at": last_message.created_at.isoformat(),
+                } if last_message else None,
+                "unread_count": marker.unread_count,
+            })
+
+        return Response(inbox)
+
+
+class MarkChatReadView(APIView):
+    """Mark an exchange chat as read up to its last message"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, exchange_id):
+        chat = Chat.objects.filter(exchange_id=exchange_id, read_markers__user=request.user).first()
+        if not chat:
+            return Response({"error": "Chat not found"}, status=404)
+
+        chat.mark_read(request.user)
+        return Response({"message": "Chat marked as read"})
+
+
 # ==================== Forum Views ====================
 
 class ForumPostListView(APIView):
     """List all forum posts or create a new post"""
     permission_classes = [AllowAny]
+    throttle_classes = PUBLIC_THROTTLES
+    throttle_scope = 'forum'
 
     def get(self, request):
-        """List all forum posts (FR-84, FR-89)"""
+        """List forum posts, newest first (FR-84, FR-89)
+
+        Paged with ?limit (default 20, max 100); ?before=<post id> returns the
+        posts after that one, so following pages stay as cheap as the first.
+        If that post has been deleted the cursor is stale and the request
+        gets a 400 (code STALE_CURSOR) so the client can start over.
+        ?q= searches titles, content and comments; ?sort=trending orders by
+        the precomputed hot score instead of age.
+        """
         from .models import ForumPost
         
-        posts = ForumPost.objects.all()
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+            before = int(request.query_params['before']) if request.query_params.get('before') else None
+        except ValueError:
+            return Response({"error": "limit and before must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        sort = request.query_params.get('sort', 'newest')
+        if sort not in ('newest', 'trending'):
+            return Response({"error": "sort must be 'newest' or 'trending'"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # One query: author and profile joined, comments counted in the database
+        posts = ForumPost.objects.defer('search_vector').select_related('user__profile').annotate(
+            comment_count=models.Count('comments')
+        )
         
-        # Filter by category (FR-89)
+        # Filter by category (FR-89); served by the (category, created_at) index
         category = request.query_params.get('category')
         if category:
             posts = posts.filter(category=category)
         
+        query = request.query_params.get('q', '').strip()
+        if query:
+            posts = forum.search(posts, query)
+        
+        # Keyset pagination on (created_at, id), or (hot_score, id) when trending
+        sort_field = 'hot_score' if sort == 'trending' else 'created_at'
+        if before:
+            anchor = ForumPost.objects.filter(id=before).values_list(sort_field, flat=True).first()
+            if anchor is None:
+                return Response({
+                    "error": "The post this page starts after no longer exists, reload the first page",
+                    "code": "STALE_CURSOR"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            posts = posts.filter(
+                Q(**{f'{sort_field}__lt': anchor}) | Q(**{sort_field: anchor, 'id__lt': before})
+            )
+        
         posts_data = []
-        for post in posts:
+        for post in posts.order_by(f'-{sort_field}', '-id')[:limit]:
             # Get user profile for avatar
-            try:
-                profile = post.user.profile
-                avatar_url = profile.avatar.url if profile.avatar else None
-            except:
-                avatar_url = None
+            profile = get_related_or_none(post.user, 'profile')
+            avatar_url = profile.avatar.url if profile and profile.avatar else None
             
             posts_data.append({
                 "id": post.id,
@@ -3137,7 +3207,7 @@ class ForumPostListView(APIView):
                 "category": post.category,
                 "created_at": post.created_at.isoformat(),
                 "updated_at": post.updated_at.isoformat(),
-                "comment_count": post.comments.count(),
+                "comment_count": post.comment_count,
                 # FR-90: Display author name, avatar, timestamp
                 "user": {
                     "id": post.user.id,
@@ -3196,6 +3266,9 @@ class ForumPostListView(APIView):
             content=content,
             category=category
         )
+        match = content_scanner.scan(title, content)
+        if match:
+            content_scanner.report_match(match, request.user, 'forum_post', post.id)
         
         # Get user profile for avatar
         try:
@@ -3222,67 +3295,121 @@ class ForumPostListView(APIView):
         }, status=status.HTTP_201_CREATED)
 
 
+# Comments per page of a forum thread
+FORUM_COMMENT_PAGE_SIZE = 50
+FORUM_COMMENT_MAX_PAGE_SIZE = 200
+
+
+def serialize_forum_user(user):
+    """Author block shown on forum posts and comments (FR-90)"""
+    profile = get_related_or_none(user, 'profile')
+    return {
+        "id": user.id,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "email": user.email,
+        "avatar": profile.avatar.url if profile and profile.avatar else None,
+    }
+
+
+def serialize_forum_comment(comment):
+    return {
+        "id": comment.id,
+        "content": comment.content,
+        "created_at": comment.created_at.isoformat(),
+        "user": serialize_forum_user(comment.user),
+    }
+
+
+def forum_post_cache_key(post_id):
+    return f'forum:post:{post_id}'
+
+
+def forum_post_header(post_id):
+    """
+    A post without its comments, including the comment count, or None if it
+    doesn't exist. Cached for FORUM_POST_CACHE_TTL seconds; anything that
+    changes the post or its comment count calls invalidate_forum_post.
+    """
+    key = forum_post_cache_key(post_id)
+    try:
+        header = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Forum post cache read failed: {e}")
+        header = None
+    if header is not None:
+        return header
+
+    post = (
+        ForumPost.objects.defer('search_vector')
+        .select_related('user__profile')
+        .annotate(comment_count=models.Count('comments'))
+        .filter(id=post_id)
+        .first()
+    )
+    if post is None:
+        return None
+    header = {
+        "id": post.id,
+        "title": post.title,
+        "content": post.content,
+        "category": post.category,
+        "created_at": post.created_at.isoformat(),
+        "updated_at": post.updated_at.isoformat(),
+        "comment_count": post.comment_count,
+        "user": serialize_forum_user(post.user),
+    }
+    try:
+        cache.set(key, header, timeout=settings.FORUM_POST_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Forum post cache write failed: {e}")
+    return header
+
+
+def invalidate_forum_post(post_id):
+    try:
+        cache.delete(forum_post_cache_key(post_id))
+    except Exception as e:
+        logger.warning(f"Forum post cache invalidation failed: {e}")
+
+
+def forum_comment_page(post_id, cursor=None, limit=FORUM_COMMENT_PAGE_SIZE):
+    """
+    One page of a post's comments, oldest first, after comment id `cursor`.
+    Returns (comments, next_cursor); next_cursor is None on the last page.
+    """
+    comments = ForumComment.objects.filter(post_id=post_id)
+    if cursor:
+        comments = comments.filter(id__gt=cursor)
+    # Fetch one extra row to know whether another page exists
+    page = list(comments.defer('search_vector').select_related('user__profile').order_by('id')[:limit + 1])
+    next_cursor = page[limit - 1].id if len(page) > limit else None
+    return [serialize_forum_comment(comment) for comment in page[:limit]], next_cursor
+
+
 class ForumPostDetailView(APIView):
     """Get, update, or delete a forum post"""
     permission_classes = [AllowAny]
 
     def get(self, request, post_id):
-        """Get a single forum post with comments (FR-84, FR-90)"""
-        from .models import ForumPost
-        
-        try:
-            post = ForumPost.objects.get(id=post_id)
-        except ForumPost.DoesNotExist:
+        """Get a single forum post with the first page of comments (FR-84, FR-90)
+
+        Further comments come from ForumCommentCreateView.get using
+        `comments_next_cursor`.
+        """
+        header = forum_post_header(post_id)
+        if header is None:
             return Response(
                 {"error": "Post not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Get user profile for avatar
-        try:
-            profile = post.user.profile
-            avatar_url = profile.avatar.url if profile.avatar else None
-        except:
-            avatar_url = None
-        
-        # Get comments with user info (FR-90)
-        comments_data = []
-        for comment in post.comments.all():
-            try:
-                comment_profile = comment.user.profile
-                comment_avatar_url = comment_profile.avatar.url if comment_profile.avatar else None
-            except:
-                comment_avatar_url = None
-            
-            comments_data.append({
-                "id": comment.id,
-                "content": comment.content,
-                "created_at": comment.created_at.isoformat(),
-                "user": {
-                    "id": comment.user.id,
-                    "first_name": comment.user.first_name,
-                    "last_name": comment.user.last_name,
-                    "email": comment.user.email,
-                    "avatar": comment_avatar_url,
-                }
-            })
+        comments, next_cursor = forum_comment_page(post_id, limit=FORUM_COMMENT_PAGE_SIZE)
         
         return Response({
-            "id": post.id,
-            "title": post.title,
-            "content": post.content,
-            "category": post.category,
-            "created_at": post.created_at.isoformat(),
-            "updated_at": post.updated_at.isoformat(),
-            "comment_count": len(comments_data),
-            "user": {
-                "id": post.user.id,
-                "first_name": post.user.first_name,
-                "last_name": post.user.last_name,
-                "email": post.user.email,
-                "avatar": avatar_url,
-            },
-            "comments": comments_data
+            **header,
+            "comments": comments,
+            "comments_next_cursor": next_cursor,
         })
 
     def delete(self, request, post_id):
@@ -3311,13 +3438,40 @@ class ForumPostDetailView(APIView):
             )
         
         post.delete()
+        invalidate_forum_post(post_id)
         return Response({"message": "Post deleted successfully"})
 
 
 class ForumCommentCreateView(APIView):
-    """Create a comment on a forum post"""
+    """List or create comments on a forum post"""
     permission_classes = [IsAuthenticated]
 
+    def get_permissions(self):
+        # Comments are public, like the post itself
+        if self.request.method == 'GET':
+            return [AllowAny()]
+        return super().get_permissions()
+
+    def get(self, request, post_id):
+        """Page through a post's comments, oldest first, with ?cursor and ?limit"""
+        try:
+            cursor = int(request.query_params['cursor']) if request.query_params.get('cursor') else None
+            limit = max(1, min(int(request.query_params.get('limit', FORUM_COMMENT_PAGE_SIZE)), FORUM_COMMENT_MAX_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "cursor and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not ForumPost.objects.filter(id=post_id).exists():
+            return Response(
+                {"error": "Post not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        comments, next_cursor = forum_comment_page(post_id, cursor=cursor, limit=limit)
+        return Response({
+            "comments": comments,
+            "next_cursor": next_cursor,
+        })
+
     def post(self, request, post_id):
         """Add a comment to a forum post (FR-86) - Verified users only"""
         # Check if user is verified
@@ -3357,26 +3511,13 @@ class ForumCommentCreateView(APIView):
             user=request.user,
             content=content
         )
+        match = content_scanner.scan(content)
+        if match:
+            content_scanner.report_match(match, request.user, 'forum_comment', comment.id)
+        # The cached post header carries the comment count
+        invalidate_forum_post(post.id)
         
-        # Get user profile for avatar
-        try:
-            profile = comment.user.profile
-            avatar_url = profile.avatar.url if profile.avatar else None
-        except:
-            avatar_url = None
-        
-        return Response({
-            "id": comment.id,
-            "content": comment.content,
-            "created_at": comment.created_at.isoformat(),
-            "user": {
-                "id": comment.user.id,
-                "first_name": comment.user.first_name,
-                "last_name": comment.user.last_name,
-                "email": comment.user.email,
-                "avatar": avatar_url,
-            }
-        }, status=status.HTTP_201_CREATED)
+        return Response(serialize_forum_comment(comment), status=status.HTTP_201_CREATED)
 
 
 class ForumCommentDeleteView(APIView):
@@ -3403,4 +3544,5 @@ class ForumCommentDeleteView(APIView):
             )
         
         comment.delete()
+        invalidate_forum_post(comment.post_id)
         return Response({"message": "Comment deleted successfully"})
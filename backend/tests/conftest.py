@@ -1,9 +1,11 @@
 """
 Pytest configuration and fixtures for backend tests
 """
+import fakeredis
 import pytest
 from rest_framework.test import APIClient
 from django.test import Client
+from django.core.cache import cache
 
 from tests.factories import (
     UserFactory, AdminUserFactory, UserProfileFactory, TimeBankFactory,
@@ -15,6 +17,8 @@ from tests.factories import (
 )
 from rest_api.auth.views import password_hash
 from rest_api.auth.serializers import get_tokens_for_user
+from rest_api.auth.principal_cache import clear_local_cache
+from rest_api import content_scanner, ratelimit
 
 
 # Database access for all tests
@@ -24,6 +28,53 @@ def enable_db_access_for_all_tests(db):
     pass
 
 
+@pytest.fixture(autouse=True)
+def fast_password_hashers(settings):
+    """Use a cheap hasher in tests; Argon2 would dominate the run time"""
+    settings.PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+        'rest_api.auth.hashers.LegacySHA256PasswordHasher',
+    ]
+
+
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    """Start every test with empty authentication caches"""
+    clear_local_cache()
+    try:
+        cache.clear()
+    except Exception:
+        pass
+    yield
+    clear_local_cache()
+
+
+@pytest.fixture(autouse=True)
+def rate_limit_store(monkeypatch):
+    """Keep rate limit buckets in a fresh in-memory Redis for every test"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(ratelimit, '_get_client', lambda: fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(ratelimit, '_get_async_client', lambda: fakeredis.FakeAsyncRedis(server=server))
+    ratelimit.reset()
+    yield server
+
+
+@pytest.fixture(autouse=True)
+def moderation_terms(settings, tmp_path):
+    """Scan content against a per-test term file; call the fixture to set its lines"""
+    path = tmp_path / 'moderation_terms.txt'
+    path.write_text('')
+    settings.MODERATION_TERMS_FILE = str(path)
+    content_scanner.reload()
+
+    def set_terms(*lines):
+        path.write_text('\n'.join(lines))
+        content_scanner.reload()
+
+    yield set_terms
+    content_scanner.reload()
+
+
 # Client fixtures
 @pytest.fixture
 def api_client():
@@ -3,6 +3,8 @@ Tests for WebSocket consumers
 Note: WebSocket tests require proper routing setup. These tests focus on
 consumer authentication and basic functionality.
 """
+import zlib
+import msgpack
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from channels.testing import WebsocketCommunicator
@@ -10,8 +12,12 @@ from channels.routing import URLRouter
 from channels.db import database_sync_to_async
 from django.urls import re_path
 
-from rest_api.consumers import ChatConsumer, ExchangeConsumer, NotificationConsumer
-from rest_api.models import User, Exchange, Chat, Message, Notification
+from rest_api import metrics
+from rest_api.consumers import (
+    ChatConsumer, ExchangeConsumer, NotificationConsumer,
+    CLOSE_CONNECTION_LIMIT, CLOSE_FORBIDDEN, CLOSE_IDLE_TIMEOUT, COMPACT_SUBPROTOCOL,
+)
+from rest_api.models import User, Exchange, Chat, Message, Notification, Report
 from tests.factories import (
     UserFactory, ExchangeFactory, AcceptedExchangeFactory,
     ChatFactory, MessageFactory, NotificationFactory,
@@ -80,6 +86,299 @@ class TestChatConsumer:
             await communicator.disconnect()
 
 
+async def receive_frame(communicator, frame_type, timeout=1):
+    """Receive frames until one of the given type arrives"""
+    while True:
+        frame = await communicator.receive_json_from(timeout=timeout)
+        if frame.get('type') == frame_type:
+            return frame
+
+
+class TestChatPresenceAndTyping:
+    """Tests for presence and typing indicators in ChatConsumer"""
+    
+    async def _connect_pair(self):
+        provider, _ = await database_sync_to_async(create_user_with_timebank)()
+        requester, _ = await database_sync_to_async(create_user_with_timebank)()
+        exchange = await database_sync_to_async(AcceptedExchangeFactory)(
+            provider=provider, requester=requester
+        )
+        communicators = []
+        for user in (provider, requester):
+            tokens = await database_sync_to_async(get_tokens_for_user)(user)
+            communicator = WebsocketCommunicator(
+                application,
+                f"/ws/chat/{exchange.id}/?token={tokens['access']}"
+            )
+            connected, _ = await communicator.connect()
+            assert connected
+            communicators.append(communicator)
+        return provider, requester, communicators
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_presence_announced_to_both_members(self):
+        """Test joining member is announced and learns who is already online"""
+        provider, requester, (provider_ws, requester_ws) = await self._connect_pair()
+        try:
+            joined = await receive_frame(provider_ws, 'presence')
+            assert joined['data'] == {'user_id': str(requester.id), 'status': 'online', 'expires_in': 75}
+            
+            already_online = await receive_frame(requester_ws, 'presence')
+            assert already_online['data']['user_id'] == str(provider.id)
+            assert already_online['data']['status'] == 'online'
+        finally:
+            await requester_ws.disconnect()
+            left = await receive_frame(provider_ws, 'presence')
+            assert left['data']['status'] == 'offline'
+            await provider_ws.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_non_participant_is_rejected(self):
+        """Test an outsider can't join the room, appear online or type"""
+        provider, requester, (provider_ws, requester_ws) = await self._connect_pair()
+        exchange_id = provider_ws.scope['path'].split('/')[3]
+        while not await provider_ws.receive_nothing(timeout=0.2):
+            await provider_ws.receive_json_from()
+        stranger, _ = await database_sync_to_async(create_user_with_timebank)()
+        tokens = await database_sync_to_async(get_tokens_for_user)(stranger)
+        stranger_ws = WebsocketCommunicator(
+            application,
+            f"/ws/chat/{exchange_id}/?token={tokens['access']}"
+        )
+        
+        await stranger_ws.connect()
+        
+        frame = await stranger_ws.receive_json_from(timeout=1)
+        assert frame['type'] == 'error'
+        assert (await receive_close(stranger_ws))['code'] == CLOSE_FORBIDDEN
+        await stranger_ws.send_json_to({'type': 'typing', 'is_typing': True})
+        assert await provider_ws.receive_nothing(timeout=0.2)
+        
+        await stranger_ws.disconnect()
+        await provider_ws.disconnect()
+        await requester_ws.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_offline_only_after_last_tab_closes(self):
+        """Test closing one of two tabs keeps the user online for the other member"""
+        provider, requester, (provider_ws, requester_ws) = await self._connect_pair()
+        exchange_id = provider_ws.scope['path'].split('/')[3]
+        tokens = await database_sync_to_async(get_tokens_for_user)(provider)
+        second_tab = WebsocketCommunicator(
+            application,
+            f"/ws/chat/{exchange_id}/?token={tokens['access']}"
+        )
+        connected, _ = await second_tab.connect()
+        assert connected
+        while not await requester_ws.receive_nothing(timeout=0.2):
+            await requester_ws.receive_json_from()
+        
+        await provider_ws.disconnect()
+        assert await requester_ws.receive_nothing(timeout=0.2)
+        
+        await second_tab.disconnect()
+        left = await receive_frame(requester_ws, 'presence')
+        assert left['data'] == {'user_id': str(provider.id), 'status': 'offline', 'expires_in': 75}
+        await requester_ws.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_typing_is_broadcast_and_rate_limited(self):
+        """Test typing events reach the other member and repeats are throttled"""
+        provider, requester, (provider_ws, requester_ws) = await self._connect_pair()
+        try:
+            for _ in range(5):
+                await requester_ws.send_json_to({'type': 'typing', 'is_typing': True})
+            await requester_ws.send_json_to({'type': 'typing', 'is_typing': False})
+            
+            started = await receive_frame(provider_ws, 'typing')
+            assert started['data'] == {'user_id': str(requester.id), 'is_typing': True}
+            stopped = await receive_frame(provider_ws, 'typing')
+            assert stopped['data']['is_typing'] is False
+            
+            # Throttled repeats never reach the other member
+            assert await provider_ws.receive_nothing(timeout=0.2)
+        finally:
+            await requester_ws.disconnect()
+            await provider_ws.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_message_flood_is_rate_limited(self, settings):
+        """Messages beyond the burst get an error frame and are not saved"""
+        settings.CHAT_RATE_LIMIT_BURST = 2
+        settings.CHAT_RATE_LIMIT_REFILL = 0.1
+        provider, requester, (provider_ws, requester_ws) = await self._connect_pair()
+        
+        for i in range(3):
+            await provider_ws.send_json_to({'message': f'hello {i}'})
+        
+        frame = await receive_frame(provider_ws, 'error')
+        assert frame['code'] == 'rate_limited'
+        assert frame['retry_after'] > 0
+        assert await database_sync_to_async(Message.objects.count)() == 2
+        
+        await provider_ws.disconnect()
+        await requester_ws.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_flagged_message_is_reported(self, moderation_terms):
+        """Messages matching a moderation term are delivered and queued for review"""
+        moderation_terms('FRAUD: pay outside the platform')
+        provider, requester, (provider_ws, requester_ws) = await self._connect_pair()
+        
+        await provider_ws.send_json_to({'message': 'Lets PAY outside the platform'})
+        frame = await receive_frame(requester_ws, 'message')
+        
+        report = await database_sync_to_async(Report.objects.get)(target_type='message')
+        assert report.target_id == int(frame['data']['id'])
+        assert report.reported_user_id == provider.id
+        assert report.reason == 'FRAUD'
+        
+        await provider_ws.disconnect()
+        await requester_ws.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_user_limit_spans_connections(self, settings):
+        """The per-user bucket is shared by all of a user's connections"""
+        settings.CHAT_USER_RATE_LIMIT_BURST = 1
+        settings.CHAT_USER_RATE_LIMIT_REFILL = 0.1
+        provider, requester, (provider_ws, requester_ws) = await self._connect_pair()
+        exchange_id = provider_ws.scope['path'].split('/')[3]
+        tokens = await database_sync_to_async(get_tokens_for_user)(provider)
+        second_ws = WebsocketCommunicator(
+            application,
+            f"/ws/chat/{exchange_id}/?token={tokens['access']}"
+        )
+        connected, _ = await second_ws.connect()
+        assert connected
+        
+        await provider_ws.send_json_to({'message': 'first'})
+        await receive_frame(provider_ws, 'message')
+        await second_ws.send_json_to({'message': 'second'})
+        
+        frame = await receive_frame(second_ws, 'error')
+        assert frame['code'] == 'rate_limited'
+        
+        for communicator in (provider_ws, requester_ws, second_ws):
+            await communicator.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_typing_does_not_touch_database(self):
+        """Test typing events create no messages or notifications"""
+        provider, requester, (provider_ws, requester_ws) = await self._connect_pair()
+        try:
+            await requester_ws.send_json_to({'type': 'typing', 'is_typing': True})
+            await receive_frame(provider_ws, 'typing')
+            
+            assert await database_sync_to_async(Message.objects.count)() == 0
+            assert await database_sync_to_async(Notification.objects.count)() == 0
+        finally:
+            await requester_ws.disconnect()
+            await provider_ws.disconnect()
+
+
+async def receive_compact_frame(communicator, timeout=1):
+    """Receive and decode one binary frame of the compact protocol"""
+    output = await communicator.receive_output(timeout=timeout)
+    payload = output['bytes']
+    if payload[:1] == b'\x78':
+        payload = zlib.decompress(payload)
+    return len(output['bytes']), msgpack.unpackb(payload)
+
+
+class TestCompactProtocol:
+    """Tests for the opt-in MessagePack frame protocol"""
+    
+    async def _history(self, subprotocols=None):
+        provider, _ = await database_sync_to_async(create_user_with_timebank)()
+        requester, _ = await database_sync_to_async(create_user_with_timebank)()
+        exchange = await database_sync_to_async(AcceptedExchangeFactory)(
+            provider=provider, requester=requester
+        )
+        chat = await database_sync_to_async(ChatFactory)(exchange=exchange)
+        for i in range(40):
+            await database_sync_to_async(MessageFactory)(chat=chat, user=(provider, requester)[i % 2])
+        tokens = await database_sync_to_async(get_tokens_for_user)(provider)
+        communicator = WebsocketCommunicator(
+            application,
+            f"/ws/chat/{exchange.id}/?token={tokens['access']}",
+            subprotocols=subprotocols,
+        )
+        connected, subprotocol = await communicator.connect()
+        assert connected
+        return communicator, subprotocol
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_history_uses_user_side_table(self):
+        """Compact history frames reference users by id"""
+        communicator, subprotocol = await self._history(subprotocols=[COMPACT_SUBPROTOCOL])
+        
+        assert subprotocol == COMPACT_SUBPROTOCOL
+        _, frame = await receive_compact_frame(communicator)
+        assert frame['type'] == 'messages'
+        assert len(frame['data']) == 40
+        assert 'user' not in frame['data'][0]
+        assert set(frame['users']) == {message['user_id'] for message in frame['data']}
+        
+        await communicator.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_history_is_at_least_three_times_smaller(self):
+        """Compact history takes a third of the bytes of the JSON frame or less"""
+        json_communicator, _ = await self._history()
+        json_output = await json_communicator.receive_output(timeout=1)
+        compact_communicator, _ = await self._history(subprotocols=[COMPACT_SUBPROTOCOL])
+        compact_size, _ = await receive_compact_frame(compact_communicator)
+        
+        assert compact_size * 3 <= len(json_output['text'].encode())
+        
+        await json_communicator.disconnect()
+        await compact_communicator.disconnect()
+
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_binary_message_is_decoded(self):
+        """Compact clients can send MessagePack frames"""
+        communicator, _ = await self._history(subprotocols=[COMPACT_SUBPROTOCOL])
+        await receive_compact_frame(communicator)
+        
+        await communicator.send_to(bytes_data=msgpack.packb({'message': 'packed hello'}))
+        _, frame = await receive_compact_frame(communicator)
+        
+        assert frame['type'] == 'message'
+        assert frame['data']['content'] == 'packed hello'
+        
+        await communicator.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.parametrize('subprotocols', [None, [COMPACT_SUBPROTOCOL]])
+    async def test_unreadable_frame_is_rejected(self, subprotocols):
+        """Binary frames on the JSON protocol, or garbage on the compact one, get a clear error"""
+        communicator, _ = await self._history(subprotocols=subprotocols)
+        await communicator.receive_output(timeout=1)
+        
+        await communicator.send_to(bytes_data=b'\xc1not msgpack')
+        if subprotocols:
+            _, frame = await receive_compact_frame(communicator)
+        else:
+            frame = await communicator.receive_json_from(timeout=1)
+        
+        assert frame['code'] == 'invalid_frame'
+        assert await database_sync_to_async(Message.objects.count)() == 40
+        
+        await communicator.disconnect()
+
 class TestExchangeConsumer:
     """Tests for ExchangeConsumer"""
     
@@ -141,6 +440,92 @@ class TestNotificationConsumer:
             await communicator.disconnect()
 
 
+
+async def receive_close(communicator, timeout=1):
+    """Receive frames until the server closes the connection"""
+    while True:
+        output = await communicator.receive_output(timeout=timeout)
+        if output['type'] == 'websocket.close':
+            return output
+
+
+class TestConnectionLifecycle:
+    """Tests for heartbeats, idle eviction and admission control"""
+    
+    async def _connect(self, user):
+        tokens = await database_sync_to_async(get_tokens_for_user)(user)
+        communicator = WebsocketCommunicator(
+            application,
+            f"/ws/notifications/?token={tokens['access']}"
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        return communicator
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_per_user_limit_rejects_extra_connection(self, settings):
+        """Connections beyond the per-user cap get an error frame and a 4429 close"""
+        settings.WS_MAX_CONNECTIONS_PER_USER = 1
+        user, _ = await database_sync_to_async(create_user_with_timebank)()
+        gauge = 'ws.connections.NotificationConsumer'
+        before = metrics.snapshot()['gauges'].get(gauge, 0)
+        
+        first = await self._connect(user)
+        second = await self._connect(user)
+        
+        frame = await second.receive_json_from(timeout=1)
+        assert frame['type'] == 'error'
+        assert (await receive_close(second))['code'] == CLOSE_CONNECTION_LIMIT
+        assert metrics.snapshot()['gauges'][gauge] == before + 1
+        
+        await second.disconnect()
+        await first.disconnect()
+        assert metrics.snapshot()['gauges'][gauge] == before
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_global_limit_rejects_connection(self, settings):
+        """No connection is admitted once the worker is at its global limit"""
+        settings.WS_MAX_CONNECTIONS = 0
+        user, _ = await database_sync_to_async(create_user_with_timebank)()
+        
+        communicator = await self._connect(user)
+        
+        assert (await receive_close(communicator))['code'] == CLOSE_CONNECTION_LIMIT
+        await communicator.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_silent_client_is_evicted(self, settings):
+        """A client that never answers pings is closed with 4408"""
+        settings.WS_HEARTBEAT_INTERVAL = 0.05
+        settings.WS_IDLE_TIMEOUT = 0.12
+        user, _ = await database_sync_to_async(create_user_with_timebank)()
+        
+        communicator = await self._connect(user)
+        
+        assert (await communicator.receive_json_from(timeout=1))['type'] == 'ping'
+        assert (await receive_close(communicator))['code'] == CLOSE_IDLE_TIMEOUT
+        await communicator.disconnect()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.django_db(transaction=True)
+    async def test_pong_keeps_connection_open(self, settings):
+        """Answering pings counts as activity"""
+        settings.WS_HEARTBEAT_INTERVAL = 0.05
+        settings.WS_IDLE_TIMEOUT = 0.12
+        user, _ = await database_sync_to_async(create_user_with_timebank)()
+        
+        communicator = await self._connect(user)
+        
+        for _ in range(5):
+            assert (await communicator.receive_json_from(timeout=1))['type'] == 'ping'
+            await communicator.send_json_to({'type': 'pong'})
+        
+        await communicator.disconnect()
+
+
 class TestNotificationModel:
     """Tests for notification creation"""
     
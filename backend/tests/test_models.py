@@ -2,8 +2,10 @@
 Unit tests for models
 """
 import pytest
-from django.db import models as django_models
-from rest_api.models import User, UserProfile, TimeBank, Offer, Exchange
+from django.db import connection, models as django_models
+from django.utils import timezone
+from rest_api.models import User, UserProfile, TimeBank, Offer, Exchange, Notification
+from tests.factories import ExchangeFactory, GroupOfferFactory
 
 
 class TestUserModel:
@@ -251,6 +253,73 @@ class TestOfferModel:
         timebank.refresh_from_db()
         
         assert timebank.blocked_amount == blocked_amount - offer.time_required
+    
+    def test_slot_counters_follow_exchange_status(self, offer):
+        """Test exchange saves and deletes move the offer's slot counters"""
+        def counters():
+            offer.refresh_from_db()
+            return offer.pending_count, offer.accepted_count, offer.completed_count
+        
+        exchange = ExchangeFactory(offer=offer)
+        ExchangeFactory(offer=offer)
+        assert counters() == (2, 0, 0)
+        
+        exchange.status = 'ACCEPTED'
+        exchange.save()
+        exchange.save()  # saving again doesn't count twice
+        assert counters() == (1, 1, 0)
+        
+        loaded = Exchange.objects.get(id=exchange.id)
+        loaded.status = 'COMPLETED'
+        loaded.save()
+        assert counters() == (1, 0, 1)
+        
+        loaded.status = 'CANCELLED'
+        loaded.save()
+        Exchange.objects.filter(offer=offer, status='PENDING').get().delete()
+        assert counters() == (0, 0, 0)
+    
+    def test_save_does_not_overwrite_slot_counters(self, offer):
+        """Test saving a stale offer keeps counters changed since it was loaded"""
+        ExchangeFactory(offer=offer)
+        
+        offer.title = 'Renamed'
+        offer.save()
+        
+        offer.refresh_from_db()
+        assert offer.title == 'Renamed'
+        assert offer.pending_count == 1
+    
+    def test_claim_slot_respects_group_capacity(self):
+        """Test claim_slot refuses once pending and accepted exchanges fill a group offer"""
+        offer = GroupOfferFactory(person_count=2)
+        
+        assert offer.claim_slot() is True
+        assert offer.claim_slot() is True
+        assert offer.claim_slot() is False
+        
+        offer.refresh_from_db()
+        assert offer.pending_count == 2
+    
+    def test_accept_slot_allows_one_accepted_for_1to1_offers(self, offer):
+        """Test accept_slot moves a pending exchange to accepted once for 1-to-1 offers"""
+        ExchangeFactory.create_batch(2, offer=offer)
+        
+        assert offer.accept_slot() is True
+        assert offer.accept_slot() is False
+        
+        offer.refresh_from_db()
+        assert (offer.pending_count, offer.accepted_count) == (1, 1)
+    
+    def test_recount_slots(self, offer):
+        """Test recount_slots rebuilds counters after bulk status updates"""
+        ExchangeFactory.create_batch(2, offer=offer)
+        Exchange.objects.filter(offer=offer).update(status='COMPLETED')
+        
+        Offer.recount_slots([offer.id])
+        
+        offer.refresh_from_db()
+        assert (offer.pending_count, offer.completed_count) == (0, 2)
 
 
 class TestExchangeModel:
@@ -351,3 +420,54 @@ class TestNotificationModel:
         """Test __str__ returns user email"""
         assert str(notification) == notification.user.email
 
+
+def query_plan(queryset):
+    """
+    EXPLAIN output of a queryset. Sequential scans are turned off on PostgreSQL
+    so the plan shows the index the query can use even on near-empty test tables.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+    return queryset.explain()
+
+
+class TestQueryIndexes:
+    """The hot view filters are served by the indexes declared on the models"""
+
+    def test_dashboard_uses_listed_offer_index(self, user):
+        """Active, unflagged offers of a type, newest first"""
+        plan = query_plan(Offer.objects.filter(status='ACTIVE', is_flagged=False, type='offer').order_by('-created_at'))
+        assert 'offer_listed_idx' in plan
+
+    def test_profile_uses_user_type_index(self, user):
+        """A user's wants, newest first"""
+        plan = query_plan(Offer.objects.filter(user=user, type='want').order_by('-created_at'))
+        assert 'offer_user_type_idx' in plan
+
+    def test_offer_state_uses_offer_status_index(self, offer):
+        """Accepted exchanges of an offer after a date"""
+        plan = query_plan(Exchange.objects.filter(offer=offer, status='ACCEPTED', proposed_at__gt=timezone.now()))
+        assert 'exchange_offer_status_idx' in plan
+
+    def test_user_exchanges_use_participant_status_indexes(self, user):
+        """Exchanges a user provides or requests, by status"""
+        plan = query_plan(Exchange.objects.filter(provider=user, status='COMPLETED'))
+        assert 'exchange_provider_status_idx' in plan
+        plan = query_plan(Exchange.objects.filter(requester=user, status__in=['PENDING', 'ACCEPTED']))
+        assert 'exchange_requester_status_idx' in plan
+
+    def test_due_exchanges_use_status_proposed_index(self, db):
+        """Accepted exchanges proposed before a date"""
+        plan = query_plan(Exchange.objects.filter(status='ACCEPTED', proposed_at__lt=timezone.now()))
+        assert 'exchange_status_proposed_idx' in plan
+
+    def test_notification_list_uses_user_index(self, user):
+        """A user's notifications, newest first"""
+        plan = query_plan(Notification.objects.filter(user=user).order_by('-created_at'))
+        assert 'notification_user_idx' in plan
+
+    def test_unread_notifications_use_partial_index(self, user):
+        """A user's unread notifications, newest first"""
+        plan = query_plan(Notification.objects.filter(user=user, is_read=False).order_by('-created_at'))
+        assert 'notification_unread_idx' in plan
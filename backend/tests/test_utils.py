@@ -1,37 +1,44 @@
 """
 Tests for utility functions
 """
+import hashlib
+import threading
+import time
+from datetime import timedelta
 import pytest
 from unittest.mock import patch, MagicMock
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework_simplejwt.tokens import AccessToken
 
+from rest_api.auth import hashers, principal_cache
 from rest_api.auth.views import password_hash, verify_password
-from rest_api.models import User, Notification
-from tests.factories import UserFactory, create_user_with_timebank
+from rest_api import content_scanner, emails, exchange_states, forum, idempotency, ratelimit, scheduler
+from rest_api.models import User, Notification, OutgoingEmail, Report, ForumPost, Exchange, Offer, TimeBankTransaction
+from tests.factories import UserFactory, UserProfileFactory, TimeBankFactory, create_user_with_timebank
 
 
 class TestPasswordHashing:
     """Tests for password hashing utilities"""
     
-    def test_password_hash_returns_sha256(self):
-        """Test password_hash returns SHA256 hash"""
-        import hashlib
-        password = 'testpassword'
-        expected = hashlib.sha256(password.encode()).hexdigest()
+    def test_password_hash_uses_preferred_hasher(self):
+        """Test password_hash encodes with the first configured hasher"""
+        result = password_hash('testpassword')
         
-        result = password_hash(password)
-        
-        assert result == expected
+        assert result.startswith('md5$')
     
-    def test_password_hash_is_consistent(self):
-        """Test same password returns same hash"""
-        password = 'consistentpassword'
+    def test_password_hash_is_salted(self):
+        """Test same password returns different hashes"""
+        password = 'saltedpassword'
         
         hash1 = password_hash(password)
         hash2 = password_hash(password)
         
-        assert hash1 == hash2
+        assert hash1 != hash2
     
     def test_password_hash_different_for_different_passwords(self):
         """Test different passwords return different hashes"""
@@ -40,11 +47,11 @@ class TestPasswordHashing:
         
         assert hash1 != hash2
     
-    def test_password_hash_length(self):
-        """Test hash has correct length (64 chars for SHA256)"""
+    def test_password_hash_fits_user_field(self):
+        """Test hash fits the User.password column"""
         result = password_hash('anypassword')
         
-        assert len(result) == 64
+        assert len(result) <= User._meta.get_field('password').max_length
     
     def test_password_hash_handles_unicode(self):
         """Test password_hash handles unicode characters"""
@@ -52,7 +59,46 @@ class TestPasswordHashing:
         
         result = password_hash(password)
         
-        assert len(result) == 64
+        assert verify_password(password, result) is True
+    
+    def test_busy_pool_rejects_instead_of_queueing(self):
+        """Test hashing beyond the pending limit fails fast"""
+        pool = hashers.BoundedHashingPool(workers=1, max_pending=0)
+        started = threading.Event()
+        release = threading.Event()
+        
+        def slow_hash():
+            started.set()
+            release.wait()
+        
+        worker = threading.Thread(target=pool.run, args=(slow_hash,))
+        worker.start()
+        started.wait(timeout=1)
+        
+        try:
+            with pytest.raises(hashers.PasswordHashingBusy):
+                pool.run(password_hash, 'anypassword')
+        finally:
+            release.set()
+            worker.join()
+    
+    def test_timed_out_hash_keeps_its_slot(self):
+        """Test a hash the caller gave up on still counts until it finishes"""
+        pool = hashers.BoundedHashingPool(workers=1, max_pending=0)
+        release = threading.Event()
+        queued = []
+        
+        with pytest.raises(hashers.PasswordHashingBusy):
+            pool.run(release.wait, timeout=0.05)
+        try:
+            with pytest.raises(hashers.PasswordHashingBusy):
+                pool.run(queued.append, 'queued', timeout=0.05)
+        finally:
+            release.set()
+        pool._executor.submit(lambda: None).result(timeout=1)
+        
+        assert queued == []
+        assert verify_password('anypassword', pool.run(password_hash, 'anypassword'))
 
 
 class TestVerifyPassword:
@@ -93,6 +139,24 @@ class TestVerifyPassword:
         result = verify_password('casesensitive', hashed)
         
         assert result is False
+    
+    def test_verify_legacy_sha256_hash(self):
+        """Test bare SHA-256 digests from older releases still verify"""
+        legacy = hashlib.sha256('legacypassword'.encode()).hexdigest()
+        
+        assert verify_password('legacypassword', legacy) is True
+        assert verify_password('wrongpassword', legacy) is False
+    
+    def test_login_rehashes_legacy_hash(self, api_client):
+        """Test a successful login replaces a legacy hash with the preferred hasher"""
+        user = UserFactory(password=hashlib.sha256('Legacypass1'.encode()).hexdigest())
+        
+        response = api_client.post('/api/auth/login', {'email': user.email, 'password': 'Legacypass1'})
+        
+        assert response.status_code == 200
+        user.refresh_from_db()
+        assert user.password.startswith('md5$')
+        assert verify_password('Legacypass1', user.password) is True
 
 
 class TestNotificationHelper:
@@ -221,3 +285,768 @@ class TestCookieAuthentication:
         
         assert response.status_code == 401
 
+
+    def test_repeat_request_uses_cached_principal(self, authenticated_client, django_assert_num_queries):
+        """Test authenticated user is served from the principal cache"""
+        client, user = authenticated_client
+        client.get('/api/auth/me')
+        
+        with django_assert_num_queries(0):
+            response = client.get('/api/auth/me')
+        
+        assert response.status_code == 200
+        assert response.data['user']['id'] == user.id
+    
+    def test_principal_carries_profile_and_timebank(self, authenticated_client, django_assert_num_queries):
+        """Test profile endpoint reuses the profile and timebank loaded with the principal"""
+        client, user = authenticated_client
+        UserProfileFactory(user=user)
+        TimeBankFactory(user=user)
+        client.get('/api/user-profile')
+        
+        with django_assert_num_queries(0):
+            response = client.get('/api/user-profile')
+        
+        assert response.status_code == 200
+        assert response.data['timebank']['available_amount'] == user.timebank.available_amount
+    
+    def test_timebank_change_invalidates_cached_principal(self, authenticated_client):
+        """Test timebank updates are visible on the next request"""
+        client, user = authenticated_client
+        TimeBankFactory(user=user)
+        client.get('/api/user-profile')
+        
+        user.timebank.add_credit(2)
+        
+        response = client.get('/api/user-profile')
+        
+        assert response.data['timebank']['available_amount'] == user.timebank.available_amount
+    
+    def test_ban_invalidates_cached_principal(self, authenticated_client):
+        """Test banning a user is visible on the next request"""
+        client, user = authenticated_client
+        client.get('/api/auth/me')
+        
+        user.is_banned = True
+        user.save()
+        
+        response = client.get('/api/auth/me')
+        
+        assert response.data['user']['is_banned'] is True
+    
+    def test_principal_reloaded_before_commit_is_dropped(self, authenticated_client, monkeypatch,
+                                                          django_capture_on_commit_callbacks):
+        """Test a principal cached while the ban was uncommitted isn't served after the commit"""
+        client, user = authenticated_client
+        jti = AccessToken(client.cookies['access_token'].value)['jti']
+        stale = User.objects.get(id=user.id)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            user.is_banned = True
+            user.save()
+            # A concurrent request still reads the row as it was before the commit
+            monkeypatch.setattr(principal_cache, 'load_principal', lambda user_id: stale)
+            principal_cache.get_principal(user.id, jti)
+            monkeypatch.undo()
+        
+        response = client.get('/api/auth/me')
+        
+        assert response.data['user']['is_banned'] is True
+    
+    def test_local_generations_are_bounded(self):
+        """Test invalidated users' generations are capped and eviction still orphans older loads"""
+        local = principal_cache.LocalPrincipalCache(maxsize=2, ttl=5)
+        loaded_at = local.generation(1)
+        
+        for user_id in range(1, 6):
+            local.discard_user(user_id)
+        local.set((1, 'jti'), b'stale', generation=loaded_at)
+        
+        assert len(local._generations) == 2
+        assert local.get((1, 'jti')) is None
+        local.set((1, 'jti'), b'fresh', generation=local.generation(1))
+        assert local.get((1, 'jti')) == b'fresh'
+    
+    def test_deleted_user_is_rejected(self, authenticated_client):
+        """Test a deleted user's token stops authenticating"""
+        client, user = authenticated_client
+        client.get('/api/auth/me')
+        
+        user.delete()
+        
+        response = client.get('/api/auth/me')
+        
+        assert response.status_code == 401
+    
+    def test_logout_revokes_access_token(self, authenticated_client):
+        """Test access token is rejected after logout"""
+        client, user = authenticated_client
+        access_token = client.cookies['access_token'].value
+        
+        client.post('/api/auth/logout')
+        client.cookies['access_token'] = access_token
+        
+        response = client.get('/api/auth/me')
+        
+        assert response.status_code == 401
+
+
+class TestTokenBucketRateLimit:
+    """Tests for the shared token bucket rate limiter"""
+    
+    def test_burst_then_reject(self):
+        """Test burst is allowed and the next call is rejected with a retry delay"""
+        for _ in range(3):
+            assert ratelimit.consume('test:bucket', rate=1, burst=3) == (True, 0.0)
+        
+        allowed, retry_after = ratelimit.consume('test:bucket', rate=1, burst=3)
+        
+        assert allowed is False
+        assert 0 < retry_after <= 1
+    
+    def test_buckets_are_independent(self):
+        """Test keys don't share tokens"""
+        assert ratelimit.consume('test:a', rate=1, burst=1)[0] is True
+        assert ratelimit.consume('test:a', rate=1, burst=1)[0] is False
+        assert ratelimit.consume('test:b', rate=1, burst=1)[0] is True
+    
+    def test_falls_back_to_local_bucket_when_redis_is_down(self, monkeypatch):
+        """Test limiting keeps working in-process when Redis is unreachable"""
+        def unavailable():
+            raise ratelimit.redis.ConnectionError('down')
+        monkeypatch.setattr(ratelimit, '_get_client', unavailable)
+        
+        assert ratelimit.consume('test:bucket', rate=1, burst=1)[0] is True
+        assert ratelimit.consume('test:bucket', rate=1, burst=1)[0] is False
+    
+    def test_fallback_buckets_are_bounded(self, monkeypatch):
+        """Test idle and least recently used in-process buckets are dropped"""
+        def unavailable():
+            raise ratelimit.redis.ConnectionError('down')
+        monkeypatch.setattr(ratelimit, '_get_client', unavailable)
+        monkeypatch.setattr(ratelimit, 'FALLBACK_MAX_BUCKETS', 2)
+        
+        ratelimit.consume('test:refilled', rate=1000, burst=1)
+        time.sleep(0.01)
+        ratelimit.consume('test:a', rate=1, burst=1)
+        assert list(ratelimit._fallback_buckets) == ['test:a']
+        
+        ratelimit.consume('test:b', rate=1, burst=1)
+        ratelimit.consume('test:a', rate=1, burst=1)
+        ratelimit.consume('test:c', rate=1, burst=1)
+        assert list(ratelimit._fallback_buckets) == ['test:a', 'test:c']
+
+
+class TestApiThrottling:
+    """Tests for the token bucket throttles on public endpoints"""
+    
+    @pytest.fixture
+    def tight_rates(self, settings):
+        settings.API_THROTTLE_RATES = {
+            'ip': (0.01, 2),
+            'endpoint': (0.01, 3),
+        }
+    
+    def test_ip_limit_returns_retry_after(self, api_client, tight_rates):
+        """Test a client over its burst gets 429 with Retry-After"""
+        for _ in range(2):
+            assert api_client.get('/api/offers').status_code == 200
+        
+        response = api_client.get('/api/offers')
+        
+        assert response.status_code == 429
+        assert int(response['Retry-After']) > 0
+    
+    def test_ip_buckets_are_per_client(self, api_client, tight_rates):
+        """Test one client's traffic doesn't throttle another IP"""
+        for _ in range(2):
+            api_client.get('/api/forum/posts')
+        
+        response = api_client.get('/api/forum/posts', REMOTE_ADDR='10.0.0.2')
+        
+        assert response.status_code == 200
+    
+    def test_forwarded_for_spoofing_shares_the_bucket(self, api_client, tight_rates):
+        """Test client-supplied X-Forwarded-For entries don't give new buckets"""
+        for i in range(2):
+            # nginx appends the address it saw to whatever the client sent
+            api_client.get('/api/forum/posts', HTTP_X_FORWARDED_FOR=f'198.51.100.{i}, 203.0.113.7')
+        
+        response = api_client.get('/api/forum/posts', HTTP_X_FORWARDED_FOR='198.51.100.99, 203.0.113.7')
+        
+        assert response.status_code == 429
+    
+    def test_endpoint_limit_is_shared(self, api_client, tight_rates):
+        """Test the endpoint bucket caps all clients combined"""
+        for i in range(3):
+            assert api_client.get('/api/offers', REMOTE_ADDR=f'10.0.0.{i}').status_code == 200
+        
+        response = api_client.get('/api/offers', REMOTE_ADDR='10.0.0.9')
+        
+        assert response.status_code == 429
+    
+    def test_scopes_have_separate_buckets(self, api_client, tight_rates):
+        """Test throttling one endpoint leaves others available"""
+        for _ in range(3):
+            api_client.get('/api/offers')
+        
+        assert api_client.get('/api/forum/posts').status_code == 200
+    
+    def test_login_uses_stricter_auth_rate(self, api_client, settings):
+        """Test login attempts are limited per IP before hitting the hasher"""
+        settings.API_THROTTLE_RATES = {'auth.ip': (0.01, 1)}
+        credentials = {'email': 'nobody@example.com', 'password': 'wrong'}
+        
+        assert api_client.post('/api/auth/login', credentials).status_code != 429
+        response = api_client.post('/api/auth/login', credentials)
+        
+        assert response.status_code == 429
+        assert 'Retry-After' in response
+
+class FailingTransport:
+    """Email transport whose provider is down"""
+    max_batch_size = 100
+    
+    def send_batch(self, emails):
+        raise ConnectionError('provider unavailable')
+
+
+class RejectingTransport(emails.LocalTransport):
+    """Email transport whose provider rejects any batch with an invalid address"""
+    
+    def send_batch(self, emails):
+        if any(email.to_email.startswith('invalid') for email in emails):
+            raise ValueError('invalid `to` field')
+        return super().send_batch(emails)
+
+class TestEmailQueue:
+    """Tests for the queued email delivery worker"""
+    
+    @pytest.fixture(autouse=True)
+    def clear_outbox(self):
+        emails.outbox.clear()
+        yield
+        emails.outbox.clear()
+    
+    def _enqueue(self, count=1):
+        return [
+            emails.enqueue_email(f'user{i}@example.com', 'Subject', '<p>Hi</p>', 'noreply@example.com')
+            for i in range(count)
+        ]
+    
+    def test_registration_queues_verification_email(self, api_client):
+        """Test registering queues the email instead of sending it inline"""
+        response = api_client.post('/api/auth/register', {
+            'email': 'queued@example.com',
+            'password': 'ValidPass123',
+            'check_password': 'ValidPass123',
+            'first_name': 'Queued',
+            'last_name': 'User',
+        })
+        
+        assert response.status_code == 201
+        email = OutgoingEmail.objects.get(to_email='queued@example.com')
+        assert email.status == 'PENDING'
+        assert 'verify-email?token=' in email.html
+    
+    def test_process_queue_sends_one_batch(self, django_assert_max_num_queries):
+        """Test due emails are sent together and marked sent"""
+        self._enqueue(3)
+        
+        with django_assert_max_num_queries(5):
+            claimed = emails.process_queue(emails.LocalTransport())
+        
+        assert claimed == 3
+        assert len(emails.outbox) == 3
+        assert set(OutgoingEmail.objects.values_list('status', flat=True)) == {'SENT'}
+        assert emails.process_queue(emails.LocalTransport()) == 0
+    
+    def test_failed_batch_is_retried_with_backoff(self):
+        """Test provider errors schedule a later retry"""
+        email, = self._enqueue()
+        
+        emails.process_queue(FailingTransport())
+        
+        email.refresh_from_db()
+        assert email.status == 'PENDING'
+        assert email.attempts == 1
+        assert email.next_attempt_at > email.created_at
+        assert 'provider unavailable' in email.last_error
+        assert emails.process_queue(emails.LocalTransport()) == 0
+    
+    def test_bad_address_only_fails_its_own_email(self):
+        """Test a batch rejected for one address still delivers the others"""
+        good = self._enqueue(2)
+        bad = emails.enqueue_email('invalid-address', 'Subject', '<p>Hi</p>', 'noreply@example.com')
+        
+        emails.process_queue(RejectingTransport())
+        
+        assert [email.id for email in emails.outbox] == [good[0].id, good[1].id]
+        bad.refresh_from_db()
+        assert bad.status == 'PENDING'
+        assert 'invalid' in bad.last_error
+        assert OutgoingEmail.objects.filter(status='SENT').count() == 2
+    
+    def test_gives_up_after_max_attempts(self, settings):
+        """Test emails are marked failed once attempts run out"""
+        settings.EMAIL_QUEUE_MAX_ATTEMPTS = 1
+        email, = self._enqueue()
+        
+        emails.process_queue(FailingTransport())
+        
+        email.refresh_from_db()
+        assert email.status == 'FAILED'
+    
+    def test_expired_claim_is_picked_up_again(self):
+        """Test emails claimed by a crashed worker are resent"""
+        email, = self._enqueue()
+        OutgoingEmail.objects.filter(id=email.id).update(status='SENDING', attempts=1)
+        
+        assert emails.process_queue(emails.LocalTransport()) == 1
+        
+        email.refresh_from_db()
+        assert email.status == 'SENT'
+        assert email.attempts == 2
+    
+    def test_worker_command_drains_queue(self):
+        """Test run_email_worker --once sends everything due"""
+        from django.core.management import call_command
+        self._enqueue(2)
+        
+        call_command('run_email_worker', '--once')
+        
+        assert len(emails.outbox) == 2
+        assert emails.queue_depth() == 0
+
+
+class TestContentScanner:
+    """Tests for the automatic moderation pre-screen"""
+    
+    def test_matches_terms_on_word_boundaries(self):
+        """Test terms match whole words, case-insensitively, not inside other words"""
+        matcher = content_scanner.TermMatcher({'ass': 'INAPPROPRIATE', 'buy followers': 'SPAM'})
+        
+        assert matcher.search('First class service') is None
+        assert matcher.search('Want to BUY   followers?') == content_scanner.Match('buy followers', 'SPAM')
+        assert matcher.search('what an ass!').term == 'ass'
+    
+    def test_overlapping_terms(self):
+        """Test terms that share suffixes are all found through failure links"""
+        matcher = content_scanner.TermMatcher({'he': 'OTHER', 'she': 'OTHER', 'hers': 'OTHER'})
+        
+        assert matcher.search('ushers') is None
+        assert matcher.search('u hers').term == 'hers'
+        assert matcher.search('ask she').term == 'she'
+    
+    def test_parses_reasons_and_patterns(self):
+        """Test reason prefixes, comments and regex lines"""
+        terms, patterns = content_scanner.parse_terms([
+            '# comment',
+            'SPAM: crypto giveaway',
+            'plain term',
+            're:FRAUD:\\bwestern\\s+union\\b',
+            're:(unclosed',
+        ])
+        
+        assert terms == {'crypto giveaway': 'SPAM', 'plain term': 'OTHER'}
+        assert patterns == [('\\bwestern\\s+union\\b', 'FRAUD')]
+        matcher = content_scanner.TermMatcher(terms, patterns)
+        assert matcher.search('Pay by Western  Union').reason == 'FRAUD'
+    
+    def test_term_file_is_reloaded(self, moderation_terms):
+        """Test updated term files are picked up without a restart"""
+        assert content_scanner.scan('free crypto giveaway') is None
+        
+        moderation_terms('SPAM: crypto giveaway')
+        
+        assert content_scanner.scan('hello', 'free crypto giveaway').reason == 'SPAM'
+    
+    def test_flagged_offer_is_hidden_and_reported(self, authenticated_client, moderation_terms):
+        """Test matching offers are flagged and queued for review"""
+        client, user = authenticated_client
+        moderation_terms('SPAM: buy followers')
+        
+        response = client.post('/api/create-offer', {
+            'type': 'offer',
+            'title': 'Buy followers cheap',
+            'description': 'Fast delivery',
+            'time_required': 1,
+        }, format='json')
+        
+        offer = user.offers.get(id=response.data['offer_id'])
+        assert offer.is_flagged is True
+        assert 'buy followers' in offer.flagged_reason
+        report = Report.objects.get(target_type='offer', target_id=offer.id)
+        assert report.reporter is None
+        assert report.reported_user == user
+        assert report.reason == 'SPAM'
+    
+    def test_clean_offer_is_not_flagged(self, authenticated_client, moderation_terms):
+        """Test content without matches is left alone"""
+        client, user = authenticated_client
+        moderation_terms('SPAM: buy followers')
+        
+        client.post('/api/create-offer', {
+            'type': 'offer',
+            'title': 'Guitar lessons',
+            'description': 'Beginner friendly',
+            'time_required': 1,
+        }, format='json')
+        
+        assert user.offers.get().is_flagged is False
+        assert not Report.objects.exists()
+    
+    def test_forum_comment_is_reported(self, authenticated_client, moderation_terms):
+        """Test matching forum comments create an automatic report"""
+        from tests.factories import ForumPostFactory
+        client, user = authenticated_client
+        moderation_terms('re:HARASSMENT:\\bkill\\s+your\\s*self\\b')
+        post = ForumPostFactory()
+        
+        response = client.post(f'/api/forum/posts/{post.id}/comments', {'content': 'Go kill yourself'}, format='json')
+        
+        report = Report.objects.get(target_type='forum_comment')
+        assert report.target_id == response.data['id']
+        assert report.reason == 'HARASSMENT'
+    
+    def test_automatic_reports_listed_for_admins(self, authenticated_admin_client, moderation_terms):
+        """Test the admin report list handles reports without a reporter"""
+        from tests.factories import ForumPostFactory
+        admin_client, admin_user = authenticated_admin_client
+        post = ForumPostFactory(title='Spam')
+        content_scanner.report_match(content_scanner.Match('spam', 'SPAM'), post.user, 'forum_post', post.id)
+        
+        response = admin_client.get('/api/admin/reports')
+        
+        assert response.data[0]['reporter'] is None
+        assert response.data[0]['target_info']['title'] == 'Spam'
+
+
+class TestForumTrending:
+    """Tests for the precomputed forum hot scores"""
+    
+    def age(self, obj, hours):
+        """Move a post or comment's creation time into the past"""
+        type(obj).objects.filter(id=obj.id).update(created_at=timezone.now() - timedelta(hours=hours))
+    
+    def test_recent_comments_outweigh_old_ones(self, settings):
+        """Test comment weight halves every half-life"""
+        from tests.factories import ForumPostFactory, ForumCommentFactory
+        settings.FORUM_TRENDING_HALF_LIFE_HOURS = 12
+        busy, stale = ForumPostFactory(), ForumPostFactory()
+        for post in (busy, stale):
+            self.age(post, 100)
+        ForumCommentFactory.create_batch(3, post=busy)
+        for comment in ForumCommentFactory.create_batch(3, post=stale):
+            self.age(comment, 24)
+        
+        scores = forum.compute_hot_scores()
+        
+        assert scores[busy.id] == pytest.approx(3, abs=0.2)
+        assert scores[stale.id] == pytest.approx(0.75, abs=0.1)
+    
+    def test_update_resets_posts_outside_the_window(self, settings):
+        """Test scores are stored and posts without recent activity drop to zero"""
+        from tests.factories import ForumPostFactory, ForumCommentFactory
+        settings.FORUM_TRENDING_WINDOW_HOURS = 48
+        active, quiet = ForumPostFactory(), ForumPostFactory()
+        self.age(quiet, 72)
+        ForumPost.objects.filter(id=quiet.id).update(hot_score=5)
+        ForumCommentFactory(post=active)
+        
+        assert forum.update_hot_scores() == 1
+        
+        active.refresh_from_db()
+        quiet.refresh_from_db()
+        assert active.hot_score > 1
+        assert quiet.hot_score == 0
+    
+    def test_update_command(self):
+        """Test the management command scores posts once"""
+        from django.core.management import call_command
+        from tests.factories import ForumPostFactory
+        post = ForumPostFactory()
+        
+        call_command('update_forum_trending')
+        
+        post.refresh_from_db()
+        assert post.hot_score > 0
+
+
+class TestExchangeStates:
+    """Tests for the conditional-update exchange transitions"""
+    
+    def stale(self, monkeypatch, exchange):
+        """Make the next transition start from an out-of-date copy of the exchange"""
+        monkeypatch.setattr(exchange_states, 'load', lambda exchange_id: exchange)
+    
+    def test_cancel_from_stale_status_moves_current_slot(self, monkeypatch):
+        """Test a cancel that read PENDING before the accept releases the accepted slot"""
+        from tests.factories import GroupOfferFactory, ExchangeFactory
+        offer = GroupOfferFactory(person_count=2)
+        exchange = ExchangeFactory(offer=offer)
+        stale = Exchange.objects.get(id=exchange.id)
+        exchange_states.accept(exchange.id, offer.user)
+        self.stale(monkeypatch, stale)
+        
+        exchange, cancelled = exchange_states.cancel(exchange.id, exchange.requester)
+        
+        assert cancelled is True
+        assert exchange.status == 'CANCELLED'
+        offer.refresh_from_db()
+        assert (offer.pending_count, offer.accepted_count) == (0, 0)
+    
+    def test_accept_from_stale_status_is_refused(self, monkeypatch):
+        """Test an accept that read PENDING after a cancel leaves the exchange cancelled"""
+        from tests.factories import OfferFactory, ExchangeFactory
+        exchange = ExchangeFactory(offer=OfferFactory())
+        stale = Exchange.objects.get(id=exchange.id)
+        exchange_states.cancel(exchange.id, exchange.requester)
+        self.stale(monkeypatch, stale)
+        
+        with pytest.raises(exchange_states.TransitionError):
+            exchange_states.accept(exchange.id, exchange.provider)
+        
+        exchange.refresh_from_db()
+        exchange.offer.refresh_from_db()
+        assert exchange.status == 'CANCELLED'
+        assert (exchange.offer.pending_count, exchange.offer.accepted_count) == (0, 0)
+    
+    def test_completion_transfers_once(self, monkeypatch):
+        """Test a confirmation that read the exchange before completion doesn't pay again"""
+        from tests.factories import OfferFactory, AcceptedExchangeFactory
+        provider, provider_tb = create_user_with_timebank(initial_credits=0)
+        requester, requester_tb = create_user_with_timebank(initial_credits=5)
+        requester_tb.block_credit(2)
+        exchange = AcceptedExchangeFactory(offer=OfferFactory(user=provider, time_required=2), requester=requester)
+        stale = Exchange.objects.get(id=exchange.id)
+        exchange_states.confirm(exchange.id, requester)
+        exchange, completed = exchange_states.confirm(exchange.id, provider)
+        assert completed is True
+        self.stale(monkeypatch, stale)
+        
+        with pytest.raises(exchange_states.TransitionError):
+            exchange_states.confirm(exchange.id, requester)
+        
+        assert TimeBankTransaction.objects.filter(exchange=exchange).count() == 1
+        provider_tb.refresh_from_db()
+        requester_tb.refresh_from_db()
+        assert (provider_tb.amount, requester_tb.amount, requester_tb.blocked_amount) == (2, 3, 0)
+        exchange.offer.refresh_from_db()
+        assert (exchange.offer.status, exchange.offer.completed_count) == ('COMPLETED', 1)
+
+
+class TestIdempotency:
+    """Tests for Idempotency-Key replay"""
+    
+    @pytest.fixture
+    def view(self):
+        class CountingView:
+            calls = 0
+            
+            @idempotency.idempotent
+            def post(self, request):
+                CountingView.calls += 1
+                return Response({'call': CountingView.calls}, status=201)
+        return CountingView()
+    
+    def request(self, user, key=None, data=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        request = RequestFactory().post('/api/things', data or {}, content_type='application/json', **headers)
+        request.user = user
+        return request
+    
+    def hold_lock(self, request, key):
+        """Make it look like another copy of `request` is running"""
+        lock = {'token': 'other', 'fingerprint': idempotency.fingerprint(request)}
+        cache.set(f'{idempotency.cache_key(request, key)}:lock', lock, timeout=60)
+    
+    def test_keys_are_scoped_per_user(self, view):
+        """Test the same key from another user runs the view again"""
+        first, second = UserFactory(), UserFactory()
+        
+        assert view.post(self.request(first, 'k')).data == {'call': 1}
+        assert view.post(self.request(first, 'k')).data == {'call': 1}
+        assert view.post(self.request(second, 'k')).data == {'call': 2}
+        assert view.post(self.request(first)).data == {'call': 3}
+    
+    def test_reused_key_with_different_body_is_rejected(self, view):
+        """Test a key replays only for the same request body"""
+        user = UserFactory()
+        
+        assert view.post(self.request(user, 'k', {'hours': 1})).status_code == 201
+        response = view.post(self.request(user, 'k', {'hours': 5}))
+        
+        assert response.status_code == 422
+        assert view.calls == 1
+    
+    def test_reused_key_rejected_while_first_request_runs(self, view, settings):
+        """Test a different body doesn't wait on or replay the running request"""
+        settings.IDEMPOTENCY_LOCK_TIMEOUT = 60
+        user = UserFactory()
+        self.hold_lock(self.request(user, 'busy', {'hours': 1}), 'busy')
+        
+        response = view.post(self.request(user, 'busy', {'hours': 5}))
+        
+        assert response.status_code == 422
+        assert view.calls == 0
+    
+    def test_concurrent_duplicate_waits_for_lock(self, view, settings):
+        """Test a duplicate gets 409 while the first request still holds the key"""
+        settings.IDEMPOTENCY_LOCK_TIMEOUT = 0.1
+        user = UserFactory()
+        request = self.request(user, 'busy')
+        self.hold_lock(request, 'busy')
+        
+        response = view.post(request)
+        
+        assert response.status_code == 409
+        assert view.calls == 0
+    
+    def test_duplicate_replays_response_stored_while_waiting(self, view, settings, monkeypatch):
+        """Test a waiting duplicate returns the first request's response"""
+        user = UserFactory()
+        request = self.request(user, 'slow')
+        response_key = idempotency.cache_key(request, 'slow')
+        self.hold_lock(request, 'slow')
+        
+        def first_request_finishes(seconds):
+            cache.set(response_key, {
+                'fingerprint': idempotency.fingerprint(request),
+                'status': 201,
+                'data': {'call': 'first'},
+            })
+            cache.delete(f'{response_key}:lock')
+        monkeypatch.setattr(idempotency.time, 'sleep', first_request_finishes)
+        
+        response = view.post(request)
+        
+        assert response.data == {'call': 'first'}
+        assert response['Idempotent-Replayed'] == 'true'
+        assert view.calls == 0
+
+
+class TestExchangeScheduler:
+    """Tests for exchange expiry and reminders"""
+    
+    def age(self, exchange, hours):
+        Exchange.objects.filter(id=exchange.id).update(created_at=timezone.now() - timedelta(hours=hours))
+    
+    def test_expire_pending_returns_requester_credits(self, settings):
+        """Test stale requests are cancelled and offer requesters refunded in bulk"""
+        from tests.factories import OfferFactory, WantFactory, ExchangeFactory
+        settings.EXCHANGE_PENDING_TTL_HOURS = 48
+        requester = TimeBankFactory(blocked_amount=2, available_amount=3).user
+        owner = TimeBankFactory(blocked_amount=1, available_amount=4).user
+        stale = ExchangeFactory(offer=OfferFactory(time_required=2), requester=requester)
+        stale_want = ExchangeFactory(offer=WantFactory(user=owner, time_required=1))
+        fresh = ExchangeFactory(offer=OfferFactory())
+        for exchange in (stale, stale_want):
+            self.age(exchange, 49)
+        self.age(fresh, 47)
+        
+        assert scheduler.expire_pending() == 2
+        
+        assert set(Exchange.objects.filter(status='CANCELLED').values_list('id', flat=True)) == {stale.id, stale_want.id}
+        requester.timebank.refresh_from_db()
+        owner.timebank.refresh_from_db()
+        assert (requester.timebank.blocked_amount, requester.timebank.available_amount) == (0, 5)
+        # The want is still listed, so its owner's credits stay blocked
+        assert owner.timebank.blocked_amount == 1
+        stale.offer.refresh_from_db()
+        assert stale.offer.pending_count == 0
+        assert Notification.objects.filter(user=requester, content__contains='expired').exists()
+    
+    def test_reminders_are_sent_once(self, settings):
+        """Test both participants are reminded once before the proposed time"""
+        from tests.factories import AcceptedExchangeFactory
+        settings.EXCHANGE_REMINDER_LEAD_HOURS = 24
+        soon = AcceptedExchangeFactory(proposed_at=timezone.now() + timedelta(hours=3))
+        AcceptedExchangeFactory(proposed_at=timezone.now() + timedelta(hours=30))
+        
+        assert scheduler.send_reminders() == 1
+        assert scheduler.send_reminders() == 0
+        
+        reminded = Notification.objects.filter(content__startswith='Reminder').values_list('user_id', flat=True)
+        assert sorted(reminded) == sorted([soon.provider_id, soon.requester_id])
+    
+    def test_completion_reminder_skips_confirmed_participant(self, settings):
+        """Test only participants who haven't confirmed are asked to"""
+        from tests.factories import AcceptedExchangeFactory
+        settings.EXCHANGE_COMPLETION_REMINDER_DELAY_HOURS = 2
+        exchange = AcceptedExchangeFactory(proposed_at=timezone.now() - timedelta(hours=3), provider_confirmed=True)
+        
+        assert scheduler.send_completion_reminders() == 1
+        
+        nudged = Notification.objects.filter(content__contains='confirm its completion').values_list('user_id', flat=True)
+        assert list(nudged) == [exchange.requester_id]
+    
+    def test_expire_offers_releases_want_credits(self):
+        """Test ended offers are deactivated, their requests cancelled and want credits released"""
+        from tests.factories import OfferFactory, WantFactory, ExchangeFactory, AcceptedExchangeFactory
+        ended = timezone.now() - timedelta(hours=1)
+        owner = TimeBankFactory(blocked_amount=3, available_amount=2).user
+        want = WantFactory(user=owner, time_required=3, to_date=ended)
+        requester = TimeBankFactory(blocked_amount=1, available_amount=4).user
+        offer = OfferFactory(time_required=1, to_date=ended)
+        pending = ExchangeFactory(offer=offer, requester=requester)
+        in_progress = AcceptedExchangeFactory(offer=OfferFactory(to_date=ended))
+        current = OfferFactory(to_date=timezone.now() + timedelta(days=1))
+        
+        assert scheduler.expire_offers() == 2
+        
+        statuses = dict(Offer.objects.values_list('id', 'status'))
+        assert (statuses[want.id], statuses[offer.id]) == ('INACTIVE', 'INACTIVE')
+        # Accepted exchanges finish first; the listing waits
+        assert (statuses[in_progress.offer_id], statuses[current.id]) == ('ACTIVE', 'ACTIVE')
+        pending.refresh_from_db()
+        assert pending.status == 'CANCELLED'
+        owner.timebank.refresh_from_db()
+        requester.timebank.refresh_from_db()
+        assert (owner.timebank.blocked_amount, owner.timebank.available_amount) == (0, 5)
+        assert requester.timebank.blocked_amount == 0
+        assert scheduler.expire_offers() == 0
+    
+    def test_expire_offers_skips_wants_in_progress(self):
+        """Test a want whose exchange was accepted keeps its blocked credits"""
+        from tests.factories import WantFactory, WantExchangeFactory
+        owner = TimeBankFactory(blocked_amount=2, available_amount=3).user
+        want = WantFactory(user=owner, time_required=2, to_date=timezone.now() - timedelta(hours=1))
+        WantExchangeFactory(offer=want, status='ACCEPTED')
+        
+        assert scheduler.expire_offers() == 0
+        
+        owner.timebank.refresh_from_db()
+        assert owner.timebank.blocked_amount == 2
+        want.refresh_from_db()
+        assert want.status == 'ACTIVE'
+    
+    def test_timer_heap_wakes_when_request_expires(self, settings):
+        """Test the heap holds the next expiry and a tick at that time runs it"""
+        from tests.factories import ExchangeFactory
+        settings.EXCHANGE_PENDING_TTL_HOURS = 1
+        exchange = ExchangeFactory()
+        Exchange.objects.filter(id=exchange.id).update(created_at=timezone.now() - timedelta(minutes=55))
+        exchange.refresh_from_db()
+        timers = scheduler.ExchangeScheduler(refresh_interval=600)
+        now = timezone.now()
+        
+        timers.rebuild(now)
+        
+        due_at = exchange.created_at + timedelta(hours=1)
+        assert timers.timers == [(due_at, 'expire')]
+        assert timers.next_wakeup() == due_at
+        timers.tick(due_at)
+        exchange.refresh_from_db()
+        assert exchange.status == 'CANCELLED'
+        assert timers.timers == []
+    
+    def test_command_runs_every_job_once(self, capsys):
+        """Test the one-shot command reports what it handled"""
+        from django.core.management import call_command
+        from tests.factories import AcceptedExchangeFactory
+        AcceptedExchangeFactory(proposed_at=timezone.now() + timedelta(hours=1))
+        
+        call_command('run_exchange_scheduler')
+        
+        assert 'Sent 1 reminder(s)' in capsys.readouterr().out
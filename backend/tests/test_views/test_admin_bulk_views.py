@@ -0,0 +1,225 @@
+"""
+Tests for Admin Bulk Moderation Views
+
+This module tests the set-based admin actions:
+- Bulk ban (exchange cancellation, grouped refunds, cache invalidation)
+- Bulk warn
+- Bulk content removal (want credit refunds)
+- Bulk report resolution
+"""
+
+import pytest
+from rest_framework import status
+
+from rest_api import moderation
+from rest_api.models import User, Offer, Exchange, Report, Notification
+from tests.factories import UserFactory, TimeBankFactory, OfferFactory, ExchangeFactory, WantFactory, ReportFactory
+
+
+def create_active_exchange(offer, requester, blocked=None):
+    """Exchange whose payer has the offer's hours blocked"""
+    payer = offer.user if offer.type == 'want' else requester
+    hours = offer.time_required if blocked is None else blocked
+    timebank = payer.timebank
+    timebank.blocked_amount += hours
+    timebank.available_amount -= hours
+    timebank.save()
+    return ExchangeFactory(offer=offer, requester=requester, status='ACCEPTED')
+
+
+@pytest.mark.django_db
+class TestBulkBanUsers:
+    """Tests for AdminBulkBanUsersView"""
+
+    def test_bulk_ban_cancels_exchanges_and_refunds_payers(self, authenticated_admin_client):
+        """Banned users' exchanges are cancelled and blocked credits returned"""
+        admin_client, admin_user = authenticated_admin_client
+        spammers = [TimeBankFactory().user for _ in range(3)]
+        victim = TimeBankFactory().user
+        exchanges = [
+            create_active_exchange(OfferFactory(user=victim, time_required=2), requester=spammer)
+            for spammer in spammers
+        ]
+        # Two exchanges for the same payer are refunded together
+        create_active_exchange(OfferFactory(user=victim, time_required=1), requester=spammers[0])
+
+        response = admin_client.post('/api/admin/bulk/users/ban', {
+            'user_ids': [spammer.id for spammer in spammers],
+            'reason': 'Spam wave',
+        }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['banned_users'] == 3
+        assert response.data['cancelled_exchanges'] == 4
+        assert User.objects.filter(id__in=[s.id for s in spammers], is_banned=True).count() == 3
+        assert not Exchange.objects.filter(id__in=[e.id for e in exchanges]).exclude(status='CANCELLED').exists()
+        for spammer in spammers:
+            spammer.timebank.refresh_from_db()
+            assert spammer.timebank.blocked_amount == 0
+            assert spammer.timebank.available_amount == 5
+        assert Notification.objects.filter(user=victim).count() == 4
+
+    def test_bulk_ban_query_count_is_constant(self, authenticated_admin_client, django_assert_max_num_queries):
+        """The number of queries doesn't grow with the number of users"""
+        admin_client, admin_user = authenticated_admin_client
+        victim = TimeBankFactory().user
+        spammers = [TimeBankFactory().user for _ in range(10)]
+        for spammer in spammers:
+            create_active_exchange(OfferFactory(user=victim), requester=spammer)
+
+        with django_assert_max_num_queries(16):
+            response = admin_client.post('/api/admin/bulk/users/ban', {
+                'user_ids': [spammer.id for spammer in spammers],
+            }, format='json')
+
+        assert response.data['cancelled_exchanges'] == 10
+
+    def test_bulk_ban_invalidates_cached_principals(self, authenticated_admin_client, monkeypatch):
+        """Bans made with UPDATE still drop cached principals"""
+        admin_client, admin_user = authenticated_admin_client
+        invalidated = []
+        monkeypatch.setattr(moderation, 'invalidate_user', invalidated.append)
+        spammer = TimeBankFactory().user
+        create_active_exchange(OfferFactory(user=TimeBankFactory().user), requester=spammer)
+
+        admin_client.post('/api/admin/bulk/users/ban', {'user_ids': [spammer.id]}, format='json')
+
+        assert spammer.id in invalidated
+
+    def test_bulk_ban_skips_the_admin(self, authenticated_admin_client):
+        """Admins cannot ban themselves in a bulk request"""
+        admin_client, admin_user = authenticated_admin_client
+
+        admin_client.post('/api/admin/bulk/users/ban', {'user_ids': [admin_user.id]}, format='json')
+
+        admin_user.refresh_from_db()
+        assert admin_user.is_banned is False
+
+    def test_bulk_ban_requires_admin(self, authenticated_client):
+        """Only admin can use bulk actions"""
+        client, user = authenticated_client
+
+        response = client.post('/api/admin/bulk/users/ban', {'user_ids': [user.id]}, format='json')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_bulk_ban_validates_ids(self, authenticated_admin_client):
+        """Ids must be a non-empty list of integers"""
+        admin_client, admin_user = authenticated_admin_client
+
+        assert admin_client.post('/api/admin/bulk/users/ban', {'user_ids': []}, format='json').status_code == 400
+        assert admin_client.post('/api/admin/bulk/users/ban', {'user_ids': ['x']}, format='json').status_code == 400
+
+
+@pytest.mark.django_db
+class TestBulkWarnUsers:
+    """Tests for AdminBulkWarnUsersView"""
+
+    def test_bulk_warn_increments_warning_counts(self, authenticated_admin_client):
+        """Every user gets a warning and a notification"""
+        admin_client, admin_user = authenticated_admin_client
+        users = [UserFactory(warning_count=1), UserFactory()]
+
+        response = admin_client.post('/api/admin/bulk/users/warn', {
+            'user_ids': [user.id for user in users],
+            'message': 'Stop posting spam',
+        }, format='json')
+
+        assert response.data['warned_users'] == 2
+        assert sorted(User.objects.filter(id__in=[u.id for u in users]).values_list('warning_count', flat=True)) == [1, 2]
+        assert Notification.objects.filter(content__contains='Stop posting spam').count() == 2
+
+    def test_bulk_warn_requires_message(self, authenticated_admin_client):
+        """A warning message is required"""
+        admin_client, admin_user = authenticated_admin_client
+
+        response = admin_client.post('/api/admin/bulk/users/warn', {'user_ids': [UserFactory().id]}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestBulkRemoveOffers:
+    """Tests for AdminBulkRemoveOffersView"""
+
+    def test_bulk_remove_flags_offers_and_refunds_want_owners(self, authenticated_admin_client):
+        """Removed wants return their blocked hours to the owner"""
+        admin_client, admin_user = authenticated_admin_client
+        owner = TimeBankFactory(blocked_amount=3, available_amount=2).user
+        want = WantFactory(user=owner, time_required=3)
+        offer = OfferFactory(user=TimeBankFactory().user, time_required=2)
+        requester = TimeBankFactory().user
+        exchange = create_active_exchange(offer, requester=requester)
+
+        response = admin_client.post('/api/admin/bulk/offers/remove', {
+            'offer_ids': [want.id, offer.id],
+            'reason': 'Spam',
+        }, format='json')
+
+        assert response.data['removed_offers'] == 2
+        assert set(Offer.objects.filter(id__in=[want.id, offer.id]).values_list('status', 'is_flagged')) == {('INACTIVE', True)}
+        exchange.refresh_from_db()
+        assert exchange.status == 'CANCELLED'
+        owner.timebank.refresh_from_db()
+        assert (owner.timebank.blocked_amount, owner.timebank.available_amount) == (0, 5)
+        requester.timebank.refresh_from_db()
+        assert requester.timebank.blocked_amount == 0
+
+    def test_bulk_remove_refunds_each_active_want_once(self, authenticated_admin_client):
+        """A want with an exchange is refunded once, and finished wants not at all"""
+        admin_client, admin_user = authenticated_admin_client
+        # 3 hours for the want in progress, 2 for another listing of the owner
+        owner = TimeBankFactory(blocked_amount=5, available_amount=0).user
+        want = WantFactory(user=owner, time_required=3)
+        ExchangeFactory(offer=want, provider=owner, requester=TimeBankFactory().user, status='ACCEPTED')
+        completed_want = WantFactory(user=owner, time_required=2, status='COMPLETED')
+
+        admin_client.post('/api/admin/bulk/offers/remove', {
+            'offer_ids': [want.id, completed_want.id],
+        }, format='json')
+
+        owner.timebank.refresh_from_db()
+        assert (owner.timebank.blocked_amount, owner.timebank.available_amount) == (2, 3)
+
+    def test_bulk_remove_is_idempotent(self, authenticated_admin_client):
+        """Removing an already removed offer doesn't refund twice"""
+        admin_client, admin_user = authenticated_admin_client
+        owner = TimeBankFactory(blocked_amount=4, available_amount=1).user
+        want = WantFactory(user=owner, time_required=2)
+
+        for _ in range(2):
+            admin_client.post('/api/admin/bulk/offers/remove', {'offer_ids': [want.id]}, format='json')
+
+        owner.timebank.refresh_from_db()
+        assert owner.timebank.blocked_amount == 2
+
+
+@pytest.mark.django_db
+class TestBulkResolveReports:
+    """Tests for AdminBulkResolveReportsView"""
+
+    def test_bulk_resolve_updates_open_reports(self, authenticated_admin_client):
+        """Open reports are closed and reporters notified"""
+        admin_client, admin_user = authenticated_admin_client
+        reports = [ReportFactory() for _ in range(3)]
+        closed = ReportFactory(status='DISMISSED')
+
+        response = admin_client.post('/api/admin/bulk/reports/resolve', {
+            'report_ids': [report.id for report in reports] + [closed.id],
+            'status': 'DISMISSED',
+        }, format='json')
+
+        assert response.data['updated_reports'] == 3
+        assert set(Report.objects.filter(id__in=[r.id for r in reports]).values_list('status', 'resolved_by')) == {('DISMISSED', admin_user.id)}
+        assert Notification.objects.filter(content__contains='dismissed').count() == 3
+
+    def test_bulk_resolve_rejects_unknown_status(self, authenticated_admin_client):
+        """Only RESOLVED and DISMISSED are allowed"""
+        admin_client, admin_user = authenticated_admin_client
+
+        response = admin_client.post('/api/admin/bulk/reports/resolve', {
+            'report_ids': [ReportFactory().id],
+            'status': 'PENDING',
+        }, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
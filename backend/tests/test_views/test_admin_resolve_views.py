@@ -281,6 +281,13 @@ class TestBanUserAction:
         exchange2.refresh_from_db()
         assert exchange1.status == 'CANCELLED'
         assert exchange2.status == 'CANCELLED'
+        
+        # The offers' slots are freed
+        offer1.refresh_from_db()
+        offer2.refresh_from_db()
+        assert (offer1.pending_count, offer1.accepted_count) == (0, 0)
+        assert (offer2.pending_count, offer2.accepted_count) == (0, 0)
+        assert offer2.has_exchanges is False
 
     @patch('rest_api.views.send_notification')
     def test_ban_user_unblocks_credits_correctly(self, mock_notify, api_client, admin_user, regular_user, reporter_user):
@@ -786,6 +793,30 @@ class TestAdminBanUserViewWithReport:
         report.refresh_from_db()
         assert report.status == 'RESOLVED'
 
+    @patch('rest_api.views.send_notification')
+    def test_ban_user_frees_offer_slots(self, mock_notify, api_client, admin_user, regular_user):
+        """Exchanges cancelled by a ban no longer count against their offers"""
+        api_client.force_authenticate(user=admin_user)
+        
+        provider = UserFactory()
+        pending_offer = OfferFactory(user=provider, type='offer')
+        accepted_offer = OfferFactory(user=provider, type='offer')
+        Exchange.objects.create(
+            offer=pending_offer, provider=provider, requester=regular_user, status='PENDING'
+        )
+        Exchange.objects.create(
+            offer=accepted_offer, provider=provider, requester=regular_user, status='ACCEPTED'
+        )
+        
+        response = api_client.post(f'/api/admin/users/{regular_user.id}/ban', {'reason': 'Fraud'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        pending_offer.refresh_from_db()
+        accepted_offer.refresh_from_db()
+        assert (pending_offer.pending_count, pending_offer.accepted_count) == (0, 0)
+        assert (accepted_offer.pending_count, accepted_offer.accepted_count) == (0, 0)
+        assert accepted_offer.has_exchanges is False
+
 
 @pytest.mark.django_db
 class TestAdminWarnUserViewWithReport:
@@ -3,14 +3,19 @@ Admin Views Tests
 Tests for FR-53 to FR-62h (Admin Panel operations)
 """
 
+import csv
+import io
 import pytest
+from datetime import timedelta
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
-from rest_api.models import Notification, Report
+from rest_api import kpi, views
+from rest_api.models import KPISnapshot, Notification, Report, User
 from tests.factories import (
     UserFactory, UserProfileFactory, TimeBankFactory, 
-    OfferFactory, ExchangeFactory, ReportFactory
+    OfferFactory, ExchangeFactory, ReportFactory, ChatFactory, MessageFactory
 )
 
 
@@ -80,6 +85,88 @@ class TestAdminKPIView:
         
         assert response.status_code == status.HTTP_200_OK
         assert 'recent_reports' in response.data
+        
+    def test_get_kpi_served_from_snapshot(self, authenticated_admin_client):
+        """Dashboard reuses a fresh snapshot instead of recounting"""
+        admin_client, admin_user = authenticated_admin_client
+        first = admin_client.get('/api/admin/kpi')
+        OfferFactory(type='offer', status='ACTIVE')
+        
+        cached = admin_client.get('/api/admin/kpi')
+        refreshed = admin_client.get('/api/admin/kpi?refresh=true')
+        
+        assert cached.data['active_offers'] == first.data['active_offers']
+        assert cached.data['snapshot_at'] == first.data['snapshot_at']
+        assert refreshed.data['active_offers'] == first.data['active_offers'] + 1
+        
+    def test_stale_snapshot_is_recomputed(self, authenticated_admin_client):
+        """Snapshots older than the interval are replaced on read"""
+        admin_client, admin_user = authenticated_admin_client
+        KPISnapshot.objects.create(created_at=timezone.now() - timedelta(hours=1), active_offers=99)
+        
+        response = admin_client.get('/api/admin/kpi')
+        
+        assert response.data['active_offers'] == 0
+        assert KPISnapshot.objects.count() == 2
+        
+    def test_compute_kpis_uses_few_queries(self, django_assert_max_num_queries):
+        """KPIs take one aggregate query per table"""
+        OfferFactory(type='offer', status='ACTIVE')
+        OfferFactory(type='want', status='ACTIVE')
+        ReportFactory(status='PENDING')
+        ReportFactory(status='RESOLVED')
+        
+        with django_assert_max_num_queries(5):
+            kpis = kpi.compute_kpis()
+        
+        assert kpis['active_offers'] == 1
+        assert kpis['active_wants'] == 1
+        assert kpis['pending_reports'] == 1
+        assert kpis['total_users'] == User.objects.filter(is_deleted=False).count()
+        assert kpis['completed_exchanges'] == 0
+
+
+@pytest.mark.django_db
+class TestAdminKPIHistoryView:
+    """Tests for AdminKPIHistoryView"""
+
+    def test_history_returns_last_snapshot_per_bucket(self, authenticated_admin_client):
+        """One point per hour, using the latest snapshot in that hour"""
+        admin_client, admin_user = authenticated_admin_client
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        KPISnapshot.objects.create(created_at=hour - timedelta(minutes=50), total_users=1)
+        KPISnapshot.objects.create(created_at=hour - timedelta(minutes=10), total_users=2)
+        KPISnapshot.objects.create(created_at=hour + timedelta(seconds=1), total_users=3)
+        
+        response = admin_client.get('/api/admin/kpi/history?granularity=hour&hours=3')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [point['total_users'] for point in response.data['points']] == [2, 3]
+        
+    def test_history_excludes_old_snapshots(self, authenticated_admin_client):
+        """Only snapshots in the requested range are returned"""
+        admin_client, admin_user = authenticated_admin_client
+        KPISnapshot.objects.create(created_at=timezone.now() - timedelta(days=3))
+        
+        response = admin_client.get('/api/admin/kpi/history?hours=24')
+        
+        assert response.data['points'] == []
+        
+    def test_history_rejects_unknown_granularity(self, authenticated_admin_client):
+        """Granularity must be minute, hour or day"""
+        admin_client, admin_user = authenticated_admin_client
+        
+        response = admin_client.get('/api/admin/kpi/history?granularity=week')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        
+    def test_history_requires_admin(self, authenticated_client):
+        """Only admin can view KPI history"""
+        client, user = authenticated_client
+        
+        response = client.get('/api/admin/kpi/history')
+        
+        assert response.status_code == status.HTTP_403_FORBIDDEN
 
 
 @pytest.mark.django_db
@@ -275,10 +362,10 @@ class TestAdminReportsListView:
     def test_list_reports_success(self, authenticated_admin_client):
         """FR-64: Admin can view reports list"""
         admin_client, admin_user = authenticated_admin_client
-        reporter = UserFactory()
         reported = UserFactory()
-        ReportFactory(reporter=reporter, reported_user=reported)
-        ReportFactory(reporter=reporter, reported_user=reported)
+        # Two reporters: a reporter can only have one pending report per target
+        ReportFactory(reporter=UserFactory(), reported_user=reported)
+        ReportFactory(reporter=UserFactory(), reported_user=reported)
         
         url = '/api/admin/reports'
         response = admin_client.get(url)
@@ -313,6 +400,76 @@ class TestAdminReportsListView:
         
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
+    def test_list_reports_resolves_targets(self, authenticated_admin_client):
+        """Each target type is rendered, missing targets are marked deleted"""
+        admin_client, admin_user = authenticated_admin_client
+        offer = OfferFactory(title='Guitar lessons')
+        exchange = ExchangeFactory(offer=offer)
+        ReportFactory(target_type='offer', target_id=offer.id)
+        ReportFactory(target_type='exchange', target_id=exchange.id)
+        ReportFactory(target_type='offer', target_id=999999)
+        
+        response = admin_client.get('/api/admin/reports')
+        
+        targets = {(r['target_type'], r['target_id']): r['target_info'] for r in response.data}
+        assert targets[('offer', offer.id)]['title'] == 'Guitar lessons'
+        assert targets[('exchange', exchange.id)]['offer_title'] == 'Guitar lessons'
+        assert targets[('offer', 999999)]['deleted'] is True
+        
+    def test_list_reports_query_count_is_constant(self, authenticated_admin_client, django_assert_max_num_queries):
+        """Targets are loaded with one query per target type, not per report"""
+        admin_client, admin_user = authenticated_admin_client
+        for _ in range(5):
+            ReportFactory(target_type='offer', target_id=OfferFactory().id)
+            ReportFactory(target_type='exchange', target_id=ExchangeFactory().id)
+            ReportFactory()
+        admin_client.get('/api/admin/reports')
+        
+        # count + reports + one in_bulk per target model
+        with django_assert_max_num_queries(5):
+            response = admin_client.get('/api/admin/reports')
+        
+        assert len(response.data) == 15
+        
+    def test_list_reports_filters_and_paginates(self, authenticated_admin_client):
+        """Reports can be filtered by status and reason and paged"""
+        admin_client, admin_user = authenticated_admin_client
+        for _ in range(3):
+            ReportFactory(status='PENDING', reason='SPAM')
+        ReportFactory(status='RESOLVED', reason='SPAM')
+        ReportFactory(status='PENDING', reason='FRAUD')
+        
+        response = admin_client.get('/api/admin/reports?status=PENDING&reason=SPAM&limit=2')
+        
+        assert response['X-Total-Count'] == '3'
+        assert len(response.data) == 2
+        assert all(r['status'] == 'PENDING' and r['reason'] == 'SPAM' for r in response.data)
+        
+        response = admin_client.get('/api/admin/reports?status=PENDING&reason=SPAM&limit=2&offset=2')
+        
+        assert len(response.data) == 1
+        
+    def test_list_reports_limit_is_at_least_one(self, authenticated_admin_client):
+        """Zero or negative limits return one report instead of failing"""
+        admin_client, admin_user = authenticated_admin_client
+        ReportFactory.create_batch(2)
+        
+        for limit in (-1, 0):
+            response = admin_client.get(f'/api/admin/reports?limit={limit}')
+            
+            assert response.status_code == status.HTTP_200_OK
+            assert response['X-Total-Count'] == '2'
+            assert len(response.data) == 1
+        
+    def test_list_reports_total_is_readable_cross_origin(self, authenticated_admin_client):
+        """The frontend origin may read X-Total-Count to page through reports"""
+        admin_client, admin_user = authenticated_admin_client
+        ReportFactory()
+        
+        response = admin_client.get('/api/admin/reports', HTTP_ORIGIN='http://localhost:5173')
+        
+        assert 'x-total-count' in response['Access-Control-Expose-Headers'].lower()
+
 
 @pytest.mark.django_db
 class TestAdminExchangeDetailView:
@@ -380,3 +537,126 @@ class TestAdminExchangeDetailView:
         
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
+
+@pytest.mark.django_db
+class TestAdminExchangeTranscript:
+    """Tests for paginated, searchable and exported chat transcripts"""
+
+    @pytest.fixture
+    def chat(self):
+        chat = ChatFactory()
+        for i in range(5):
+            MessageFactory(chat=chat, user=chat.exchange.provider, content=f'message {i}')
+        return chat
+
+    def test_detail_includes_first_page(self, authenticated_admin_client, chat, monkeypatch):
+        """Exchange detail returns only the first page of messages"""
+        admin_client, admin_user = authenticated_admin_client
+        monkeypatch.setattr(views, 'TRANSCRIPT_PAGE_SIZE', 2)
+
+        response = admin_client.get(f'/api/admin/exchanges/{chat.exchange.id}')
+
+        assert [m['content'] for m in response.data['messages']] == ['message 0', 'message 1']
+        assert response.data['messages_next_cursor'] == response.data['messages'][-1]['id']
+
+    def test_cursor_pages_through_transcript(self, authenticated_admin_client, chat):
+        """Following next_cursor returns every message once, in order"""
+        admin_client, admin_user = authenticated_admin_client
+        url = f'/api/admin/exchanges/{chat.exchange.id}/messages'
+
+        contents = []
+        cursor = None
+        while True:
+            response = admin_client.get(url, {'limit': 2, **({'cursor': cursor} if cursor else {})})
+            contents += [m['content'] for m in response.data['messages']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+
+        assert contents == [f'message {i}' for i in range(5)]
+
+    def test_transcript_limit_is_at_least_one(self, authenticated_admin_client, chat):
+        """Zero or negative limits return one message and a cursor to the next"""
+        admin_client, admin_user = authenticated_admin_client
+
+        for limit in (-1, 0):
+            response = admin_client.get(f'/api/admin/exchanges/{chat.exchange.id}/messages', {'limit': limit})
+
+            assert response.status_code == status.HTTP_200_OK
+            assert [m['content'] for m in response.data['messages']] == ['message 0']
+            assert response.data['next_cursor'] == response.data['messages'][0]['id']
+
+    def test_search_within_transcript(self, authenticated_admin_client, chat):
+        """q filters messages by content"""
+        admin_client, admin_user = authenticated_admin_client
+        MessageFactory(chat=chat, user=chat.exchange.requester, content='You are an IDIOT')
+
+        response = admin_client.get(f'/api/admin/exchanges/{chat.exchange.id}/messages', {'q': 'idiot'})
+
+        assert [m['content'] for m in response.data['messages']] == ['You are an IDIOT']
+        assert response.data['next_cursor'] is None
+
+    def test_export_streams_csv(self, authenticated_admin_client, chat):
+        """Export streams the whole transcript as CSV"""
+        admin_client, admin_user = authenticated_admin_client
+
+        response = admin_client.get(f'/api/admin/exchanges/{chat.exchange.id}/messages/export')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        lines = b''.join(response.streaming_content).decode().strip().splitlines()
+        assert lines[0] == 'id,created_at,user_id,user_email,content'
+        assert len(lines) == 6
+
+    def test_export_escapes_formulas(self, authenticated_admin_client, chat):
+        """Messages a spreadsheet would evaluate are exported as text"""
+        admin_client, admin_user = authenticated_admin_client
+        for content in ['=HYPERLINK("http://evil.example")', '+1', '-1', '@SUM(A1)', '\tcmd', 'safe = fine']:
+            MessageFactory(chat=chat, user=chat.exchange.provider, content=content)
+
+        response = admin_client.get(f'/api/admin/exchanges/{chat.exchange.id}/messages/export')
+
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        assert [row[4] for row in rows[6:]] == [
+            '\'=HYPERLINK("http://evil.example")', "'+1", "'-1", "'@SUM(A1)", "'\tcmd", 'safe = fine',
+        ]
+
+    def test_transcript_requires_admin(self, authenticated_client, chat):
+        """Only admin can read transcripts"""
+        client, user = authenticated_client
+
+        assert client.get(f'/api/admin/exchanges/{chat.exchange.id}/messages').status_code == status.HTTP_403_FORBIDDEN
+        assert client.get(f'/api/admin/exchanges/{chat.exchange.id}/messages/export').status_code == status.HTTP_403_FORBIDDEN
+
+    def test_unknown_exchange_not_found(self, authenticated_admin_client):
+        """Missing exchanges return 404"""
+        admin_client, admin_user = authenticated_admin_client
+
+        response = admin_client.get('/api/admin/exchanges/999999/messages')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+
+@pytest.mark.django_db
+class TestAdminMetricsView:
+    """Tests for AdminMetricsView"""
+
+    def test_get_metrics_success(self, authenticated_admin_client):
+        """Admin can view runtime metrics of the worker"""
+        admin_client, admin_user = authenticated_admin_client
+
+        response = admin_client.get('/api/admin/metrics')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'gauges' in response.data
+        assert 'counters' in response.data
+        assert 'timings' in response.data
+
+    def test_get_metrics_requires_admin(self, authenticated_client):
+        """Non-admin users cannot access metrics"""
+        client, user = authenticated_client
+
+        response = client.get('/api/admin/metrics')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
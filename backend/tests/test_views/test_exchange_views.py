@@ -10,13 +10,14 @@ from rest_api.views import (
     AcceptExchangeView, RejectExchangeView, CancelExchangeView,
     ConfirmCompletionView, SubmitRatingView, ProposeDateTimeView
 )
-from rest_api.models import Exchange, TimeBank, TimeBankTransaction
+from rest_api.models import Offer, Exchange, TimeBank, TimeBankTransaction
 from tests.factories import (
-    UserFactory, OfferFactory, ExchangeFactory, 
+    UserFactory, OfferFactory, GroupOfferFactory, ExchangeFactory, 
     AcceptedExchangeFactory, CompletedExchangeFactory,
     create_user_with_timebank
 )
 from rest_api.auth.views import password_hash
+from rest_api.auth.serializers import get_tokens_for_user
 
 
 class TestCreateExchangeView:
@@ -43,6 +44,23 @@ class TestCreateExchangeView:
         assert 'time_frozen' in response.data
         assert response.data['time_frozen'] == offer.time_required
     
+    def test_create_exchange_retry_with_idempotency_key(self, authenticated_client):
+        """Test a retried request replays the first response instead of failing"""
+        client, user = authenticated_client
+        offer = OfferFactory(time_required=1)
+        TimeBank.objects.create(user=user, amount=5, available_amount=5, blocked_amount=0, total_amount=5)
+        
+        first = client.post('/api/exchanges', {'offer_id': offer.id}, HTTP_IDEMPOTENCY_KEY='retry-1')
+        retry = client.post('/api/exchanges', {'offer_id': offer.id}, HTTP_IDEMPOTENCY_KEY='retry-1')
+        other = client.post('/api/exchanges', {'offer_id': offer.id}, HTTP_IDEMPOTENCY_KEY='retry-2')
+        
+        assert retry.status_code == status.HTTP_201_CREATED
+        assert retry.data['exchange_id'] == first.data['exchange_id']
+        assert other.status_code == status.HTTP_400_BAD_REQUEST
+        assert Exchange.objects.filter(offer=offer).count() == 1
+        user.timebank.refresh_from_db()
+        assert user.timebank.blocked_amount == 1
+    
     def test_create_exchange_requires_offer_id(self, authenticated_client):
         """Test that offer_id is required"""
         client, _ = authenticated_client
@@ -126,6 +144,78 @@ class TestCreateExchangeView:
         response2 = client.post('/api/exchanges', {'offer_id': offer.id})
         assert response2.status_code == status.HTTP_400_BAD_REQUEST
         assert 'already' in response2.data.get('error', '').lower()
+        
+        # The rejected duplicate doesn't keep credits or a slot
+        user.timebank.refresh_from_db()
+        assert user.timebank.blocked_amount == 1
+        offer.refresh_from_db()
+        assert offer.pending_count == 1
+    
+    def test_create_exchange_after_cancelled_request(self, authenticated_client):
+        """Test a cancelled request doesn't block a new one"""
+        client, user = authenticated_client
+        TimeBank.objects.create(user=user, amount=5, available_amount=5, blocked_amount=0, total_amount=5)
+        offer = OfferFactory(user=create_user_with_timebank()[0])
+        ExchangeFactory(offer=offer, requester=user, status='CANCELLED')
+        
+        response = client.post('/api/exchanges', {'offer_id': offer.id})
+        
+        assert response.status_code == status.HTTP_201_CREATED
+    
+    def test_create_exchange_full_group_offer_fails(self, authenticated_client):
+        """Test group offers stop taking requests when every slot is pending or accepted"""
+        client, user = authenticated_client
+        TimeBank.objects.create(user=user, amount=5, available_amount=5, blocked_amount=0, total_amount=5)
+        offer = GroupOfferFactory(person_count=2)
+        ExchangeFactory(offer=offer)
+        AcceptedExchangeFactory(offer=offer)
+        
+        response = client.post('/api/exchanges', {'offer_id': offer.id})
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'slots are filled' in response.data['error']
+    
+    def test_create_exchange_claims_slot_atomically(self, authenticated_client, monkeypatch):
+        """Test a slot taken after the offer was read still rejects the request"""
+        client, user = authenticated_client
+        TimeBank.objects.create(user=user, amount=5, available_amount=5, blocked_amount=0, total_amount=5)
+        offer = GroupOfferFactory(person_count=1)
+        original_claim = Offer.claim_slot
+        
+        def claim_after_competitor(self):
+            # Another request takes the last slot between the read and the claim
+            Offer.objects.filter(id=self.id).update(pending_count=1)
+            return original_claim(self)
+        
+        monkeypatch.setattr(Offer, 'claim_slot', claim_after_competitor)
+        response = client.post('/api/exchanges', {'offer_id': offer.id})
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not Exchange.objects.filter(offer=offer).exists()
+        offer.refresh_from_db()
+        assert offer.pending_count == 1
+    
+    def test_create_exchange_insufficient_credits_releases_slot(self, authenticated_client):
+        """Test a failed credit block gives the claimed slot back"""
+        client, user = authenticated_client
+        TimeBank.objects.create(user=user, amount=0, available_amount=0, blocked_amount=0, total_amount=0)
+        offer = GroupOfferFactory(person_count=2, time_required=3)
+        
+        client.post('/api/exchanges', {'offer_id': offer.id})
+        
+        offer.refresh_from_db()
+        assert offer.pending_count == 0
+    
+    def test_create_exchange_counts_pending_slot(self, authenticated_client):
+        """Test a new request is counted once"""
+        client, user = authenticated_client
+        TimeBank.objects.create(user=user, amount=5, available_amount=5, blocked_amount=0, total_amount=5)
+        offer = GroupOfferFactory(person_count=3)
+        
+        client.post('/api/exchanges', {'offer_id': offer.id})
+        
+        offer.refresh_from_db()
+        assert offer.pending_count == 1
 
 
 class TestAcceptExchangeView:
@@ -194,6 +284,48 @@ class TestAcceptExchangeView:
         response = api_client.post(f'/api/exchanges/{exchange.id}/accept')
         
         assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_accept_second_exchange_for_1to1_offer_fails(self, api_client):
+        """Test only one exchange of a 1-to-1 offer can be accepted"""
+        provider = UserFactory(password=password_hash('testpass123'))
+        api_client.cookies['access_token'] = get_tokens_for_user(provider)['access']
+        offer = OfferFactory(user=provider)
+        AcceptedExchangeFactory(offer=offer)
+        exchange = ExchangeFactory(offer=offer)
+        
+        response = api_client.post(f'/api/exchanges/{exchange.id}/accept')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        exchange.refresh_from_db()
+        assert exchange.status == 'PENDING'
+    
+    def test_accept_moves_slot_counters(self, api_client):
+        """Test accepting moves the exchange from pending to accepted once"""
+        provider = UserFactory(password=password_hash('testpass123'))
+        api_client.cookies['access_token'] = get_tokens_for_user(provider)['access']
+        offer = GroupOfferFactory(user=provider, person_count=2)
+        exchange = ExchangeFactory(offer=offer)
+        
+        response = api_client.post(f'/api/exchanges/{exchange.id}/accept')
+        
+        assert response.status_code == status.HTTP_200_OK
+        offer.refresh_from_db()
+        assert (offer.pending_count, offer.accepted_count) == (0, 1)
+    
+    def test_accept_twice_is_idempotent(self, api_client):
+        """Test a repeated accept succeeds without moving the counters again"""
+        provider = UserFactory(password=password_hash('testpass123'))
+        api_client.cookies['access_token'] = get_tokens_for_user(provider)['access']
+        offer = GroupOfferFactory(user=provider, person_count=3)
+        exchange = ExchangeFactory(offer=offer)
+        
+        api_client.post(f'/api/exchanges/{exchange.id}/accept')
+        response = api_client.post(f'/api/exchanges/{exchange.id}/accept')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['message'] == 'Exchange already accepted'
+        offer.refresh_from_db()
+        assert (offer.pending_count, offer.accepted_count) == (0, 1)
 
 
 class TestRejectExchangeView:
@@ -244,6 +376,22 @@ class TestRejectExchangeView:
         response = api_client.post(f'/api/exchanges/{exchange.id}/reject')
         
         assert response.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_reject_twice_unblocks_once(self, api_client):
+        """Test a repeated reject doesn't return the credits twice"""
+        provider, _ = create_user_with_timebank()
+        requester, requester_tb = create_user_with_timebank()
+        requester_tb.block_credit(2)
+        exchange = ExchangeFactory(offer=OfferFactory(user=provider, time_required=1), requester=requester)
+        api_client.cookies['access_token'] = get_tokens_for_user(provider)['access']
+        
+        api_client.post(f'/api/exchanges/{exchange.id}/reject')
+        response = api_client.post(f'/api/exchanges/{exchange.id}/reject')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == 'CANCELLED'
+        requester_tb.refresh_from_db()
+        assert requester_tb.blocked_amount == 1
 
 
 class TestCancelExchangeView:
@@ -314,6 +462,22 @@ class TestCancelExchangeView:
         
         assert response.status_code == status.HTTP_403_FORBIDDEN
     
+    def test_cancel_twice_unblocks_once(self, api_client):
+        """Test a repeated cancel doesn't return the credits twice"""
+        requester, requester_tb = create_user_with_timebank()
+        requester_tb.block_credit(2)
+        exchange = AcceptedExchangeFactory(offer=OfferFactory(time_required=1), requester=requester)
+        api_client.cookies['access_token'] = get_tokens_for_user(requester)['access']
+        
+        api_client.post(f'/api/exchanges/{exchange.id}/cancel')
+        response = api_client.post(f'/api/exchanges/{exchange.id}/cancel')
+        
+        assert response.status_code == status.HTTP_200_OK
+        requester_tb.refresh_from_db()
+        assert requester_tb.blocked_amount == 1
+        exchange.offer.refresh_from_db()
+        assert exchange.offer.accepted_count == 0
+    
     def test_cancel_with_provider_confirmed_fails(self, api_client):
         """Test cannot cancel when provider has confirmed"""
         provider, _ = create_user_with_timebank()
@@ -575,6 +739,34 @@ class TestProposeDateTimeView:
         )
         
         assert response.status_code == status.HTTP_200_OK
+    
+    def test_propose_datetime_does_not_overwrite_concurrent_accept(self, api_client):
+        """Test a proposal racing an accept leaves the accepted exchange alone"""
+        provider, _ = create_user_with_timebank()
+        requester, _ = create_user_with_timebank()
+        
+        offer = OfferFactory(user=provider)
+        exchange = ExchangeFactory(
+            offer=offer, provider=provider, requester=requester,
+            status='PENDING'
+        )
+        # The view read the exchange just before the provider accepted it
+        Exchange.objects.filter(id=exchange.id).update(status='ACCEPTED')
+        
+        from datetime import date, timedelta
+        tokens = get_tokens_for_user(requester)
+        api_client.cookies['access_token'] = tokens['access']
+        
+        with patch.object(Exchange.objects, 'get', return_value=exchange):
+            response = api_client.post(
+                f'/api/exchanges/{exchange.id}/propose-datetime',
+                {'date': (date.today() + timedelta(days=7)).isoformat(), 'time': '14:00'}
+            )
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        exchange.refresh_from_db()
+        assert exchange.status == 'ACCEPTED'
+        assert exchange.proposed_at is None
 
 
 class TestSubmitRatingView:
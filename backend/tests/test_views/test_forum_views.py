@@ -9,6 +9,8 @@ from tests.factories import (
     UserFactory, AdminUserFactory, ForumPostFactory, ForumCommentFactory,
     UserProfileFactory
 )
+from rest_api import views
+from rest_api.models import ForumPost
 from rest_api.auth.views import password_hash
 from rest_api.auth.serializers import get_tokens_for_user
 
@@ -62,6 +64,119 @@ class TestForumPostList:
         assert post['user']['first_name'] == 'John'
         assert post['user']['last_name'] == 'Doe'
         assert 'created_at' in post
+    
+    def test_list_posts_comment_counts(self, api_client):
+        """Comment counts come from the listing query"""
+        post = ForumPostFactory()
+        ForumCommentFactory.create_batch(3, post=post)
+        ForumPostFactory()
+        
+        response = api_client.get('/api/forum/posts')
+        
+        counts = {item['id']: item['comment_count'] for item in response.data}
+        assert counts[post.id] == 3
+        assert sorted(counts.values()) == [0, 3]
+    
+    def test_list_posts_query_count_is_constant(self, api_client, django_assert_max_num_queries):
+        """Listing doesn't query per post for authors, avatars or comment counts"""
+        for _ in range(10):
+            user = UserFactory()
+            UserProfileFactory(user=user)
+            post = ForumPostFactory(user=user)
+            ForumCommentFactory.create_batch(2, post=post)
+        
+        with django_assert_max_num_queries(1):
+            response = api_client.get('/api/forum/posts')
+        
+        assert len(response.data) == 10
+    
+    def test_list_posts_keyset_pagination(self, api_client):
+        """`before` returns the page after the given post without overlap"""
+        posts = [ForumPostFactory() for _ in range(5)]
+        
+        first_page = api_client.get('/api/forum/posts?limit=3').data
+        second_page = api_client.get(f"/api/forum/posts?limit=3&before={first_page[-1]['id']}").data
+        
+        assert len(first_page) == 3
+        assert len(second_page) == 2
+        ids = [item['id'] for item in first_page + second_page]
+        assert sorted(ids) == sorted(post.id for post in posts)
+    
+    def test_list_posts_pagination_within_category(self, api_client):
+        """Category filter and `before` combine"""
+        general = [ForumPostFactory(category='general') for _ in range(3)]
+        ForumPostFactory(category='help')
+        
+        first_page = api_client.get('/api/forum/posts?category=general&limit=2').data
+        second_page = api_client.get(f"/api/forum/posts?category=general&limit=2&before={first_page[-1]['id']}").data
+        
+        ids = [item['id'] for item in first_page + second_page]
+        assert sorted(ids) == sorted(post.id for post in general)
+    
+    def test_list_posts_before_deleted_post(self, api_client):
+        """A cursor pointing at a deleted post is rejected instead of returning an empty page"""
+        ForumPostFactory.create_batch(3)
+        first_page = api_client.get('/api/forum/posts?limit=2').data
+        ForumPost.objects.filter(id=first_page[-1]['id']).delete()
+        
+        response = api_client.get(f"/api/forum/posts?limit=2&before={first_page[-1]['id']}")
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['code'] == 'STALE_CURSOR'
+    
+    def test_list_posts_invalid_pagination(self, api_client):
+        """Non-numeric limit or before is rejected"""
+        response = api_client.get('/api/forum/posts?limit=abc')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_list_posts_limit_is_at_least_one(self, api_client):
+        """Zero or negative limits return one post instead of failing"""
+        ForumPostFactory.create_batch(2)
+        
+        for limit in (-1, 0):
+            response = api_client.get(f'/api/forum/posts?limit={limit}')
+            
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.data) == 1
+    
+    def test_list_posts_trending(self, api_client):
+        """sort=trending orders by hot score and pages on it"""
+        posts = [ForumPostFactory() for _ in range(4)]
+        for score, post in zip([2.0, 9.0, 0.0, 5.0], posts):
+            ForumPost.objects.filter(id=post.id).update(hot_score=score)
+        
+        first_page = api_client.get('/api/forum/posts?sort=trending&limit=2').data
+        second_page = api_client.get(f"/api/forum/posts?sort=trending&limit=2&before={first_page[-1]['id']}").data
+        
+        ids = [item['id'] for item in first_page + second_page]
+        assert ids == [posts[1].id, posts[3].id, posts[0].id, posts[2].id]
+    
+    def test_list_posts_invalid_sort(self, api_client):
+        """Unknown sort modes are rejected"""
+        response = api_client.get('/api/forum/posts?sort=popular')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_search_posts(self, api_client):
+        """q= matches titles, content and comment text (PostgreSQL full-text search)"""
+        by_title = ForumPostFactory(title='Gardening tools to share', content='Shovels and rakes')
+        by_comment = ForumPostFactory(title='Weekend plans', content='Anyone around?')
+        ForumCommentFactory(post=by_comment, content='I could help with gardening')
+        ForumPostFactory(title='Cooking class', content='Pasta night')
+        
+        response = api_client.get('/api/forum/posts?q=garden')
+        
+        assert sorted(item['id'] for item in response.data) == sorted([by_title.id, by_comment.id])
+    
+    def test_search_follows_comment_deletes(self, api_client):
+        """Deleted comments no longer match"""
+        post = ForumPostFactory(title='Weekend plans')
+        comment = ForumCommentFactory(post=post, content='Bicycle repair')
+        
+        comment.delete()
+        
+        assert api_client.get('/api/forum/posts?q=bicycle').data == []
 
 
 class TestForumPostCreate:
@@ -169,6 +284,100 @@ class TestForumPostDetail:
         response = api_client.get('/api/forum/posts/99999')
         
         assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_get_post_query_count_is_constant(self, api_client, django_assert_max_num_queries):
+        """Comment authors and avatars are joined, not fetched per comment"""
+        post = ForumPostFactory()
+        for _ in range(10):
+            user = UserFactory()
+            UserProfileFactory(user=user)
+            ForumCommentFactory(post=post, user=user)
+        
+        with django_assert_max_num_queries(2):
+            response = api_client.get(f'/api/forum/posts/{post.id}')
+        
+        assert response.data['comment_count'] == 10
+        assert len(response.data['comments']) == 10
+    
+    def test_get_post_header_is_cached(self, api_client, django_assert_max_num_queries):
+        """A second read only queries the comments"""
+        post = ForumPostFactory()
+        api_client.get(f'/api/forum/posts/{post.id}')
+        
+        with django_assert_max_num_queries(1):
+            response = api_client.get(f'/api/forum/posts/{post.id}')
+        
+        assert response.data['title'] == post.title
+    
+    def test_get_post_pages_comments(self, api_client, monkeypatch):
+        """Long threads return the first page and a cursor for the rest"""
+        monkeypatch.setattr(views, 'FORUM_COMMENT_PAGE_SIZE', 3)
+        post = ForumPostFactory()
+        comments = ForumCommentFactory.create_batch(5, post=post)
+        
+        response = api_client.get(f'/api/forum/posts/{post.id}')
+        
+        assert [c['id'] for c in response.data['comments']] == [c.id for c in comments[:3]]
+        assert response.data['comments_next_cursor'] == comments[2].id
+        assert response.data['comment_count'] == 5
+        
+        response = api_client.get(
+            f"/api/forum/posts/{post.id}/comments?cursor={response.data['comments_next_cursor']}"
+        )
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [c['id'] for c in response.data['comments']] == [c.id for c in comments[3:]]
+        assert response.data['next_cursor'] is None
+    
+    def test_list_comments_invalid_cursor(self, api_client):
+        """Non-numeric cursor is rejected"""
+        post = ForumPostFactory()
+        
+        response = api_client.get(f'/api/forum/posts/{post.id}/comments?cursor=abc')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_list_comments_limit_is_at_least_one(self, api_client):
+        """Zero or negative limits return one comment and a cursor to the next"""
+        post = ForumPostFactory()
+        comments = ForumCommentFactory.create_batch(2, post=post)
+        
+        for limit in (-1, 0):
+            response = api_client.get(f'/api/forum/posts/{post.id}/comments?limit={limit}')
+            
+            assert response.status_code == status.HTTP_200_OK
+            assert [c['id'] for c in response.data['comments']] == [comments[0].id]
+            assert response.data['next_cursor'] == comments[0].id
+    
+    def test_list_comments_nonexistent_post(self, api_client):
+        """Listing comments of a missing post returns 404"""
+        response = api_client.get('/api/forum/posts/99999/comments')
+        
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_comment_changes_invalidate_cached_header(self, api_client):
+        """Adding or deleting a comment updates the cached comment count"""
+        user = UserFactory(is_verified=True, password=password_hash('testpass123'))
+        api_client.cookies['access_token'] = get_tokens_for_user(user)['access']
+        post = ForumPostFactory()
+        assert api_client.get(f'/api/forum/posts/{post.id}').data['comment_count'] == 0
+        
+        created = api_client.post(f'/api/forum/posts/{post.id}/comments', {'content': 'First!'})
+        assert api_client.get(f'/api/forum/posts/{post.id}').data['comment_count'] == 1
+        
+        api_client.delete(f"/api/forum/comments/{created.data['id']}")
+        assert api_client.get(f'/api/forum/posts/{post.id}').data['comment_count'] == 0
+    
+    def test_deleted_post_is_not_served_from_cache(self, api_client):
+        """Deleting a post drops its cached header"""
+        user = UserFactory(password=password_hash('testpass123'))
+        api_client.cookies['access_token'] = get_tokens_for_user(user)['access']
+        post = ForumPostFactory(user=user)
+        api_client.get(f'/api/forum/posts/{post.id}')
+        
+        api_client.delete(f'/api/forum/posts/{post.id}')
+        
+        assert api_client.get(f'/api/forum/posts/{post.id}').status_code == status.HTTP_404_NOT_FOUND
 
 
 class TestForumPostDelete:
@@ -0,0 +1,124 @@
+"""
+Inbox Views Tests
+Tests for the conversation inbox (last message and unread counts)
+"""
+
+import pytest
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_api.models import ChatReadMarker
+from tests.factories import UserFactory, ExchangeFactory, ChatFactory, MessageFactory
+
+
+@pytest.mark.django_db
+class TestInboxView:
+    """Tests for InboxView"""
+
+    def test_inbox_lists_chats_with_last_message(self, authenticated_client):
+        """Inbox shows the counterparty, last message and unread count"""
+        client, user = authenticated_client
+        other = UserFactory()
+        chat = ChatFactory(exchange=ExchangeFactory(provider=user, requester=other))
+        MessageFactory(chat=chat, user=user, content='Hi')
+        MessageFactory(chat=chat, user=other, content='Hello')
+        MessageFactory(chat=chat, user=other, content='When are you free?')
+
+        response = client.get('/api/inbox')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 1
+        entry = response.data[0]
+        assert entry['counterparty']['id'] == other.id
+        assert entry['last_message']['content'] == 'When are you free?'
+        assert entry['unread_count'] == 2
+
+    def test_inbox_orders_by_latest_message(self, authenticated_client):
+        """Most recently active chat comes first"""
+        client, user = authenticated_client
+        older = ChatFactory(exchange=ExchangeFactory(provider=user))
+        newer = ChatFactory(exchange=ExchangeFactory(requester=user))
+        MessageFactory(chat=older, user=user)
+        MessageFactory(chat=newer, user=user)
+
+        response = client.get('/api/inbox')
+
+        assert [entry['chat_id'] for entry in response.data] == [newer.id, older.id]
+
+    def test_inbox_is_single_query(self, authenticated_client, django_assert_num_queries):
+        """Inbox cost doesn't grow with the number of chats"""
+        client, user = authenticated_client
+        for _ in range(3):
+            chat = ChatFactory(exchange=ExchangeFactory(provider=user))
+            MessageFactory(chat=chat, user=chat.exchange.requester)
+        client.get('/api/inbox')
+
+        with django_assert_num_queries(1):
+            response = client.get('/api/inbox')
+
+        assert len(response.data) == 3
+
+    def test_inbox_limit_is_at_least_one(self, authenticated_client):
+        """Zero or negative limits return one chat instead of failing"""
+        client, user = authenticated_client
+        for _ in range(2):
+            MessageFactory(chat=ChatFactory(exchange=ExchangeFactory(provider=user)), user=user)
+
+        for limit in (-1, 0):
+            response = client.get('/api/inbox', {'limit': limit})
+
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.data) == 1
+
+    def test_inbox_excludes_other_users_chats(self, authenticated_client):
+        """Users only see chats of their own exchanges"""
+        client, user = authenticated_client
+        MessageFactory(chat=ChatFactory())
+
+        response = client.get('/api/inbox')
+
+        assert response.data == []
+
+    def test_inbox_requires_authentication(self):
+        """Unauthenticated users cannot view the inbox"""
+        response = APIClient().get('/api/inbox')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+class TestMarkChatReadView:
+    """Tests for MarkChatReadView"""
+
+    def test_mark_read_resets_unread_count(self, authenticated_client):
+        """Marking a chat read clears the counter and moves the marker"""
+        client, user = authenticated_client
+        other = UserFactory()
+        chat = ChatFactory(exchange=ExchangeFactory(provider=user, requester=other))
+        message = MessageFactory(chat=chat, user=other)
+
+        response = client.post(f'/api/inbox/{chat.exchange.id}/read')
+
+        assert response.status_code == status.HTTP_200_OK
+        marker = ChatReadMarker.objects.get(chat=chat, user=user)
+        assert marker.unread_count == 0
+        assert marker.last_read_message_id == message.id
+
+    def test_sending_resets_own_unread_count(self, authenticated_client):
+        """Replying implies the chat was read"""
+        client, user = authenticated_client
+        other = UserFactory()
+        chat = ChatFactory(exchange=ExchangeFactory(provider=user, requester=other))
+        MessageFactory(chat=chat, user=other)
+        MessageFactory(chat=chat, user=user)
+
+        assert ChatReadMarker.objects.get(chat=chat, user=user).unread_count == 0
+        assert ChatReadMarker.objects.get(chat=chat, user=other).unread_count == 1
+
+    def test_mark_read_other_users_chat_not_found(self, authenticated_client):
+        """Users cannot mark chats they are not part of"""
+        client, user = authenticated_client
+        chat = ChatFactory()
+
+        response = client.post(f'/api/inbox/{chat.exchange.id}/read')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -7,6 +7,7 @@ from rest_framework import status
 from rest_api.models import Offer, TimeBank
 from tests.factories import (
     UserFactory, OfferFactory, WantFactory, GroupOfferFactory,
+    ExchangeFactory, AcceptedExchangeFactory, CompletedExchangeFactory,
     create_user_with_timebank
 )
 
@@ -41,6 +42,19 @@ class TestOffersView:
         for offer in response.data:
             assert offer['status'] == 'ACTIVE'
     
+    def test_get_offers_excludes_ended(self, authenticated_client):
+        """Test offers past their end date are hidden before they are deactivated"""
+        client, _ = authenticated_client
+        from django.utils import timezone
+        from datetime import timedelta
+        
+        current = OfferFactory(to_date=timezone.now() + timedelta(days=1))
+        OfferFactory(to_date=timezone.now() - timedelta(hours=1))
+        
+        response = client.get('/api/offers')
+        
+        assert [offer['id'] for offer in response.data] == [current.id]
+    
     def test_get_offers_excludes_flagged(self, authenticated_client):
         """Test flagged offers are not shown in dashboard"""
         client, _ = authenticated_client
@@ -190,6 +204,23 @@ class TestOfferDetailView:
         
         assert response.status_code == status.HTTP_404_NOT_FOUND
     
+    def test_get_offer_detail_slots_from_counters(self, api_client, django_assert_max_num_queries):
+        """Test slot information is read from the offer row, not counted per request"""
+        offer = GroupOfferFactory(person_count=3)
+        ExchangeFactory(offer=offer)
+        AcceptedExchangeFactory(offer=offer)
+        CompletedExchangeFactory(offer=offer)
+        
+        with django_assert_max_num_queries(2):
+            response = api_client.get(f'/api/offers/{offer.id}')
+        
+        assert response.data['active_slots'] == 2
+        assert response.data['completed_slots'] == 1
+        assert response.data['filled_slots'] == 3
+        assert response.data['total_slots'] == 3
+        assert response.data['slots_available'] is True  # only active exchanges block requests
+        assert response.data['can_edit'] is False
+    
     def test_update_own_offer(self, authenticated_client):
         """Test user can update own offer"""
         client, user = authenticated_client
@@ -286,6 +317,22 @@ class TestCreateOfferView:
         assert offer.activity_type == 'group'
         assert offer.person_count == 5
     
+    def test_create_want_retry_with_idempotency_key(self, authenticated_client):
+        """Test a retried want is created and its credits blocked once"""
+        client, user = authenticated_client
+        TimeBank.objects.create(user=user, amount=5, available_amount=5, blocked_amount=0, total_amount=5)
+        payload = {'title': 'Need Help', 'description': 'Looking for help', 'type': 'want', 'time_required': 2}
+        
+        first = client.post('/api/create-offer', payload, format='json', HTTP_IDEMPOTENCY_KEY='want-1')
+        retry = client.post('/api/create-offer', payload, format='json', HTTP_IDEMPOTENCY_KEY='want-1')
+        
+        assert retry.status_code == first.status_code == status.HTTP_201_CREATED
+        assert retry.data == first.data
+        assert retry['Idempotent-Replayed'] == 'true'
+        assert Offer.objects.filter(user=user).count() == 1
+        user.timebank.refresh_from_db()
+        assert user.timebank.blocked_amount == 2
+    
     def test_create_offer_with_tags(self, authenticated_client):
         """Test creating offer with tags"""
         client, user = authenticated_client
@@ -211,6 +211,20 @@ class TestCreateReportView:
         assert response2.status_code == status.HTTP_400_BAD_REQUEST
         assert 'already reported' in response2.data['error'].lower()
         
+    def test_report_again_after_resolution(self, authenticated_client):
+        """A target can be reported again once the earlier report is closed"""
+        client, user = authenticated_client
+        target_user = UserFactory()
+        ReportFactory(reporter=user, reported_user=target_user, status='RESOLVED')
+        
+        response = client.post('/api/reports', {
+            'target_type': 'user',
+            'target_id': target_user.id,
+            'reason': 'SPAM'
+        })
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        
     def test_report_invalid_reason(self, authenticated_client):
         """Reject invalid reason category"""
         client, user = authenticated_client
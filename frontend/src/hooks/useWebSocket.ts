@@ -6,6 +6,9 @@ interface WebSocketMessage {
   error?: string
 }
 
+// Close codes sent by the backend consumers
+const CLOSE_CONNECTION_LIMIT = 4429
+
 interface UseWebSocketOptions {
   url: string
   token?: string  // JWT token for authentication
@@ -109,6 +112,11 @@ export const useWebSocket = (options: UseWebSocketOptions) => {
       ws.onmessage = (event) => {
         try {
           const message: WebSocketMessage = JSON.parse(event.data)
+          // Answer server heartbeats so the connection isn't evicted as idle
+          if (message.type === 'ping') {
+            ws.send(JSON.stringify({ type: 'pong' }))
+            return
+          }
           setLastMessage(message)
           onMessageRef.current?.(message)
         } catch (error) {
@@ -122,9 +130,11 @@ export const useWebSocket = (options: UseWebSocketOptions) => {
 
         // Only reconnect if it wasn't a clean close and reconnect is enabled
         if (shouldReconnectRef.current && reconnect && event.code !== 1000) {
+          // Back off longer when the server rejected us for having too many connections
+          const delay = event.code === CLOSE_CONNECTION_LIMIT ? reconnectInterval * 10 : reconnectInterval
           reconnectTimeoutRef.current = setTimeout(() => {
             connect()
-          }, reconnectInterval)
+          }, delay)
         }
       }
 
@@ -54,6 +54,8 @@ import {
   MdMessage,
 } from 'react-icons/md'
 
+const REPORTS_PAGE_SIZE = 50
+
 const AdminPage = () => {
   const toast = useToast()
   const navigate = useNavigate()
@@ -63,6 +65,8 @@ const AdminPage = () => {
   const [selectedReport, setSelectedReport] = useState<Report | null>(null)
   const [statusFilter, setStatusFilter] = useState<string>('all')
   const [targetTypeFilter, setTargetTypeFilter] = useState<string>('all')
+  const [reportsPage, setReportsPage] = useState(0)
+  const [totalReports, setTotalReports] = useState(0)
   
   const { isOpen: isResolveOpen, onOpen: onResolveOpen, onClose: onResolveClose } = useDisclosure()
   const { isOpen: isExchangeDetailOpen, onOpen: onExchangeDetailOpen, onClose: onExchangeDetailClose } = useDisclosure()
@@ -73,21 +77,28 @@ const AdminPage = () => {
   const [adminNotes, setAdminNotes] = useState('')
   const [exchangeDetail, setExchangeDetail] = useState<any>(null)
   const [isLoadingExchange, setIsLoadingExchange] = useState(false)
+  const [isLoadingMessages, setIsLoadingMessages] = useState(false)
   const [isResolving, setIsResolving] = useState(false)
 
   useEffect(() => {
     fetchData()
-  }, [])
+  }, [statusFilter, targetTypeFilter, reportsPage])
 
   const fetchData = async () => {
     setIsLoading(true)
     try {
       const [kpi, reportsData] = await Promise.all([
         adminService.getKPI(),
-        adminService.getReports(),
+        adminService.getReports({
+          status: statusFilter !== 'all' ? statusFilter : undefined,
+          target_type: targetTypeFilter !== 'all' ? targetTypeFilter : undefined,
+          offset: reportsPage * REPORTS_PAGE_SIZE,
+          limit: REPORTS_PAGE_SIZE,
+        }),
       ])
       setKpiData(kpi)
-      setReports(reportsData)
+      setReports(reportsData.items)
+      setTotalReports(reportsData.total)
     } catch (error: any) {
       toast({
         title: 'Error',
@@ -106,6 +117,32 @@ const AdminPage = () => {
     return true
   })
 
+  const reportsPageCount = Math.max(1, Math.ceil(totalReports / REPORTS_PAGE_SIZE))
+
+  const loadMoreMessages = async () => {
+    if (!exchangeDetail?.messages_next_cursor) return
+    setIsLoadingMessages(true)
+    try {
+      const page = await adminService.getExchangeMessages(exchangeDetail.id, {
+        cursor: exchangeDetail.messages_next_cursor,
+      })
+      setExchangeDetail({
+        ...exchangeDetail,
+        messages: [...exchangeDetail.messages, ...page.messages],
+        messages_next_cursor: page.next_cursor,
+      })
+    } catch (error: any) {
+      toast({
+        title: 'Error',
+        description: error.response?.data?.error || 'Failed to load messages',
+        status: 'error',
+        duration: 3000,
+      })
+    } finally {
+      setIsLoadingMessages(false)
+    }
+  }
+
   const handleResolve = async () => {
     if (!selectedReport) return
     
@@ -295,7 +332,10 @@ const AdminPage = () => {
               <Select
                 size="sm"
                 value={statusFilter}
-                onChange={(e) => setStatusFilter(e.target.value)}
+                onChange={(e) => {
+                  setStatusFilter(e.target.value)
+                  setReportsPage(0)
+                }}
                 w="150px"
               >
                 <option value="all">All Statuses</option>
@@ -307,7 +347,10 @@ const AdminPage = () => {
               <Select
                 size="sm"
                 value={targetTypeFilter}
-                onChange={(e) => setTargetTypeFilter(e.target.value)}
+                onChange={(e) => {
+                  setTargetTypeFilter(e.target.value)
+                  setReportsPage(0)
+                }}
                 w="150px"
               >
                 <option value="all">All Types</option>
@@ -350,16 +393,20 @@ const AdminPage = () => {
                     filteredReports.map((report) => (
                       <Tr key={report.id}>
                         <Td>
-                          <Box 
-                            cursor="pointer" 
-                            onClick={() => navigate(`/profile/${report.reporter.id}`)}
-                            _hover={{ opacity: 0.7 }}
-                          >
-                            <Text fontSize="sm" color="blue.600" textDecoration="underline">
-                              {report.reporter.first_name} {report.reporter.last_name}
-                            </Text>
-                            <Text fontSize="xs" color="gray.500">{report.reporter.email}</Text>
-                          </Box>
+                          {report.reporter ? (
+                            <Box 
+                              cursor="pointer" 
+                              onClick={() => navigate(`/profile/${report.reporter!.id}`)}
+                              _hover={{ opacity: 0.7 }}
+                            >
+                              <Text fontSize="sm" color="blue.600" textDecoration="underline">
+                                {report.reporter.first_name} {report.reporter.last_name}
+                              </Text>
+                              <Text fontSize="xs" color="gray.500">{report.reporter.email}</Text>
+                            </Box>
+                          ) : (
+                            <Badge colorScheme="purple">Auto-moderation</Badge>
+                          )}
                         </Td>
                         <Td>
                           {report.reported_user ? (
@@ -382,7 +429,10 @@ const AdminPage = () => {
                             <Text fontSize="sm" fontWeight="500">
                               {report.target_type === 'offer' ? 'Offer' : 
                                report.target_type === 'want' ? 'Want' :
-                               report.target_type === 'exchange' ? 'Exchange' : 'User'}
+                               report.target_type === 'exchange' ? 'Exchange' :
+                               report.target_type === 'forum_post' ? 'Forum Post' :
+                               report.target_type === 'forum_comment' ? 'Forum Comment' :
+                               report.target_type === 'message' ? 'Chat Message' : 'User'}
                             </Text>
                             {report.target_type === 'exchange' && (
                               <Button
@@ -470,6 +520,35 @@ const AdminPage = () => {
               </Table>
             </TableContainer>
           )}
+
+          {totalReports > REPORTS_PAGE_SIZE && (
+            <Flex justify="space-between" align="center" mt={4}>
+              <Text fontSize="sm" color="gray.600">
+                {reportsPage * REPORTS_PAGE_SIZE + 1}-{Math.min((reportsPage + 1) * REPORTS_PAGE_SIZE, totalReports)} of {totalReports}
+              </Text>
+              <HStack spacing={2}>
+                <Button
+                  size="sm"
+                  variant="outline"
+                  onClick={() => setReportsPage(reportsPage - 1)}
+                  isDisabled={isLoading || reportsPage === 0}
+                >
+                  Previous
+                </Button>
+                <Text fontSize="sm" color="gray.600">
+                  Page {reportsPage + 1} of {reportsPageCount}
+                </Text>
+                <Button
+                  size="sm"
+                  variant="outline"
+                  onClick={() => setReportsPage(reportsPage + 1)}
+                  isDisabled={isLoading || reportsPage + 1 >= reportsPageCount}
+                >
+                  Next
+                </Button>
+              </HStack>
+            </Flex>
+          )}
         </Box>
       </Box>
 
@@ -706,6 +785,11 @@ const AdminPage = () => {
                           <Text fontSize="sm">{msg.content}</Text>
                         </Box>
                       ))}
+                      {exchangeDetail.messages_next_cursor && (
+                        <Button size="sm" variant="ghost" isLoading={isLoadingMessages} onClick={loadMoreMessages}>
+                          Load more
+                        </Button>
+                      )}
                     </VStack>
                   ) : (
                     <Text fontSize="sm" color="gray.500">No messages found</Text>
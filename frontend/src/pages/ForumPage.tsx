@@ -33,7 +33,7 @@ import { useNavigate } from 'react-router-dom'
 import Navbar from '@/components/Navbar'
 import UserAvatar from '@/components/UserAvatar'
 import { ForumPost, ForumCategory } from '@/types'
-import { apiService } from '@/services/api'
+import { apiService, ApiErrorResponse } from '@/services/api'
 import { useAuthStore } from '@/store/useAuthStore'
 
 const CATEGORY_LABELS: Record<ForumCategory, string> = {
@@ -50,10 +50,17 @@ const CATEGORY_COLORS: Record<ForumCategory, string> = {
   feedback: 'purple',
 }
 
+const POSTS_PAGE_SIZE = 20
+
 const ForumPage = () => {
   const [posts, setPosts] = useState<ForumPost[]>([])
   const [loading, setLoading] = useState(true)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [hasMore, setHasMore] = useState(false)
   const [selectedCategory, setSelectedCategory] = useState<ForumCategory | 'all'>('all')
+  const [sort, setSort] = useState<'newest' | 'trending'>('newest')
+  const [searchInput, setSearchInput] = useState('')
+  const [searchQuery, setSearchQuery] = useState('')
   const [newPostTitle, setNewPostTitle] = useState('')
   const [newPostContent, setNewPostContent] = useState('')
   const [newPostCategory, setNewPostCategory] = useState<ForumCategory>('general')
@@ -65,14 +72,23 @@ const ForumPage = () => {
 
   useEffect(() => {
     fetchPosts()
-  }, [selectedCategory])
+  }, [selectedCategory, sort, searchQuery])
+
+  const fetchPage = (before?: string) => {
+    const params: Record<string, string | number> = { limit: POSTS_PAGE_SIZE }
+    if (selectedCategory !== 'all') params.category = selectedCategory
+    if (sort !== 'newest') params.sort = sort
+    if (searchQuery) params.q = searchQuery
+    if (before) params.before = before
+    return apiService.get<ForumPost[]>('/forum/posts', { params })
+  }
 
   const fetchPosts = async () => {
     setLoading(true)
     try {
-      const params = selectedCategory !== 'all' ? { category: selectedCategory } : {}
-      const fetchedPosts = await apiService.get<ForumPost[]>('/forum/posts', { params })
+      const fetchedPosts = await fetchPage()
       setPosts(fetchedPosts)
+      setHasMore(fetchedPosts.length === POSTS_PAGE_SIZE)
     } catch (error) {
       toast({
         title: 'Error fetching posts',
@@ -84,6 +100,29 @@ const ForumPage = () => {
     }
   }
 
+  const loadMorePosts = async () => {
+    if (posts.length === 0) return
+    setLoadingMore(true)
+    try {
+      const fetchedPosts = await fetchPage(posts[posts.length - 1].id)
+      setPosts([...posts, ...fetchedPosts])
+      setHasMore(fetchedPosts.length === POSTS_PAGE_SIZE)
+    } catch (error) {
+      // The last loaded post was deleted, so its cursor is gone: start over from the top
+      if (error instanceof ApiErrorResponse && error.data.code === 'STALE_CURSOR') {
+        await fetchPosts()
+        return
+      }
+      toast({
+        title: 'Error fetching posts',
+        status: 'error',
+        duration: 3000,
+      })
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleCreatePost = async () => {
     if (!newPostTitle.trim() || !newPostContent.trim()) {
       toast({
@@ -175,6 +214,31 @@ const ForumPage = () => {
           )}
         </Flex>
 
+        {/* Search and Sort */}
+        <HStack spacing={3} mb={4}>
+          <Input
+            size="sm"
+            borderRadius="full"
+            placeholder="Search posts and comments"
+            value={searchInput}
+            onChange={(e) => setSearchInput(e.target.value)}
+            onKeyDown={(e) => {
+              if (e.key === 'Enter') setSearchQuery(searchInput.trim())
+            }}
+            onBlur={() => setSearchQuery(searchInput.trim())}
+          />
+          <Select
+            size="sm"
+            w="160px"
+            borderRadius="full"
+            value={sort}
+            onChange={(e) => setSort(e.target.value as 'newest' | 'trending')}
+          >
+            <option value="newest">Newest</option>
+            <option value="trending">Trending</option>
+          </Select>
+        </HStack>
+
         {/* Category Tabs */}
         <Tabs
           variant="soft-rounded"
@@ -280,6 +344,14 @@ const ForumPage = () => {
             ))}
           </VStack>
         )}
+
+        {!loading && hasMore && (
+          <Flex justify="center" mt={4}>
+            <Button size="sm" variant="outline" onClick={loadMorePosts} isLoading={loadingMore}>
+              Load more
+            </Button>
+          </Flex>
+        )}
       </Box>
 
       {/* Create Post Modal */}
@@ -49,6 +49,7 @@ const ForumPostPage = () => {
   const [loading, setLoading] = useState(true)
   const [newComment, setNewComment] = useState('')
   const [submitting, setSubmitting] = useState(false)
+  const [loadingComments, setLoadingComments] = useState(false)
   const [deleteTarget, setDeleteTarget] = useState<{ type: 'post' | 'comment'; id: string } | null>(null)
   const { isOpen, onOpen, onClose } = useDisclosure()
   const cancelRef = useRef<HTMLButtonElement>(null)
@@ -77,6 +78,35 @@ const ForumPostPage = () => {
     }
   }
 
+  const loadMoreComments = async () => {
+    if (!post?.comments_next_cursor) return
+    setLoadingComments(true)
+    try {
+      const page = await apiService.get<{ comments: ForumComment[]; next_cursor: string | null }>(
+        `/forum/posts/${postId}/comments`,
+        { params: { cursor: post.comments_next_cursor } }
+      )
+      setPost((prev) => {
+        if (!prev) return null
+        // Comments added on this page may already be in the list
+        const seen = new Set((prev.comments || []).map((c) => c.id))
+        return {
+          ...prev,
+          comments: [...(prev.comments || []), ...page.comments.filter((c) => !seen.has(c.id))],
+          comments_next_cursor: page.next_cursor,
+        }
+      })
+    } catch (error) {
+      toast({
+        title: 'Error fetching comments',
+        status: 'error',
+        duration: 3000,
+      })
+    } finally {
+      setLoadingComments(false)
+    }
+  }
+
   const handleAddComment = async () => {
     if (!newComment.trim()) {
       toast({
@@ -383,6 +413,14 @@ const ForumPostPage = () => {
               </Box>
             )}
           </VStack>
+
+          {post.comments_next_cursor && (
+            <Flex justify="center" mt={4}>
+              <Button size="sm" variant="outline" onClick={loadMoreComments} isLoading={loadingComments}>
+                Load more comments
+              </Button>
+            </Flex>
+          )}
         </Box>
       </Box>
 
@@ -41,8 +41,10 @@ export const adminService = {
     return await apiService.get('/admin/kpi')
   },
 
-  async getReports(): Promise<Report[]> {
-    return await apiService.get('/admin/reports')
+  async getReports(
+    filters: { status?: string; target_type?: string; offset?: number; limit?: number } = {}
+  ): Promise<{ items: Report[]; total: number }> {
+    return await apiService.getPage<Report>('/admin/reports', { params: filters })
   },
 
   async updateReport(reportId: number, data: UpdateReportData): Promise<{ message: string; report: any }> {
@@ -68,5 +70,12 @@ export const adminService = {
   async getExchangeDetail(exchangeId: number): Promise<any> {
     return await apiService.get(`/admin/exchanges/${exchangeId}`)
   },
+
+  async getExchangeMessages(
+    exchangeId: number,
+    params: { cursor?: number; q?: string; limit?: number } = {}
+  ): Promise<{ messages: any[]; next_cursor: number | null }> {
+    return await apiService.get(`/admin/exchanges/${exchangeId}/messages`, { params })
+  },
 }
 
@@ -82,6 +82,13 @@ class ApiService {
     return response.data
   }
 
+  // List endpoints that page with offset/limit report the full count in X-Total-Count
+  async getPage<T>(url: string, config?: AxiosRequestConfig): Promise<{ items: T[]; total: number }> {
+    const response = await this.client.get<T[]>(url, config)
+    const total = Number(response.headers['x-total-count'])
+    return { items: response.data, total: Number.isNaN(total) ? response.data.length : total }
+  }
+
   async post<T>(url: string, data?: any, config?: AxiosRequestConfig) {
     const response = await this.client.post<T>(url, data, config)
     return response.data
@@ -22,6 +22,7 @@ export interface ApiError {
   message: string
   errors?: Record<string, string[]>
   detail?: string
+  code?: string
 }
 
 // Auth Response Types
@@ -371,11 +372,11 @@ export interface PaginatedResponse<T> {
 // Report types
 export type ReportReason = 'SPAM' | 'INAPPROPRIATE' | 'FAKE_PROFILE' | 'HARASSMENT' | 'FRAUD' | 'OTHER'
 export type ReportStatus = 'PENDING' | 'REVIEWED' | 'RESOLVED' | 'DISMISSED'
-export type ReportTargetType = 'offer' | 'want' | 'exchange' | 'user'
+export type ReportTargetType = 'offer' | 'want' | 'exchange' | 'user' | 'forum_post' | 'forum_comment' | 'message'
 
 export interface Report {
   id: string
-  reporter: User
+  reporter: User | null  // null for automatic reports
   reported_user?: User
   target_type: ReportTargetType
   target_id: number
@@ -386,6 +387,7 @@ export interface Report {
     email?: string
     first_name?: string
     last_name?: string
+    content?: string
     deleted?: boolean
   }
   reason: ReportReason
@@ -432,4 +434,5 @@ export interface ForumPost {
   comment_count: number
   user: ForumUser
   comments?: ForumComment[]
+  comments_next_cursor?: string | null
 }